@@ -0,0 +1 @@
+"""Benchmarks and reports for measuring the bots' performance, run them from the src directory"""
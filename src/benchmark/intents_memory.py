@@ -0,0 +1,169 @@
+"""
+Memory report comparing the gateway intents and member cache policies on a simulated large guild
+
+The 'all' policy is the old behaviour: all intents, every member cached and guilds chunked at startup.
+The 'modules' policy is the current behaviour of ``DiscordBot``, where intents depend on the loaded modules.
+
+Run from the src directory:
+python -m benchmark.intents_memory --members 50000 --config ../config.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import discord as discordpy
+
+from nikobot.discord_bot import get_intents, get_message_cache_size
+
+GUILD_ID = 100000000000000000
+BOT_ID = 200000000000000000
+
+def main() -> None:
+    """Parse the arguments and print the report"""
+
+    parser = argparse.ArgumentParser("intents_memory")
+    parser.add_argument("--members", type=int, default=50000, help="The number of members in the simulated guild")
+    parser.add_argument("--config",
+                        type=str,
+                        default=None,
+                        help="A config file in json format, used for the list of enabled modules")
+    parser.add_argument("--policy", type=str, default=None, choices=["all", "modules"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config is not None:
+        with open(args.config, "r", encoding="utf8") as cf:
+            modules = json.load(cf)["modules"]
+    else:
+        modules = ["general", "help", "clear", "avatar", "tc4.tc4", "mal.malnotifier"]
+
+    if args.policy is not None:
+        # we are the child process measuring a single policy
+        print(json.dumps(measure(args.policy, modules, args.members)))
+        return
+
+    results = {}
+    for policy in ["all", "modules"]:
+        # every policy is measured in a fresh process, so that the resident size isn't influenced by the other
+        output = subprocess.run([sys.executable, "-m", "benchmark.intents_memory",
+                                 "--members", str(args.members),
+                                 "--policy", policy] + (["--config", args.config] if args.config else []),
+                                check=True,
+                                capture_output=True,
+                                text=True).stdout
+        results[policy] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"Simulated guild with {args.members} members and presences, modules: {', '.join(modules)}")
+    print(f"{'policy':<10}{'intents':>12}{'cached members':>16}{'python heap':>16}{'resident size':>16}")
+    for policy, result in results.items():
+        print(f"{policy:<10}{result['intents']:>12}{result['members']:>16}"
+              f"{_mib(result['heap']):>16}{_mib(result['rss']):>16}")
+
+    before, after = results["all"], results["modules"]
+    print(f"resident size reduced by {_mib(before['rss'] - after['rss'])} "
+          f"({100 * (1 - after['rss'] / max(before['rss'], 1)):.1f}%)")
+
+def measure(policy: str, modules: list[str], member_count: int) -> dict[str, int]:
+    """Load the simulated guild using the given policy and return the memory used"""
+
+    if policy == "all":
+        intents = discordpy.Intents.all()
+        client = discordpy.Client(intents=intents,
+                                  member_cache_flags=discordpy.MemberCacheFlags.from_intents(intents),
+                                  chunk_guilds_at_startup=True)
+    else:
+        intents = get_intents(modules)
+        client = discordpy.Client(intents=intents,
+                                  member_cache_flags=discordpy.MemberCacheFlags.none(),
+                                  chunk_guilds_at_startup=False,
+                                  max_messages=get_message_cache_size(modules))
+
+    gc.collect()
+    rss_before = _rss()
+    tracemalloc.start()
+
+    # pylint: disable-next=protected-access
+    guild = client._connection._add_guild_from_data(_guild_payload(intents, member_count))
+
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {
+        "intents": intents.value,
+        "members": len(guild.members),
+        "heap": heap,
+        "rss": _rss() - rss_before
+    }
+
+def _guild_payload(intents: discordpy.Intents, member_count: int) -> dict:
+    """
+    Return a GUILD_CREATE payload like the gateway would send it with the given intents
+
+    With the members intent and chunking, every member ends up in the payload (the chunks are merged for simplicity).
+    Without it, large guilds only contain the bot itself.
+    """
+
+    if intents.members:
+        member_ids = range(BOT_ID, BOT_ID + member_count)
+    else:
+        member_ids = range(BOT_ID, BOT_ID + 1)
+
+    members = []
+    presences = []
+    for member_id in member_ids:
+        members.append({
+            "user": {
+                "id": str(member_id),
+                "username": f"user{member_id}",
+                "global_name": f"User {member_id}",
+                "discriminator": "0",
+                "avatar": "a1b2c3d4e5f6a1b2c3d4e5f6a1b2c3d4"
+            },
+            "nick": None,
+            "roles": [],
+            "joined_at": "2020-01-01T00:00:00.000000+00:00",
+            "deaf": False,
+            "mute": False,
+            "flags": 0
+        })
+        if intents.presences:
+            presences.append({
+                "user": {"id": str(member_id)},
+                "status": "online",
+                "client_status": {"desktop": "online"},
+                "activities": [{"name": "Minecraft", "type": 0, "created_at": 1600000000000}]
+            })
+
+    return {
+        "id": str(GUILD_ID),
+        "name": "simulated large guild",
+        "owner_id": str(BOT_ID),
+        "member_count": member_count,
+        "large": True,
+        "roles": [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+        "members": members,
+        "presences": presences,
+        "voice_states": []
+    }
+
+def _rss() -> int:
+    """Return the resident set size of the current process in bytes"""
+
+    with open("/proc/self/statm", "r", encoding="utf8") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def _mib(value: int) -> str:
+    return f"{value / 1024 / 1024:.1f} MiB"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Load driver measuring the MAL notifier cycle against the local stand-in server
+
+Every cycle does what the notifier does for every user within an hour, except sending the discord messages:
+fetch the users' manga list, scan the latest updates and check every manga for new chapters.
+Before every following cycle, the stand-in releases new chapters for some random manga.
+The first cycle starts cold, the following cycles show the effect of the caches, sessions, cookie replay
+and the update scanner.
+
+Run from the src directory:
+python -m benchmark.notifier_load --users 5 --list-size 20 --cycles 3 --browser-latency 0.5 --challenge
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from collections import Counter
+from time import monotonic
+
+from abllib import PersistentStorage, VolatileStorage, log
+
+from nikobot.modules.mal import flare_solverr, mal_helper, natomanga_helper, registry, resolution_cache, update_scanner
+from nikobot.modules.mal.mal_user import MALUser
+from nikobot.modules.mal.manga import Manga, MangaProvider
+from nikobot.util import http
+
+from .standin import Standin, add_arguments, config_from_args
+
+def main() -> None:
+    """Parse the arguments and print the report"""
+
+    parser = argparse.ArgumentParser("notifier_load")
+    parser.add_argument("--users", type=int, default=5, help="The number of simulated MAL users")
+    parser.add_argument("--cycles", type=int, default=3, help="The number of notifier cycles")
+    parser.add_argument("--parallelism", type=int, default=2, help="The number of FlareSolverr sessions")
+    parser.add_argument("--host-rate", type=float, default=flare_solverr.HOST_RATE,
+                        help="The requests per second initially sent to natomanga")
+    parser.add_argument("--releases", type=int, default=10, help="The number of new chapters between two cycles")
+    parser.add_argument("--no-scan", action="store_true", help="Scrape every manga instead of scanning the updates")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+async def run(args: argparse.Namespace) -> None:
+    """Start the stand-in, point the mal module at it and run the cycles"""
+
+    log.initialize(log.LogLevel.WARNING)
+    log.add_console_handler()
+    VolatileStorage.initialize()
+
+    standin = Standin(config_from_args(args))
+    url = await standin.start()
+
+    mal_helper.BASE_URL = f"{url}/v2"
+    natomanga_helper.BASE_URL = url
+    flare_solverr.HOST_RATE = args.host_rate
+    flare_solverr.HOST_MAX_RATE = max(flare_solverr.HOST_MAX_RATE, args.host_rate)
+    VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+    VolatileStorage["mal.flare_solverr_parallelism"] = args.parallelism
+    VolatileStorage["storage_dir"] = tempfile.mkdtemp(prefix="notifier_load")
+    VolatileStorage["cache_dir"] = VolatileStorage["storage_dir"]
+    PersistentStorage.initialize(os.path.join(VolatileStorage["cache_dir"], "storage.json"))
+    # pylint: disable-next=protected-access
+    flare_solverr._setup()
+
+    users = [MALUser(f"user{i}", i) for i in range(args.users)]
+
+    print(f"{'cycle':<8}{'seconds':>10}{'failed':>8}  requests")
+    try:
+        for cycle in range(args.cycles):
+            # the notifier runs hourly, so results shared by coalesce never carry over to the next cycle
+            for func in (mal_helper.get_manga_from_id, mal_helper.get_manga_list_from_username,
+                         mal_helper.search_for_manga, flare_solverr.fetch, flare_solverr.get, Manga.fetch_chapters):
+                # pylint: disable-next=no-member
+                func.singleflight.clear()
+            if cycle > 0:
+                standin.release(args.releases)
+
+            before = Counter(standin.requests)
+            start = monotonic()
+            failed = await run_cycle(users, not args.no_scan)
+            duration = monotonic() - start
+
+            requests = Counter(standin.requests)
+            requests.subtract(before)
+            print(f"{cycle + 1:<8}{duration:>10.2f}{failed:>8}  "
+                  + ", ".join(f"{name}: {count}" for name, count in sorted(requests.items()) if count > 0))
+    finally:
+        await flare_solverr.close()
+        await http.close()
+        await standin.stop()
+
+    pool = flare_solverr.sessions.stats()
+    fetched = flare_solverr.fetch_stats
+    print(f"flaresolverr sessions: {pool['requests']} requests, {pool['created']} created, "
+          f"{pool['destroyed']} destroyed, max {pool['max_queued']} queued, waited {pool['waited_seconds']:.1f}s")
+    # pylint: disable-next=no-member
+    shared = Manga.fetch_chapters.singleflight.coalesced
+    print(f"registry: {registry.count()} manga, {registry.hydrated()} in memory, {shared} shared chapter fetches")
+    print(f"scraping: {fetched.direct} direct, {fetched.challenged} challenged, {fetched.browser} through FlareSolverr")
+    scanned = update_scanner.stats
+    print(f"update scanner: {scanned.scans} scans, {scanned.pages} pages, {scanned.updates} updates, "
+          f"{scanned.skipped_fetches} skipped scrapes")
+    resolved = resolution_cache.stats
+    print(f"url resolution: {resolved.hits} hits, {resolved.negative_hits} cached not found, "
+          f"{resolved.misses} searched")
+    for host, m in sorted(http.metrics().items()):
+        print(f"http {host}: {m.requests} requests, {m.retries} retries, {m.errors} errors, "
+              f"avg {m.latency_avg * 1000:.0f}ms")
+
+async def run_cycle(users: list[MALUser], scan: bool) -> int:
+    """Check all users once, returning the number of users whose check failed"""
+
+    failed = 0
+    for user in users:
+        try:
+            await user.fetch_manga_list()
+        # pylint: disable-next=broad-exception-caught
+        except Exception:
+            failed += 1
+
+    if scan:
+        await update_scanner.scan(registry.provider_urls(MangaProvider.NATOMANGA))
+
+    for user in users:
+        try:
+            await user.fetch_manga_chapters()
+        # pylint: disable-next=broad-exception-caught
+        except Exception:
+            failed += 1
+    return failed
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Micro-benchmark comparing the old repeated ``json()`` calls with parsing every response body once
+
+The payloads mirror the responses recorded from the MyAnimeList API and FlareSolverr:
+a single manga, a manga list with a few hundred entries and a FlareSolverr solution containing a whole html page.
+
+Run from the src directory:
+python -m benchmark.response_parsing --iterations 2000
+"""
+
+import argparse
+import json
+import timeit
+from typing import Any, Callable
+
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from nikobot.modules.mal.dclasses import FlareSolverrSolution, MangaDetails, MangaListEntry
+from nikobot.modules.mal.manga import Manga
+from nikobot.util.http import Response
+
+def main() -> None:
+    """Parse the arguments and print the report"""
+
+    parser = argparse.ArgumentParser("response_parsing")
+    parser.add_argument("--iterations", type=int, default=2000, help="The number of times every payload is parsed")
+    parser.add_argument("--list-entries", type=int, default=300, help="The number of entries in the manga list")
+    parser.add_argument("--html-size", type=int, default=250_000, help="The size of the FlareSolverr html page")
+    args = parser.parse_args()
+
+    cases: list[tuple[str, Response, Callable[[Response], Any], Callable[[Response], Any]]] = [
+        ("mal manga", _response(manga_payload()), legacy_manga, parse_once_manga),
+        ("mal manga list", _response(manga_list_payload(args.list_entries)), legacy_manga_list, parse_once_manga_list),
+        ("flaresolverr get", _response(flaresolverr_payload(args.html_size)), legacy_flaresolverr,
+         parse_once_flaresolverr)
+    ]
+
+    print(f"{'payload':<20}{'size':>12}{'repeated json()':>18}{'parse once':>14}{'speedup':>10}")
+    for name, res, legacy, parse_once in cases:
+        # both variants need to produce the same result
+        assert _normalize(legacy(res)) == _normalize(parse_once(res))
+
+        legacy_time = timeit.timeit(lambda res=res, func=legacy: func(res), number=args.iterations)
+        parse_once_time = timeit.timeit(lambda res=res, func=parse_once: func(res), number=args.iterations)
+
+        print(f"{name:<20}{_kib(len(res.content)):>12}"
+              f"{_micros(legacy_time / args.iterations):>18}"
+              f"{_micros(parse_once_time / args.iterations):>14}"
+              f"{legacy_time / parse_once_time:>9.1f}x")
+
+def legacy_manga(r: Response) -> Manga:
+    """The MAL manga parsing before the typed responses, which parsed the body for every access"""
+
+    if "error" in r.json():
+        raise ValueError(r.json()["error"])
+
+    to_return = {
+        "id": r.json()["id"],
+        "title": r.json()["title"],
+        "title_en": r.json()["alternative_titles"]["en"],
+        "synonyms": r.json()["alternative_titles"]["synonyms"]
+    }
+
+    if r.json()["status"] == "currently_publishing":
+        to_return["status"] = "currently publishing"
+    else:
+        to_return["status"] = r.json()["status"]
+
+    if "picture" in r.json():
+        to_return["picture"] = r.json()["picture"]
+    elif "main_picture" in r.json():
+        to_return["picture"] = r.json()["main_picture"]["large"]
+
+    if "mean" in r.json():
+        to_return["score"] = float(r.json()["mean"])
+    else:
+        to_return["score"] = float("nan")
+
+    return Manga(to_return["id"], to_return["title"], to_return["title_en"], to_return["synonyms"],
+                 to_return["status"], to_return["picture"], to_return["score"])
+
+def parse_once_manga(r: Response) -> Manga:
+    """The current MAL manga parsing"""
+
+    json_res = r.json()
+    if "error" in json_res:
+        raise ValueError(json_res["error"])
+
+    return Manga.from_details(MangaDetails.from_json(json_res))
+
+def legacy_manga_list(r: Response) -> list[dict[str, int]]:
+    """The MAL manga list parsing before the typed responses"""
+
+    if "error" in r.json():
+        raise ValueError(r.json()["error"])
+
+    return_data = []
+    for manga_json in r.json()["data"]:
+        return_data.append({
+            "mal_id": manga_json["node"]["id"],
+            "read_chapters": manga_json["list_status"]["num_chapters_read"]
+        })
+    return return_data
+
+def parse_once_manga_list(r: Response) -> list[MangaListEntry]:
+    """The current MAL manga list parsing"""
+
+    json_res = r.json()
+    if "error" in json_res:
+        raise ValueError(json_res["error"])
+
+    return [MangaListEntry.from_json(manga_json) for manga_json in json_res["data"]]
+
+def legacy_flaresolverr(r: Response) -> str:
+    """The FlareSolverr parsing before the typed responses"""
+
+    if "status" in r.json() and r.json()["message"] == "Challenge not detected!":
+        return r.json()["solution"]["response"]
+
+    if "solution" not in r.json() or r.json()["status"] != "ok":
+        raise ValueError(r.json())
+
+    return r.json()["solution"]["response"]
+
+def parse_once_flaresolverr(r: Response) -> str:
+    """The current FlareSolverr parsing"""
+
+    json_res = r.json()
+    if "solution" not in json_res or json_res.get("status") != "ok":
+        raise ValueError(json_res)
+
+    return FlareSolverrSolution.from_json(json_res).response
+
+def manga_payload() -> dict[str, Any]:
+    """Return a response of the MAL manga endpoint"""
+
+    return {
+        "id": 2,
+        "title": "Berserk",
+        "main_picture": {
+            "medium": "https://cdn.myanimelist.net/images/manga/1/157897.jpg",
+            "large": "https://cdn.myanimelist.net/images/manga/1/157897l.jpg"
+        },
+        "alternative_titles": {
+            "synonyms": ["Berserk: The Prototype"],
+            "en": "Berserk",
+            "ja": "ベルセルク"
+        },
+        "mean": 9.47,
+        "media_type": "manga",
+        "status": "currently_publishing",
+        "genres": [{"id": 1, "name": "Action"}, {"id": 2, "name": "Adventure"}, {"id": 58, "name": "Gore"},
+                   {"id": 10, "name": "Fantasy"}, {"id": 14, "name": "Horror"}, {"id": 41, "name": "Seinen"}],
+        "authors": [
+            {"node": {"id": 1868, "first_name": "Kentarou", "last_name": "Miura"}, "role": "Story & Art"},
+            {"node": {"id": 49592, "first_name": "", "last_name": "Studio Gaga"}, "role": "Art"}
+        ]
+    }
+
+def manga_list_payload(entries: int) -> dict[str, Any]:
+    """Return a response of the MAL manga list endpoint with the given number of entries"""
+
+    data = []
+    for i in range(entries):
+        data.append({
+            "node": {
+                "id": 100 + i,
+                "title": f"Manga title number {i}",
+                "main_picture": {
+                    "medium": f"https://cdn.myanimelist.net/images/manga/3/{200000 + i}.jpg",
+                    "large": f"https://cdn.myanimelist.net/images/manga/3/{200000 + i}l.jpg"
+                }
+            },
+            "list_status": {
+                "status": "reading",
+                "is_rereading": False,
+                "num_volumes_read": 0,
+                "num_chapters_read": i % 150,
+                "score": 0,
+                "updated_at": "2024-05-01T12:00:00+00:00"
+            }
+        })
+
+    return {"data": data, "paging": {}}
+
+def flaresolverr_payload(html_size: int) -> dict[str, Any]:
+    """Return a FlareSolverr solution containing a html page of roughly the given size"""
+
+    row = '<li class="a-h"><a rel="nofollow" href="https://natomanga.com/manga/berserk/chapter-{0}" ' \
+          'title="Berserk Chapter {0}">Chapter {0}</a><span title="May-01-2024 12:00">May-01-24</span></li>\n'
+    rows = []
+    size = 0
+    chapter = 1
+    while size < html_size:
+        rows.append(row.format(chapter))
+        size += len(rows[-1])
+        chapter += 1
+    html = f'<html><body><div class="chapter-list"><ul>{"".join(rows)}</ul></div></body></html>'
+
+    return {
+        "status": "ok",
+        "message": "Challenge solved!",
+        "solution": {
+            "url": "https://natomanga.com/manga/berserk",
+            "status": 200,
+            "cookies": [{"name": "cf_clearance", "value": "a" * 200, "expiry": 1893456000}],
+            "userAgent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0",
+            "response": html
+        },
+        "startTimestamp": 1714564800000,
+        "endTimestamp": 1714564805000,
+        "version": "3.3.21"
+    }
+
+def _response(payload: dict[str, Any]) -> Response:
+    headers = CIMultiDictProxy(CIMultiDict({"Content-Type": "application/json"}))
+    return Response(200, headers, json.dumps(payload).encode("utf8"), "http://localhost")
+
+def _normalize(result: Any) -> Any:
+    if isinstance(result, Manga):
+        return (result.mal_id, result.title, result.title_translated, result.synonyms, result.status,
+                result.picture_url, result.score)
+    if isinstance(result, list):
+        return [(item["mal_id"], item["read_chapters"]) if isinstance(item, dict)
+                else (item.mal_id, item.read_chapters) for item in result]
+    return result
+
+def _kib(value: int) -> str:
+    return f"{value / 1024:.1f} KiB"
+
+def _micros(value: float) -> str:
+    return f"{value * 1_000_000:.1f} us"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Local stand-in server for FlareSolverr, the MyAnimeList API and natomanga
+
+It implements the FlareSolverr ``/v1`` protocol and serves MyAnimeList and natomanga responses
+shaped like the recorded ones, for a generated set of manga and users.
+Latency, error rates and Cloudflare challenges are configurable, so the mal module can be measured offline.
+
+Run from the src directory:
+python -m benchmark.standin --port 8191 --latency 0.05 --browser-latency 2 --error-rate 0.01 --challenge
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+from collections import Counter
+from dataclasses import dataclass
+from time import time
+from urllib.parse import parse_qs, urlparse
+
+from aiohttp import web
+
+from .response_parsing import flaresolverr_payload, manga_payload
+
+CHALLENGE_PAGE = "<!DOCTYPE html><html><head><title>Just a moment...</title></head><body>" \
+                 "<script src=\"/cdn-cgi/challenge-platform/h/b/orchestrate/chl_page/v1\"></script></body></html>"
+NOT_FOUND_PAGE = "<html><body><p>Sorry, the page you have requested cannot be found.</p></body></html>"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0"
+
+@dataclass
+class StandinConfig:
+    """The behaviour of the ``Standin`` server"""
+
+    # the number of seconds every plain request takes
+    latency: float = 0.05
+    # the number of seconds FlareSolverr takes to load a page
+    browser_latency: float = 2.0
+    # the chance of every request to fail with a server error
+    error_rate: float = 0.0
+    # whether natomanga requires a solved cloudflare challenge
+    challenge: bool = False
+    # the number of seconds a cf_clearance cookie is valid
+    clearance_ttl: float = 30 * 60
+    # the number of existing manga and the number of manga on every users' list
+    manga_count: int = 500
+    list_size: int = 20
+    seed: int = 0
+
+class Standin():
+    """A local server which behaves like FlareSolverr, the MyAnimeList API and natomanga at the same time"""
+
+    def __init__(self, config: StandinConfig) -> None:
+        self.config = config
+        self.requests: Counter[str] = Counter()
+        self.sessions: set[str] = set()
+        self._random = random.Random(config.seed)
+        # the number of chapters released since the start and the ids of the updated manga, the newest first
+        self._released: Counter[int] = Counter()
+        self._updated: list[int] = []
+        self._clearance = secrets.token_hex(16)
+        self._runner: web.AppRunner | None = None
+
+    def app(self) -> web.Application:
+        """Return the ``aiohttp.web.Application`` serving all routes"""
+
+        app = web.Application()
+        app.router.add_post("/v1", self._flaresolverr)
+        app.router.add_get("/v2/manga", self._mal_search)
+        app.router.add_get("/v2/manga/{mal_id}", self._mal_manga)
+        app.router.add_get("/v2/users/{username}/mangalist", self._mal_manga_list)
+        app.router.add_get("/manga-list/latest-manga", self._natomanga_latest)
+        app.router.add_get("/manga/{slug:.*}", self._natomanga)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start the server and return its base url"""
+
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        # pylint: disable-next=protected-access
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        """Stop the server"""
+
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def manga_ids(self, username: str) -> list[int]:
+        """Return the ids of the manga on the list of the given user"""
+
+        user_random = random.Random(f"{self.config.seed}-{username}")
+        return user_random.sample(range(1, self.config.manga_count + 1), self.config.list_size)
+
+    def chapter_count(self, mal_id: int) -> int:
+        """Return the number of released chapters of the given manga"""
+
+        return 10 + mal_id * 7 % 300 + self._released[mal_id]
+
+    def release(self, count: int) -> None:
+        """Release a new chapter for ``count`` random manga"""
+
+        for _ in range(count):
+            mal_id = self._random.randint(1, self.config.manga_count)
+            self._released[mal_id] += 1
+            if mal_id in self._updated:
+                self._updated.remove(mal_id)
+            self._updated.insert(0, mal_id)
+
+    def manga_page(self, slug: str) -> tuple[int, str]:
+        """Return the status code and html of the natomanga page with the given slug"""
+
+        mal_id = _parse_slug(slug)
+        if mal_id is None or mal_id > self.config.manga_count:
+            return 404, NOT_FOUND_PAGE
+
+        html = flaresolverr_payload(0)["solution"]["response"]
+        rows = [f'<li class="a-h"><a href="https://natomanga.com/manga/{slug}/chapter-{chapter}" '
+                f'title="Chapter {chapter}">Chapter {chapter}</a></li>'
+                for chapter in range(self.chapter_count(mal_id), 0, -1)]
+        return 200, html.replace("<ul></ul>", f"<ul>{''.join(rows)}</ul>")
+
+    async def _respond_slowly(self, latency: float) -> bool:
+        """Wait for the configured latency and return whether this request should fail"""
+
+        await asyncio.sleep(latency * self._random.uniform(0.5, 1.5))
+        return self._random.random() < self.config.error_rate
+
+    async def _flaresolverr(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        cmd = data.get("cmd", "")
+        self.requests[f"flaresolverr {cmd}"] += 1
+
+        if cmd.startswith("sessions."):
+            return self._flaresolverr_sessions(cmd, data)
+
+        if cmd != "request.get":
+            return web.json_response({"status": "error", "message": f"Request parameter 'cmd' = '{cmd}' is invalid."},
+                                     status=500)
+
+        # a new browser context is much slower than a warm session
+        latency = self.config.browser_latency
+        if data.get("session") not in self.sessions:
+            latency *= 2
+        if await self._respond_slowly(latency):
+            self.requests["errors"] += 1
+            return web.json_response({"status": "error",
+                                      "message": "Error: Error solving the challenge. Timeout after 60.0 seconds."},
+                                     status=500)
+
+        url = urlparse(data["url"])
+        if url.path == "/manga-list/latest-manga":
+            status, html = 200, self.latest_page(int(parse_qs(url.query).get("page", ["1"])[0]))
+        else:
+            status, html = self.manga_page(url.path.removeprefix("/manga/"))
+        payload = flaresolverr_payload(0)
+        payload["message"] = "Challenge solved!" if self.config.challenge else "Challenge not detected!"
+        payload["solution"]["url"] = data["url"]
+        payload["solution"]["status"] = status
+        payload["solution"]["response"] = html
+        payload["solution"]["userAgent"] = USER_AGENT
+        payload["solution"]["cookies"] = [{"name": "cf_clearance",
+                                           "value": self._clearance,
+                                           "expiry": time() + self.config.clearance_ttl}]
+        return web.json_response(payload)
+
+    def _flaresolverr_sessions(self, cmd: str, data: dict) -> web.Response:
+        if cmd == "sessions.create":
+            session = data.get("session") or secrets.token_hex(8)
+            message = "Session already exists." if session in self.sessions else "Session created successfully."
+            self.sessions.add(session)
+            return web.json_response({"status": "ok", "message": message, "session": session})
+
+        if cmd == "sessions.destroy":
+            if data.get("session") not in self.sessions:
+                return web.json_response({"status": "error", "message": "The session doesn't exist."}, status=500)
+            self.sessions.remove(data["session"])
+            return web.json_response({"status": "ok", "message": "The session has been removed."})
+
+        return web.json_response({"status": "ok", "message": "", "sessions": sorted(self.sessions)})
+
+    def latest_page(self, page: int) -> str:
+        """Return the html of the given page of the latest updates listing, which lists 24 manga per page"""
+
+        items = [f'<div class="list-comic-item-wrap"><a href="https://natomanga.com/manga/{_slug(mal_id)}">'
+                 f'{_title(mal_id)}</a><a class="list-story-item-wrap-chapter" '
+                 f'href="https://natomanga.com/manga/{_slug(mal_id)}/chapter-{self.chapter_count(mal_id)}">'
+                 f'Chapter {self.chapter_count(mal_id)}</a></div>'
+                 for mal_id in self._updated[(page - 1) * 24:page * 24]]
+        return f"<html><body><div class=\"truyen-list\">{''.join(items)}</div></body></html>"
+
+    async def _natomanga(self, request: web.Request) -> web.Response:
+        challenge = self._challenge(request)
+        if challenge is not None:
+            return challenge
+
+        self.requests["natomanga"] += 1
+        if await self._respond_slowly(self.config.latency):
+            self.requests["errors"] += 1
+            return web.Response(status=503, text="<html><body>503 Service Unavailable</body></html>",
+                                content_type="text/html")
+
+        status, html = self.manga_page(request.match_info["slug"])
+        return web.Response(status=status, text=html, content_type="text/html")
+
+    async def _natomanga_latest(self, request: web.Request) -> web.Response:
+        challenge = self._challenge(request)
+        if challenge is not None:
+            return challenge
+
+        self.requests["natomanga latest"] += 1
+        if await self._respond_slowly(self.config.latency):
+            self.requests["errors"] += 1
+            return web.Response(status=503, text="<html><body>503 Service Unavailable</body></html>",
+                                content_type="text/html")
+
+        html = self.latest_page(int(request.query.get("page", 1)))
+        return web.Response(status=200, text=html, content_type="text/html")
+
+    def _challenge(self, request: web.Request) -> web.Response | None:
+        """Return the cloudflare challenge if the request doesn't carry a valid clearance"""
+
+        if self.config.challenge and (request.cookies.get("cf_clearance") != self._clearance
+                                      or request.headers.get("User-Agent") != USER_AGENT):
+            self.requests["natomanga challenged"] += 1
+            return web.Response(status=403, text=CHALLENGE_PAGE, content_type="text/html",
+                                headers={"cf-mitigated": "challenge"})
+        return None
+
+    async def _mal_manga(self, request: web.Request) -> web.Response:
+        self.requests["mal manga"] += 1
+        if await self._respond_slowly(self.config.latency):
+            self.requests["errors"] += 1
+            return web.json_response({"error": "internal_server_error"}, status=500)
+
+        mal_id = int(request.match_info["mal_id"])
+        if mal_id > self.config.manga_count:
+            return web.json_response({"error": "not_found"}, status=404)
+
+        return web.json_response(_manga_json(mal_id))
+
+    async def _mal_manga_list(self, request: web.Request) -> web.Response:
+        self.requests["mal mangalist"] += 1
+        if await self._respond_slowly(self.config.latency):
+            self.requests["errors"] += 1
+            return web.json_response({"error": "internal_server_error"}, status=500)
+
+        # the node fields are only included if they were requested, like MyAnimeList does
+        with_details = "media_type" in request.query.get("fields", "")
+        limit = int(request.query.get("limit", 10))
+        offset = int(request.query.get("offset", 0))
+        mal_ids = self.manga_ids(request.match_info["username"])
+
+        data = [{"node": _manga_json(mal_id) if with_details else {"id": mal_id, "title": _title(mal_id)},
+                 "list_status": {"status": "reading", "num_chapters_read": self.chapter_count(mal_id) - 1}}
+                for mal_id in mal_ids[offset:offset + limit]]
+        paging = {}
+        if offset + limit < len(mal_ids):
+            paging["next"] = str(request.url.update_query(offset=offset + limit))
+        return web.json_response({"data": data, "paging": paging})
+
+    async def _mal_search(self, request: web.Request) -> web.Response:
+        self.requests["mal search"] += 1
+        if await self._respond_slowly(self.config.latency):
+            self.requests["errors"] += 1
+            return web.json_response({"error": "internal_server_error"}, status=500)
+
+        mal_id = _parse_slug(request.query.get("q", "").replace(" ", "-"))
+        data = [] if mal_id is None else [{"node": {"id": mal_id, "title": _title(mal_id), "media_type": "manga"}}]
+        return web.json_response({"data": data, "paging": {}})
+
+def _title(mal_id: int) -> str:
+    return f"Standin Manga {mal_id}"
+
+def _slug(mal_id: int) -> str:
+    return f"standin-manga-{mal_id}"
+
+def _manga_json(mal_id: int) -> dict:
+    payload = manga_payload()
+    payload["id"] = mal_id
+    payload["title"] = _title(mal_id)
+    payload["alternative_titles"] = {"synonyms": [], "en": _title(mal_id), "ja": ""}
+    return payload
+
+def _parse_slug(slug: str) -> int | None:
+    """Return the manga id contained in a slug like 'standin-manga-12'"""
+
+    prefix = "standin-manga-"
+    if not slug.startswith(prefix) or not slug.removeprefix(prefix).isdecimal():
+        return None
+    return int(slug.removeprefix(prefix))
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments configuring the stand-in to the given parser"""
+
+    parser.add_argument("--latency", type=float, default=0.05, help="The seconds every plain request takes")
+    parser.add_argument("--browser-latency", type=float, default=2.0, help="The seconds FlareSolverr takes per page")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="The chance of a request to fail")
+    parser.add_argument("--challenge", action="store_true", help="Protect natomanga with a cloudflare challenge")
+    parser.add_argument("--manga-count", type=int, default=500, help="The number of existing manga")
+    parser.add_argument("--list-size", type=int, default=20, help="The number of manga on every users' list")
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the random latencies and errors")
+
+def config_from_args(args: argparse.Namespace) -> StandinConfig:
+    """Create the ``StandinConfig`` from the parsed arguments"""
+
+    return StandinConfig(latency=args.latency,
+                         browser_latency=args.browser_latency,
+                         error_rate=args.error_rate,
+                         challenge=args.challenge,
+                         manga_count=args.manga_count,
+                         list_size=args.list_size,
+                         seed=args.seed)
+
+def main() -> None:
+    """Parse the arguments and run the stand-in until it is interrupted"""
+
+    parser = argparse.ArgumentParser("standin")
+    parser.add_argument("--port", type=int, default=8191, help="The port to listen on")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    async def run() -> None:
+        standin = Standin(config_from_args(args))
+        url = await standin.start(port=args.port)
+        print(f"Serving FlareSolverr on {url}/v1, MyAnimeList on {url}/v2 and natomanga on {url}/manga")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await standin.stop()
+            print(dict(standin.requests))
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
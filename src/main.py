@@ -46,6 +46,10 @@ if __name__ == "__main__":
     with open(args.config, "r", encoding="utf8") as cf:
         config: dict[str, typing.Any] = json.load(cf)
 
+    # sharding
+    # all shards run in this process, because the persistent state and the background tasks can't be shared yet
+    shard_count = config.get("sharding", {}).get("shard_count", 0)
+
     # setup logging
     log_level = log.LogLevel.INFO
     if "log_level" in config:
@@ -69,6 +73,8 @@ if __name__ == "__main__":
     VolatileStorage["config_file"] = args.config
     VolatileStorage["modules_to_load"] = config["modules"]
     VolatileStorage["discord_token"] = config["discord_token"]
+    if shard_count > 0:
+        VolatileStorage["shard_count"] = shard_count
 
     if "mal.malnotifier" in config["modules"]:
         if "malnotifier" not in config \
@@ -85,6 +91,11 @@ if __name__ == "__main__":
 
         VolatileStorage["mal.client_id"] = config["malnotifier"]["client_id"]
         VolatileStorage["mal.flare_solverr_ip"] = config["malnotifier"]["flare_solverr_ip"]
+        # the number of pages FlareSolverr loads at once
+        parallelism = config["malnotifier"].get("flare_solverr_parallelism", 2)
+        if not isinstance(parallelism, int) or parallelism < 1:
+            raise ValueError("malnotifier.flare_solverr_parallelism needs to be a positive integer.")
+        VolatileStorage["mal.flare_solverr_parallelism"] = parallelism
 
     if "spotify.spotify" in config["modules"]:
         if "spotify" not in config \
@@ -104,6 +115,8 @@ if __name__ == "__main__":
         VolatileStorage["spotify.client_secret"] = config["spotify"]["client_secret"]
 
     # setup storage directories
+    VolatileStorage["storage_dir"] = storage_dir
+
     VolatileStorage["cache_dir"] = os.path.join(storage_dir, "cache")
     os.makedirs(VolatileStorage["cache_dir"], exist_ok=True)
 
@@ -10,15 +10,59 @@ from abllib.storage import VolatileStorage
 import discord as discordpy
 from discord.ext import commands
 
-from nikobot.util import discord
+from nikobot.util import discord, error, http, jobs
 
 logger = get_logger("core")
 
-class DiscordBot(commands.Bot):
-    """The main ``discord.commands.Bot`` which is the center of the application"""
+# the gateway intents which are always needed for receiving commands
+BASE_INTENTS = ["guilds", "guild_messages", "dm_messages", "message_content"]
+# the additional gateway intents needed by individual modules
+MODULE_INTENTS: dict[str, list[str]] = {
+    "avatar": ["members"],
+    "clear": ["guild_reactions"],
+    "music": ["voice_states", "guild_reactions"]
+}
+# modules which need the message cache, because reactions are only received for cached messages
+MESSAGE_CACHE_MODULES = ["clear", "music"]
+MESSAGE_CACHE_SIZE = 250
+
+def get_intents(modules: list[str]) -> discordpy.Intents:
+    """Return the gateway intents needed by the given modules"""
+
+    intents = discordpy.Intents.none()
+    for intent in BASE_INTENTS:
+        setattr(intents, intent, True)
+
+    for module in modules:
+        for intent in MODULE_INTENTS.get(module, []):
+            setattr(intents, intent, True)
+
+    return intents
+
+def get_message_cache_size(modules: list[str]) -> int | None:
+    """Return the number of messages to cache for the given modules, or None to disable the message cache"""
+
+    if any(module in MESSAGE_CACHE_MODULES for module in modules):
+        return MESSAGE_CACHE_SIZE
+
+    return None
+
+class DiscordBot(commands.AutoShardedBot):
+    """The main ``discord.commands.AutoShardedBot`` which is the center of the application"""
 
     def __init__(self) -> None:
-        super().__init__(command_prefix = "niko.", help_command=None, intents = discordpy.Intents.all())
+        modules = VolatileStorage.get("modules_to_load", default=[])
+
+        # members are never cached, but looked up lazily when needed (e.g. in util.discord.parse_user)
+        # this keeps the memory usage low on large guilds
+        # if shard_count is None, discord recommends the number of shards
+        super().__init__(command_prefix = "niko.",
+                         help_command=None,
+                         shard_count=VolatileStorage.get("shard_count", default=None),
+                         intents=get_intents(modules),
+                         member_cache_flags=discordpy.MemberCacheFlags.none(),
+                         chunk_guilds_at_startup=False,
+                         max_messages=get_message_cache_size(modules))
 
     def start_bot(self):
         """Start the discord bot"""
@@ -39,10 +83,17 @@ class DiscordBot(commands.Bot):
                 await self.load_extension(f"nikobot.modules.{module}")
                 VolatileStorage["modules"].append(module)
 
+    async def close(self) -> None:
+        jobs.cancel_all()
+
+        await super().close()
+
+        await http.close()
+
     async def on_ready(self):
         """Method called when the bot is ready"""
 
-        logger.info(f"{self.user} is now online")
+        logger.info(f"{self.user} is now online with shards {sorted(self.shards.keys())} of {self.shard_count}")
 
     async def on_command_error(self,
                                context: commands.context.Context,
@@ -96,7 +147,31 @@ class DiscordBot(commands.Bot):
                 await discord.reply(context, embed=embed)
                 return
 
-        # all other commands
+        original = exception
+        while hasattr(original, "original"):
+            original = original.original
+
+        if isinstance(original, error.CircuitOpen):
+            # a backend is down and its circuit breaker is open
+            embed = discordpy.Embed(title="This service is currently unavailable",
+                                    description=f"Please try again in {original.retry_after} seconds",
+                                    color=discordpy.Color.orange())
+        else:
+            # all other commands
+            await self._notify_owner(context, exception)
+            embed = discordpy.Embed(title="An error occured!",
+                                  color=discordpy.Color.red())
+
+        message = await discord.get_reply(context)
+        if message is not None:
+            await message.edit(embed=embed)
+        else:
+            await discord.reply(context, embed=embed)
+
+        if not isinstance(original, error.CircuitOpen):
+            await super().on_command_error(context, exception)
+
+    async def _notify_owner(self, context: commands.Context, exception: commands.errors.CommandError) -> None:
         # message me with the error traceback
         # code from https://stackoverflow.com/a/73706008/15436169
         try:
@@ -111,16 +186,6 @@ class DiscordBot(commands.Bot):
         except Exception:
             logger.warning("Couldn't notify owner about command error!")
 
-        embed = discordpy.Embed(title="An error occured!",
-                              color=discordpy.Color.red())
-        message = await discord.get_reply(context)
-        if message is not None:
-            await message.edit(embed=embed)
-        else:
-            await discord.reply(context, embed=embed)
-
-        return await super().on_command_error(context, exception)
-
     async def is_owner(self, user: int | discordpy.User, /) -> bool:
         if isinstance(user, int):
             # user is actually user_id
@@ -6,7 +6,6 @@ import pathlib
 from abllib.log import get_logger
 from abllib.storage import VolatileStorage
 import discord as discordpy
-import requests
 from discord.ext import commands
 
 from .. import util
@@ -41,8 +40,8 @@ class Avatar(commands.Cog):
         avatar_dir = str(pathlib.Path(avatars_dir, f"{user_obj}.png").resolve())
 
         # Download the user's avatar
-        response = requests.get(user_obj.avatar.url, timeout=30)
-        if response.status_code == 200:
+        response = await util.http.get(user_obj.avatar.url, tag="avatar.download")
+        if response.status == 200:
             with open(avatar_dir, "wb") as f:
                 f.write(response.content)
         else:
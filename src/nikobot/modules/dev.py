@@ -7,6 +7,7 @@ from abllib.log import get_logger
 from discord import app_commands
 from discord.ext import commands
 
+from ..util import accounting, admission, http, jobs
 from ..util.discord import grouped_normal_command, reply
 
 # pylint: disable=broad-exception-caught
@@ -140,6 +141,109 @@ class Dev(commands.Cog):
         keys = list(storage_obj.keys())
         await reply(ctx, str(keys))
 
+    @grouped_normal_command(
+        "jobs",
+        "list all currently running command jobs",
+        command_group,
+        hidden=True
+    )
+    async def jobs(self, ctx: commands.context.Context):
+        """list all currently running command jobs"""
+
+        running = jobs.running()
+        if len(running) == 0:
+            await reply(ctx, "no jobs are currently running")
+            return
+
+        await reply(ctx, "\n".join(str(job) for job in running))
+
+    @grouped_normal_command(
+        "admission",
+        "list the number of admitted, queued and rejected executions per command",
+        command_group,
+        hidden=True
+    )
+    async def admission(self, ctx: commands.context.Context):
+        """list the number of admitted, queued and rejected executions per command"""
+
+        stats = admission.stats()
+        if len(stats) == 0:
+            await reply(ctx, "no command passed the admission control yet")
+            return
+
+        lines = []
+        for name, counts in sorted(stats.items()):
+            lines.append(f"{name}: {counts['admitted']} admitted, {counts['queued']} queued, "
+                         f"{counts['rejected']} rejected")
+        await reply(ctx, "\n".join(lines))
+
+    @grouped_normal_command(
+        "http",
+        "list the request metrics of every host",
+        command_group,
+        hidden=True
+    )
+    async def http(self, ctx: commands.context.Context):
+        """list the request metrics of every host"""
+
+        sections = {f"http {host}": metrics for host, metrics in sorted(http.stats().items())}
+        if len(sections) == 0:
+            await reply(ctx, "no http requests were sent yet")
+            return
+
+        # the modules sending requests list their own statistics
+        for cog_name in ("MALNotifier", "Spotify"):
+            cog = self.bot.get_cog(cog_name)
+            if cog is not None:
+                sections.update(cog.stats())
+
+        lines = []
+        for name, values in sections.items():
+            lines.append(f"{name}: " + ", ".join(f"{key.replace('_', ' ')} {_format_value(value)}"
+                                                 for key, value in values.items()))
+        await reply(ctx, "\n".join(lines))
+
+    @grouped_normal_command(
+        "usage",
+        "list the top request consumers of the given window, like 30m or 24h",
+        command_group,
+        hidden=True
+    )
+    async def usage(self, ctx: commands.context.Context, window: str = "1h"):
+        """list the top request consumers of the given window, like 30m or 24h"""
+
+        units = {"m": 60, "h": 60 * 60}
+        if len(window) < 2 or window[-1] not in units or not window[:-1].isdecimal():
+            await reply(ctx, "the window needs to be given in minutes or hours, like 30m or 24h")
+            return
+        seconds = int(window[:-1]) * units[window[-1]]
+        if not 0 < seconds <= accounting.MAX_WINDOW:
+            await reply(ctx, "the window can be at most 24h")
+            return
+
+        usage = accounting.usage(seconds)
+        if len(usage) == 0:
+            await reply(ctx, f"no http requests were sent in the last {window}")
+            return
+
+        lines = [f"top consumers in the last {window}:"]
+        for item in usage[:15]:
+            lines.append(f"{item.tag} @ {item.host}: {item.requests} requests, "
+                         f"{item.bytes_received / 1024 / 1024:.2f} MiB, ~{item.projected_daily:.0f}/day")
+
+        hosts: dict[str, float] = {}
+        for item in usage:
+            hosts[item.host] = hosts.get(item.host, 0.0) + item.projected_daily
+        lines.append("projected daily budget use:")
+        for host, projected in sorted(hosts.items(), key=lambda x: x[1], reverse=True):
+            budget = accounting.DAILY_BUDGETS.get(host)
+            if budget is not None:
+                lines.append(f"{host}: ~{projected:.0f} of {budget} requests ({projected / budget:.0%})")
+            else:
+                lines.append(f"{host}: ~{projected:.0f} requests, no budget")
+
+        await reply(ctx, "\n".join(lines))
+
     def _parse_storage(self, storage_name: str) \
        -> _StorageView | _PersistentStorage | _VolatileStorage | _CacheStorage | None:
         storage_name = storage_name.lower().strip()
@@ -155,6 +259,12 @@ class Dev(commands.Cog):
 
         return None
 
+def _format_value(value: int | float | str) -> str:
+    if isinstance(value, float):
+        # rates are often far below 1, so small values keep their significant digits
+        return f"{value:.3g}" if abs(value) < 100 else f"{value:.0f}"
+    return str(value)
+
 async def setup(bot: commands.Bot):
     """Setup the bot_commands cog"""
 
@@ -0,0 +1,101 @@
+"""Module which contains the typed responses of MyAnimeList and FlareSolverr"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+@dataclass(frozen=True)
+class MangaDetails:
+    """The details of a single manga, as returned by the MyAnimeList manga endpoint"""
+
+    id: int
+    title: str
+    title_en: str
+    synonyms: tuple[str, ...]
+    media_type: str
+    status: str
+    picture: str | None
+    score: float
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> MangaDetails:
+        """Create a new ``MangaDetails`` from the already parsed json response"""
+
+        alternative_titles = data.get("alternative_titles", {})
+
+        status = data["status"]
+        if status == "currently_publishing":
+            status = "currently publishing"
+
+        picture = None
+        if "picture" in data:
+            picture = data["picture"]
+        elif "main_picture" in data:
+            picture = data["main_picture"]["large"]
+
+        return MangaDetails(int(data["id"]),
+                            data["title"],
+                            alternative_titles.get("en", ""),
+                            tuple(alternative_titles.get("synonyms", [])),
+                            data["media_type"],
+                            status,
+                            picture,
+                            float(data["mean"]) if "mean" in data else float("nan"))
+
+@dataclass(frozen=True)
+class MangaListEntry:
+    """
+    A single manga on a users' MyAnimeList manga list
+
+    ``details`` is only set if the manga list was requested with the node fields of the manga.
+    """
+
+    mal_id: int
+    read_chapters: int
+    details: MangaDetails | None = None
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> MangaListEntry:
+        """Create a new ``MangaListEntry`` from a single item of the parsed manga list response"""
+
+        node = data["node"]
+
+        details = None
+        if "media_type" in node and "status" in node:
+            details = MangaDetails.from_json(node)
+
+        return MangaListEntry(int(node["id"]), int(data["list_status"]["num_chapters_read"]), details)
+
+@dataclass(frozen=True)
+class FlareSolverrSolution:
+    """The solution of a single FlareSolverr request"""
+
+    status: str
+    message: str
+    challenged: bool
+    http_status: int | None
+    response: str
+    cookies: dict[str, str]
+    user_agent: str | None
+    expires: float | None
+
+    @staticmethod
+    def from_json(data: dict[str, Any]) -> FlareSolverrSolution:
+        """
+        Create a new ``FlareSolverrSolution`` from the already parsed json response
+
+        Raises a ``KeyError`` if the response doesn't contain a solution
+        """
+
+        solution = data["solution"]
+        cookies = solution.get("cookies", [])
+
+        return FlareSolverrSolution(data["status"],
+                                    data.get("message", ""),
+                                    data.get("message", "") != "Challenge not detected!",
+                                    solution.get("status"),
+                                    solution.get("response", ""),
+                                    {cookie["name"]: cookie["value"] for cookie in cookies},
+                                    solution.get("userAgent"),
+                                    min((cookie["expiry"] for cookie in cookies if "expiry" in cookie), default=None))
@@ -17,11 +17,20 @@ class FlareSolverrResponseError(CustomException):
         1: "FlareSolverr responded with an invalid response: {0}"
     }
 
+class FlareSolverrSessionError(CustomException):
+    """Exception raised when FlareSolverr couldn't create a browser session"""
+
+    default_messages = {
+        0: "FlareSolverr couldn't create a browser session",
+        1: "FlareSolverr couldn't create a browser session: {0}"
+    }
+
 class MangaFetchException(CustomException):
     """Exception raised when fetching the manga failed"""
 
     default_messages = {
-        0: "The requested manga could not be fetched"
+        0: "The requested manga could not be fetched",
+        1: "The requested manga could not be fetched: {0}"
     }
 
 class MangaNotFound(CustomException):
@@ -0,0 +1,228 @@
+"""
+Module containing the ``SessionPool``, which keeps FlareSolverr browser sessions open between requests
+
+A FlareSolverr request without a session starts a new browser context, which takes multiple seconds.
+A session keeps its browser context and cookies, so every following request only needs to load the page itself.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from time import monotonic
+from typing import Any, AsyncIterator
+
+from abllib import VolatileStorage, get_logger
+
+from .error import FlareSolverrSessionError
+from ...util import http
+
+logger = get_logger("FlareSolverr")
+
+# the number of sessions kept open, which is also the number of concurrent FlareSolverr requests
+# it should match the number of browsers the FlareSolverr instance can run at once
+POOL_SIZE = 2
+# the number of seconds a request waits for an idle session before giving up
+QUEUE_TIMEOUT = 10 * 60
+# sessions are recycled regularly, because the browser accumulates memory over time
+MAX_SESSION_AGE = 30 * 60
+MAX_SESSION_REQUESTS = 100
+
+@dataclass
+class Session:
+    """A single FlareSolverr browser session"""
+
+    id: str
+    created: float = field(default_factory=monotonic)
+    requests: int = 0
+
+    def is_expired(self) -> bool:
+        """Whether the session should be recycled before its next request"""
+
+        return monotonic() - self.created > MAX_SESSION_AGE or self.requests >= MAX_SESSION_REQUESTS
+
+@dataclass
+class PoolStats:
+    """The statistics of a ``SessionPool``"""
+
+    created: int = 0
+    destroyed: int = 0
+    requests: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    queue_timeouts: int = 0
+    waited_seconds: float = 0.0
+
+class SessionPool():
+    """
+    A pool of FlareSolverr sessions, which routes every request to an idle session
+
+    Every session occupies one of ``size`` slots, whose names stay the same across restarts.
+    Sessions left open by a crash are therefore reused instead of leaking browsers inside FlareSolverr.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, prefix: str = "nikobot") -> None:
+        if not isinstance(size, int): raise TypeError()
+        if not isinstance(prefix, str): raise TypeError()
+        if size <= 0:
+            raise ValueError("size needs to be positive")
+
+        self.size = size
+        self._prefix = prefix
+        self._stats = PoolStats()
+        self._free_slots = [f"{prefix}-{i}" for i in reversed(range(size))]
+        self._idle: list[Session] = []
+        self._busy: dict[str, Session] = {}
+        # created on first use, so that it belongs to the running event loop
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def idle(self) -> int:
+        """Return the number of open sessions waiting for a request"""
+
+        return len(self._idle)
+
+    @property
+    def busy(self) -> int:
+        """Return the number of sessions currently handling a request"""
+
+        return len(self._busy)
+
+    def resize(self, size: int) -> None:
+        """Change the number of sessions, which is only possible before the pool is used"""
+
+        if not isinstance(size, int): raise TypeError()
+        if size <= 0:
+            raise ValueError("size needs to be positive")
+        if len(self._idle) + len(self._busy) > 0 or self._stats.queued > 0:
+            raise RuntimeError("can't resize a pool which is already in use")
+
+        self.size = size
+        self._free_slots = [f"{self._prefix}-{i}" for i in reversed(range(size))]
+        self._semaphore = asyncio.Semaphore(size)
+
+    def stats(self) -> dict[str, int | float]:
+        """Return the number of open sessions and the ``PoolStats``"""
+
+        return {"idle": self.idle, "busy": self.busy, "size": self.size} | asdict(self._stats)
+
+    @asynccontextmanager
+    async def session(self, timeout: float | None = QUEUE_TIMEOUT) -> AsyncIterator[Session]:
+        """
+        Wait for an idle session and hand it out for a single request
+
+        Raises an ``asyncio.TimeoutError`` if no session became idle within ``timeout`` seconds.
+        If the request raises an exception or is cancelled, the session is destroyed and replaced on the next request.
+        """
+
+        await self._wait_for_slot(timeout)
+        try:
+            session = await self._take()
+            self._busy[session.id] = session
+            try:
+                yield session
+            # a cancelled request could leave the browser loading the page, so the session is recycled as well
+            except BaseException:
+                if self._busy.pop(session.id, None) is not None:
+                    logger.info(f"Recycling FlareSolverr session {session.id} after a failed or cancelled request")
+                    await self._destroy(session)
+                raise
+
+            # the session was destroyed by close() in the meantime
+            if self._busy.pop(session.id, None) is None:
+                return
+
+            session.requests += 1
+            self._stats.requests += 1
+            self._idle.append(session)
+        finally:
+            self._get_semaphore().release()
+
+    async def warm(self) -> None:
+        """Open sessions until the pool is full, so that the first requests don't need to wait for a browser"""
+
+        for _ in range(self.size):
+            async with self._get_semaphore():
+                if len(self._free_slots) == 0:
+                    return
+
+                try:
+                    self._idle.append(await self._create(self._free_slots.pop()))
+                # pylint: disable-next=broad-exception-caught
+                except Exception as e:
+                    logger.warning(f"Couldn't warm up FlareSolverr session: {e}")
+                    return
+
+    async def close(self) -> None:
+        """Destroy all open sessions"""
+
+        sessions = self._idle + list(self._busy.values())
+        self._idle.clear()
+        self._busy.clear()
+
+        for session in sessions:
+            await self._destroy(session)
+
+    async def _wait_for_slot(self, timeout: float | None) -> None:
+        start = monotonic()
+        self._stats.queued += 1
+        self._stats.max_queued = max(self._stats.max_queued, self._stats.queued)
+        try:
+            await asyncio.wait_for(self._get_semaphore().acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._stats.queue_timeouts += 1
+            raise
+        finally:
+            self._stats.queued -= 1
+            self._stats.waited_seconds += monotonic() - start
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        return self._semaphore
+
+    async def _take(self) -> Session:
+        while len(self._idle) > 0:
+            session = self._idle.pop()
+            if not session.is_expired():
+                return session
+
+            logger.debug(f"Recycling expired FlareSolverr session {session.id}")
+            await self._destroy(session)
+
+        # every session holding a slot is either idle or busy, so this only happens if a session was lost
+        if len(self._free_slots) == 0:
+            raise FlareSolverrSessionError.with_values("no free session slot left")
+
+        return await self._create(self._free_slots.pop())
+
+    async def _create(self, slot: str) -> Session:
+        try:
+            json_res = await _send({"cmd": "sessions.create", "session": slot})
+            if json_res.get("status") != "ok":
+                raise FlareSolverrSessionError.with_values(json_res.get("message", json_res))
+        except BaseException:
+            self._free_slots.append(slot)
+            raise
+
+        logger.debug(f"Created FlareSolverr session {slot}")
+        self._stats.created += 1
+        return Session(slot)
+
+    async def _destroy(self, session: Session) -> None:
+        self._stats.destroyed += 1
+        self._free_slots.append(session.id)
+
+        try:
+            await _send({"cmd": "sessions.destroy", "session": session.id})
+        # the session is gone anyways if FlareSolverr isn't reachable
+        # pylint: disable-next=broad-exception-caught
+        except Exception as e:
+            logger.warning(f"Couldn't destroy FlareSolverr session {session.id}: {e}")
+
+async def _send(data: dict[str, Any]) -> dict[str, Any]:
+    r = await http.post(f"http://{VolatileStorage['mal.flare_solverr_ip']}/v1",
+                        headers={"Content-Type": "application/json"},
+                        json=data,
+                        timeout=30,
+                        tag="mal.flaresolverr_session")
+    return r.json()
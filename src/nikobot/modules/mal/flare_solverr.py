@@ -1,97 +1,340 @@
 """Module containing functions for comunicating with the FlareSolverr instance"""
 
+import asyncio
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
+from time import monotonic
+from urllib.parse import urlsplit
 
-import requests
-from abllib import VolatileStorage, get_logger, NamedLock
+import aiohttp
+from abllib import VolatileStorage, get_logger
 
-from .error import FlareSolverrResponseError
+from .dclasses import FlareSolverrSolution
+from .error import FlareSolverrResponseError, FlareSolverrSessionError, MangaFetchException
+from .flare_sessions import POOL_SIZE, SessionPool
+from ...util import http
+from ...util.ratelimit import AdaptiveLimiter, CircuitBreaker
+from ...util.singleflight import coalesce
 
 logger = get_logger("FlareSolverr")
 
-@NamedLock("FlareSolverr_solve")
-def solve(key: str, url: str) -> tuple[dict[str, str], dict[str, str]]:
+# every request is sent through one of the open browser sessions
+sessions = SessionPool()
+
+# the requests per second sent to every scraped host, adapted to how the host responds
+HOST_RATE = 0.2
+HOST_MIN_RATE = 1 / 60
+HOST_MAX_RATE = 1.0
+# the number of seconds FlareSolverr may take to load a single page
+REQUEST_TIMEOUT = 60
+# the status codes of the scraped page which mean that we are sending too many requests
+THROTTLE_STATUS_CODES = [429, 502, 503, 504]
+
+# the number of seconds we remember that a host doesn't use a cloudflare challenge
+NO_CHALLENGE_TTL = 60 * 60
+# if freshly solved cookies are rejected, e.g. because FlareSolverr uses a different IP,
+# they aren't replayed again for this number of seconds
+REPLAY_BACKOFF = 60 * 60
+REPLAY_MIN_AGE = 5 * 60
+# strings contained in cloudflare challenge pages
+CHALLENGE_MARKERS = ["<title>Just a moment...</title>", "challenge-platform", "cf-browser-verification"]
+
+@dataclass
+class FetchStats:
+    """The statistics of all fetched pages"""
+
+    direct: int = 0
+    challenged: int = 0
+    browser: int = 0
+
+fetch_stats = FetchStats()
+
+_limiters: dict[str, AdaptiveLimiter] = {}
+_breakers: dict[str, CircuitBreaker] = {}
+_replay_disabled_until: dict[str, float] = {}
+
+async def solve(key: str, url: str) -> tuple[dict[str, str], dict[str, str]]:
     """
     Try to obtain cloudflare cookies, which are returned.
     
     If cookies are already cached under the specified key, use them instead.
     """
 
-    if f"flaresolverr.{key}" in VolatileStorage:
-        cached = VolatileStorage[f"flaresolverr.{key}"]
-        if datetime.fromtimestamp(cached["expires"]) > (datetime.now() + timedelta(minutes=1)):
-            logger.debug("Using cached cf cookies")
-            return (cached["jar"], cached["headers"])
-
-        logger.debug("Removing cached cf cookies")
-        del VolatileStorage[f"flaresolverr.{key}"]
+    clearance, _, _ = await _solve(key, url)
+    return clearance
 
-    logger.info("Requesting new CloudFlare token from FlareSolverr")
+@coalesce("flaresolverr.fetch", grace=60, key=lambda key, url: url)
+async def fetch(key: str, url: str) -> str:
+    """
+    Fetch the given url directly, replaying the cloudflare cookies cached under the specified key.
 
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "cmd": "request.get",
-        "url": url,
-        "maxTimeout": 60000
-    }
-    r = requests.post(
-        f"http://{VolatileStorage['mal.flare_solverr_ip']}/v1",
-        timeout=30,
-        headers=headers,
-        json=data
-    )
-
-    if "status" in r.json() and r.json()["message"] == "Challenge not detected!":
-        logger.debug("No cf challenge necessary")
-        return ({}, {})
+    The page is only fetched with FlareSolverr if no cookies are cached yet or the host responds with a challenge.
+    The solution of FlareSolverr then replaces the cached cookies.
+    If the cookies were solved using the requested page, that page is returned instead of fetching it again.
+    """
 
-    if "solution" not in r.json() or r.json()["status"] != "ok":
-        raise FlareSolverrResponseError.with_values(r.json())
+    # a second try with freshly solved cookies, in case the cached ones were revoked
+    for _ in range(2):
+        if _replay_disabled_until.get(key, 0.0) > monotonic():
+            break
 
-    solution = r.json()["solution"]
+        # concurrent fetches without cached cookies share a single FlareSolverr solve
+        clearance, solved_url, solution = await _solve(key, url)
+        if solution is not None and solved_url == url:
+            return solution.response
 
-    jar = {}
-    for cookie in solution["cookies"]:
-        jar[cookie["name"]] = cookie["value"]
+        content = await _fetch_direct(url, *clearance)
+        if content is not None:
+            fetch_stats.direct += 1
+            return content
 
-    headers = {
-        "User-Agent": solution["userAgent"]
-    }
+        fetch_stats.challenged += 1
+        _reject_clearance(key)
 
-    VolatileStorage[f"flaresolverr.{key}"] = {
-        "expires": min((cookie["expiry"] for cookie in solution["cookies"])),
-        "jar": jar,
-        "headers": headers
-    }
+    solution = await _request(url)
+    _cache_clearance(key, solution)
 
-    return (jar, headers)
+    return solution.response
 
-@NamedLock("FlareSolverr_solve")
-def get(url: str) -> str:
+@coalesce("flaresolverr.get", grace=60)
+async def get(url: str) -> str:
     """
     Try to fetch the given url, solving any cloudflare challenge on the way.
     """
 
     logger.info("Requesting url with FlareSolverr")
 
-    headers = {"Content-Type": "application/json"}
-    data = {
-        "cmd": "request.get",
-        "url": url,
-        "maxTimeout": 60000
+    solution = await _request(url)
+
+    if not solution.challenged:
+        logger.debug("No cf challenge necessary")
+
+    return solution.response
+
+async def close() -> None:
+    """Destroy all open FlareSolverr sessions"""
+
+    await sessions.close()
+
+def limiter(host: str) -> AdaptiveLimiter:
+    """Return the adaptive rate limiter of the given host"""
+
+    if host not in _limiters:
+        _limiters[host] = AdaptiveLimiter(host, HOST_RATE, HOST_MIN_RATE, HOST_MAX_RATE)
+    return _limiters[host]
+
+def breaker(host: str) -> CircuitBreaker:
+    """Return the circuit breaker of the given host, or of FlareSolverr itself if host is 'flaresolverr'"""
+
+    if host not in _breakers:
+        _breakers[host] = CircuitBreaker(host)
+    return _breakers[host]
+
+def stats() -> dict[str, dict[str, int | float | str]]:
+    """Return the statistics of the sessions, the fetched pages and the limiter and circuit breaker of every host"""
+
+    sections = {
+        "flaresolverr sessions": sessions.stats(),
+        "scraping": asdict(fetch_stats)
     }
-    r = requests.post(
-        f"http://{VolatileStorage['mal.flare_solverr_ip']}/v1",
-        timeout=30,
-        headers=headers,
-        json=data
-    )
-
-    if "status" in r.json() and r.json()["message"] == "Challenge not detected!":
+    for host, host_limiter in sorted(_limiters.items()):
+        sections[f"{host} limiter"] = {"rate": host_limiter.rate, "throttled": host_limiter.throttled}
+    for host, host_breaker in sorted(_breakers.items()):
+        sections[f"{host} circuit breaker"] = {"state": host_breaker.state,
+                                               "failures": host_breaker.failures,
+                                               "rejected": host_breaker.rejected}
+    return sections
+
+def is_challenge(res: http.Response) -> bool:
+    """Return whether the given response is a cloudflare challenge instead of the requested page"""
+
+    if res.headers.get("cf-mitigated") == "challenge":
+        return True
+
+    if res.status not in (403, 503):
+        return False
+
+    body = res.text()
+    return any(marker in body for marker in CHALLENGE_MARKERS)
+
+def _setup():
+    # the semaphore of the pool is created here, inside the running event loop
+    sessions.resize(VolatileStorage.get("mal.flare_solverr_parallelism", default=POOL_SIZE))
+
+@coalesce("flaresolverr.solve", key=lambda key, url: key)
+async def _solve(key: str, url: str) -> tuple[tuple[dict[str, str], dict[str, str]], str, FlareSolverrSolution | None]:
+    """
+    Return the cached cloudflare cookies, or solve new ones by loading the given url with FlareSolverr
+
+    Besides the cookies, the url and solution of a new solve are returned, so the loaded page isn't thrown away.
+    Concurrent callers share the solve of the first one, whose url can differ from their own.
+    """
+
+    clearance = _cached_clearance(key)
+    if clearance is not None:
+        logger.debug("Using cached cf cookies")
+        return clearance, url, None
+
+    logger.info("Requesting new CloudFlare token from FlareSolverr")
+
+    solution = await _request(url)
+
+    if not solution.challenged:
         logger.debug("No cf challenge necessary")
-        return r.json()["solution"]["response"]
 
-    if "solution" not in r.json() or r.json()["status"] != "ok":
-        raise FlareSolverrResponseError.with_values(r.json())
+    return _cache_clearance(key, solution), url, solution
+
+async def _request(url: str) -> FlareSolverrSolution:
+    """Let FlareSolverr fetch the given url and return the parsed solution"""
+
+    host = urlsplit(url).hostname or ""
+
+    # fail fast if either FlareSolverr or the host is known to be down
+    breaker("flaresolverr").check()
+    breaker(host).check()
+
+    await limiter(host).acquire()
+
+    fetch_stats.browser += 1
+    try:
+        async with sessions.session() as session:
+            r = await http.post(f"http://{VolatileStorage['mal.flare_solverr_ip']}/v1",
+                                headers={"Content-Type": "application/json"},
+                                json={
+                                    "cmd": "request.get",
+                                    "url": url,
+                                    "session": session.id,
+                                    "maxTimeout": REQUEST_TIMEOUT * 1000
+                                },
+                                # leave FlareSolverr enough time to report its own timeout
+                                timeout=REQUEST_TIMEOUT + 30,
+                                retries=0,
+                                tag="mal.scrape_browser")
+            # the body can contain a whole html page, so it is only parsed once
+            json_res = r.json()
+
+            if "solution" not in json_res or json_res.get("status") != "ok":
+                # raised inside the session, so that it is recycled
+                raise FlareSolverrResponseError.with_values(json_res)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, FlareSolverrSessionError):
+        breaker("flaresolverr").record_failure()
+        raise
+    except FlareSolverrResponseError:
+        # FlareSolverr works, but couldn't load the page, e.g. because of a timeout
+        breaker("flaresolverr").record_success()
+        breaker(host).record_failure()
+        limiter(host).record_throttle()
+        raise
+
+    breaker("flaresolverr").record_success()
+
+    solution = FlareSolverrSolution.from_json(json_res)
+
+    if solution.http_status in THROTTLE_STATUS_CODES:
+        limiter(host).record_throttle()
+        if solution.http_status >= 500:
+            breaker(host).record_failure()
+        raise FlareSolverrResponseError.with_values(f"{host} responded with status {solution.http_status}")
+
+    breaker(host).record_success()
+    if solution.challenged:
+        # the challenge was solved, but the host is suspicious of our request rate
+        limiter(host).record_throttle()
+    else:
+        limiter(host).record_success()
+
+    return solution
+
+async def _fetch_direct(url: str, jar: dict[str, str], headers: dict[str, str]) -> str | None:
+    """Fetch the given url without FlareSolverr, returning None if the host responded with a challenge"""
+
+    host = urlsplit(url).hostname or ""
+
+    breaker(host).check()
+
+    await limiter(host).acquire()
+
+    request_headers = dict(headers)
+    if len(jar) > 0:
+        request_headers["Cookie"] = "; ".join(f"{name}={value}" for name, value in jar.items())
+
+    try:
+        # challenges are also sent with status 503, so server errors aren't retried
+        res = await http.get(url, headers=request_headers, retries=0, rate_limit_retries=0, tag="mal.scrape")
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        breaker(host).record_failure()
+        raise
+
+    if is_challenge(res):
+        return None
+
+    if res.status in THROTTLE_STATUS_CODES:
+        limiter(host).record_throttle()
+        if res.status >= 500:
+            breaker(host).record_failure()
+        raise MangaFetchException.with_values(f"{host} responded with status {res.status}")
+
+    breaker(host).record_success()
+    limiter(host).record_success()
+
+    return res.text()
+
+def _reject_clearance(key: str) -> None:
+    """Remove the cookies cached under the given key, because the host responded with a challenge"""
+
+    cached = VolatileStorage.get(f"flaresolverr.{key}", default=None)
+    if cached is None:
+        # a concurrent fetch already removed them
+        return
+
+    if datetime.now().timestamp() - cached["solved"] < REPLAY_MIN_AGE:
+        logger.warning(f"Freshly solved cf cookies for {key} were rejected, "
+                       f"not replaying them for {REPLAY_BACKOFF} seconds")
+        _replay_disabled_until[key] = monotonic() + REPLAY_BACKOFF
+    else:
+        logger.debug(f"Cached cf cookies for {key} were rejected")
+
+    del VolatileStorage[f"flaresolverr.{key}"]
+
+def _cached_clearance(key: str) -> tuple[dict[str, str], dict[str, str]] | None:
+    """Return the cookies and headers cached under the given key, or None if they are missing or expired"""
+
+    if f"flaresolverr.{key}" not in VolatileStorage:
+        return None
+
+    cached = VolatileStorage[f"flaresolverr.{key}"]
+    if datetime.fromtimestamp(cached["expires"]) > (datetime.now() + timedelta(minutes=1)):
+        return (cached["jar"], cached["headers"])
+
+    logger.debug("Removing cached cf cookies")
+    del VolatileStorage[f"flaresolverr.{key}"]
+    return None
+
+def _cache_clearance(key: str, solution: FlareSolverrSolution) -> tuple[dict[str, str], dict[str, str]]:
+    """Cache the cookies and headers of the given solution under the given key and return them"""
+
+    headers = {}
+    if solution.user_agent is not None:
+        # cf_clearance cookies only work together with the User-Agent which solved the challenge
+        headers["User-Agent"] = solution.user_agent
+
+    if not solution.challenged:
+        # remember that no cookies are needed, so that the next requests can skip FlareSolverr
+        expires = datetime.now().timestamp() + NO_CHALLENGE_TTL
+        VolatileStorage[f"flaresolverr.{key}"] = {
+            "expires": expires,
+            "solved": datetime.now().timestamp(),
+            "jar": {},
+            "headers": headers
+        }
+        return ({}, headers)
+
+    if solution.expires is not None:
+        VolatileStorage[f"flaresolverr.{key}"] = {
+            "expires": solution.expires,
+            "solved": datetime.now().timestamp(),
+            "jar": solution.cookies,
+            "headers": headers
+        }
 
-    return r.json()["solution"]["response"]
+    return (solution.cookies, headers)
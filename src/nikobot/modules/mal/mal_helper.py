@@ -1,83 +1,98 @@
 """Module containing functions for interacting with the MyAnimeList API"""
 
-from typing import Any
+import threading
+from typing import AsyncIterator
 
-import requests
+from abllib import fs, onexit
 from abllib.storage import VolatileStorage
 
 from . import error
+from .dclasses import MangaDetails, MangaListEntry
+from ...util.httpcache import HttpCache
+from ...util.singleflight import coalesce
 
 BASE_URL = "https://api.myanimelist.net/v2"
 HEADERS = {
     "X-MAL-CLIENT-ID": ""
 }
 
-def get_manga_from_id(mal_id: int) -> dict[str, Any]:
+# the number of seconds responses without ETag or Last-Modified are reused
+MANGA_TTL = 24 * 60 * 60
+SEARCH_TTL = 60 * 60
+# manga lists change whenever the user reads a chapter, so they are only reused after a successful revalidation
+MANGA_LIST_TTL = 0
+# the number of manga list entries requested per page, MyAnimeList allows up to 1000
+MANGA_LIST_PAGE_SIZE = 100
+
+cache = HttpCache("mal")
+
+@coalesce("mal.manga", grace=60)
+async def get_manga_from_id(mal_id: int) -> MangaDetails:
     """Get a specific manga from MyAnimeList"""
 
-    r = requests.get(f"{BASE_URL}/manga/{mal_id}?nsfw=true" \
-                     + "&fields=id,title,alternative_titles,main_picture,mean,media_type," \
-                     + "status,genres,my_list_status,authors{first_name,last_name}",
-                     headers=HEADERS,
-                     timeout=30)
+    r = await cache.get(f"{BASE_URL}/manga/{mal_id}?nsfw=true" \
+                        + "&fields=id,title,alternative_titles,main_picture,mean,media_type," \
+                        + "status,genres,my_list_status,authors{first_name,last_name}",
+                        headers=HEADERS,
+                        ttl=MANGA_TTL,
+                        tag="mal.manga")
+
+    json_res = r.json()
 
-    if "error" in r.json():
-        if r.json()["error"] == "not_found":
+    if "error" in json_res:
+        if json_res["error"] == "not_found":
             raise error.MangaNotFound()
 
-        raise error.MALResponseError(r.json()["error"])
+        raise error.MALResponseError(json_res["error"])
 
-    if not _supported_media_type(r.json()["media_type"]):
+    if not _supported_media_type(json_res["media_type"]):
         raise error.MediaTypeError("Currently only supports manga/manhwa and not light novel/novel")
 
-    to_return = {
-        "id": r.json()["id"],
-        "title": r.json()["title"],
-        "title_en": r.json()["alternative_titles"]["en"],
-        "synonyms": r.json()["alternative_titles"]["synonyms"]
-    }
+    return MangaDetails.from_json(json_res)
+
+@coalesce("mal.mangalist", grace=30)
+async def get_manga_list_from_username(mal_username: str) -> list[MangaListEntry]:
+    """Get the whole manga list from a specific MyAnimeList user"""
+
+    return [entry async for entry in iter_manga_list(mal_username)]
 
-    if r.json()["status"] == "currently_publishing":
-        to_return["status"] = "currently publishing"
-    else:
-        to_return["status"] = r.json()["status"]
+async def iter_manga_list(mal_username: str, page_size: int = MANGA_LIST_PAGE_SIZE) -> AsyncIterator[MangaListEntry]:
+    """
+    Yield the manga list from a specific MyAnimeList user, requesting the next page only when it is needed
 
-    if "picture" in r.json():
-        to_return["picture"] = r.json()["picture"]
-    elif "main_picture" in r.json():
-        to_return["picture"] = r.json()["main_picture"]["large"]
+    The details of every manga are requested together with the list, so they don't need to be fetched one by one.
+    Light novels and novels are left out, because only manga are supported.
+    """
 
-    if "mean" in r.json():
-        to_return["score"] = float(r.json()["mean"])
-    else:
-        to_return["score"] = float("nan")
+    if not isinstance(page_size, int): raise TypeError()
 
-    return to_return
+    url = f"{BASE_URL}/users/{mal_username}/mangalist?nsfw=true" \
+          + "&fields=list_status,alternative_titles,main_picture,mean,media_type,status" \
+          + f"&status=reading&limit={page_size}"
 
-def get_manga_list_from_username(mal_username: str) -> list[dict[str, str | int]]:
-    """Get the manga list from a specific MyAnimeList user"""
+    while url is not None:
+        r = await cache.get(url,
+                            headers=HEADERS,
+                            ttl=MANGA_LIST_TTL,
+                            tag="mal.mangalist")
 
-    r = requests.get(f"{BASE_URL}/users/{mal_username}/mangalist?nsfw=true" \
-                     + "&fields=list_status&status=reading&limit=1000",
-                     headers=HEADERS,
-                     timeout=30)
+        json_res = r.json()
 
-    if "error" in r.json():
-        if r.json()["error"] == "not_found":
-            raise error.UserNotFound()
+        if "error" in json_res:
+            if json_res["error"] == "not_found":
+                raise error.UserNotFound()
 
-        raise error.MALResponseError(r.json()["error"])
+            raise error.MALResponseError(json_res["error"])
 
-    return_data = []
-    for manga_json in r.json()["data"]:
-        return_data.append({
-            "mal_id": manga_json["node"]["id"],
-            "read_chapters": manga_json["list_status"]["num_chapters_read"]
-        })
+        for manga_json in json_res["data"]:
+            entry = MangaListEntry.from_json(manga_json)
+            if entry.details is None or _supported_media_type(entry.details.media_type):
+                yield entry
 
-    return return_data
+        url = json_res.get("paging", {}).get("next")
 
-def search_for_manga(title: str) -> int | None:
+@coalesce("mal.search", grace=60, key=lambda title: title.lower())
+async def search_for_manga(title: str) -> int | None:
     """
     Search for the given manga name
 
@@ -86,15 +101,18 @@ def search_for_manga(title: str) -> int | None:
 
     title_sanitized = title.lower()
 
-    r = requests.get(f"{BASE_URL}/manga?nsfw=true&fields=media_type&q={title_sanitized}&limit=5",
-                     headers=HEADERS,
-                     timeout=30)
+    r = await cache.get(f"{BASE_URL}/manga?nsfw=true&fields=media_type&q={title_sanitized}&limit=5",
+                        headers=HEADERS,
+                        ttl=SEARCH_TTL,
+                        tag="mal.search")
+
+    json_res = r.json()
 
-    if "error" in r.json():
-        raise error.MALResponseError(r.json()["error"])
+    if "error" in json_res:
+        raise error.MALResponseError(json_res["error"])
 
     try:
-        for manga in r.json()["data"]:
+        for manga in json_res["data"]:
             if _supported_media_type(manga["node"]["media_type"]):
                 return int(manga["node"]["id"])
     except KeyError:
@@ -112,3 +130,9 @@ def _supported_media_type(media_type) -> bool:
 
 def _setup():
     HEADERS["X-MAL-CLIENT-ID"] = VolatileStorage["mal.client_id"]
+
+    cache.load(fs.absolute(VolatileStorage["cache_dir"], "mal", "http_cache.json"))
+
+    # signal.signal callbacks don't work in subthreads (only occurs in tests anyways)
+    if threading.current_thread() is threading.main_thread():
+        onexit.register("save_mal_http_cache", cache.save)
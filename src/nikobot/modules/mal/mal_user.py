@@ -1,28 +1,35 @@
 """A module containing the ``MALUser`` class"""
 
 from __future__ import annotations
+
+import asyncio
 from typing import Any
 
 from abllib.storage import PersistentStorage
 
-from . import error, mal_helper
-from .manga import Manga
+from . import error, mal_helper, registry
+from .reading_state import ReadingState
 
 class MALUser():
     """
     A class representing a MyAnimeList account
 
     Each instance is bound to a single discord account
+    The ``Manga`` themselves are shared through the ``registry``, the user only keeps its ``ReadingState`` per manga.
     """
 
     def __init__(self, mal_username: str, discord_id: int) -> None:
         self.username: str = mal_username
         self.discord_id: int = discord_id
-        self.manga: dict[int, Manga] = {}
+        self.manga: dict[int, ReadingState] = {}
 
     @staticmethod
     def from_export(discord_user_id: int, export: dict[str, Any]) -> MALUser:
-        """Factory method creating a new MALUser object using the export data created by my_user.export()"""
+        """
+        Factory method creating a new MALUser object using the export data created by my_user.export()
+
+        No request is sent, the ``Manga`` themselves are restored by the ``registry``.
+        """
 
         if not isinstance(discord_user_id, int):
             raise TypeError()
@@ -32,17 +39,18 @@ class MALUser():
             raise TypeError()
 
         maluser = MALUser(export["mal_username"], discord_user_id)
-        for manga in export["manga"]:
-            maluser.add_manga(Manga.from_export(manga))
+        for manga_export in export["manga"]:
+            registry.restore_provider(manga_export)
+            maluser.add_manga(ReadingState.from_export(manga_export))
         return maluser
 
-    def add_manga(self, manga: Manga) -> None:
-        """Add a single ``Manga`` instance to the current user"""
+    def add_manga(self, state: ReadingState) -> None:
+        """Add the ``ReadingState`` of a single manga to the current user"""
 
-        if not isinstance(manga, Manga):
+        if not isinstance(state, ReadingState):
             raise TypeError()
 
-        self.manga[manga.mal_id] = manga
+        self.manga[state.mal_id] = state
 
     def export(self) -> dict[str, Any]:
         """Create a dictionary which is JSON-compliant and can be used to recreate this exact User"""
@@ -50,42 +58,72 @@ class MALUser():
         return {
             "mal_username": self.username,
             "manga": [
-                manga.export() for manga in self.manga.values()
+                state.export() for state in self.manga.values()
             ]
         }
 
-    def fetch_manga_chapters(self) -> None:
+    async def fetch_manga_chapters(self) -> None:
         """Fetch the released number of chapters from the respective providers"""
 
-        for manga in self.manga.values():
+        async def fetch(mal_id: int) -> None:
             try:
-                manga.fetch_chapters()
+                manga = await registry.fetch(mal_id)
+                await manga.fetch_chapters()
             except Exception as e:
-                raise error.MangaFetchException(f"Error fetching manga {manga.mal_id}: {e.args[0]}")
-
-    def fetch_manga_list(self) -> None:
-        """Fetch the users manga list from MyAnimeList"""
-
-        manga_list = mal_helper.get_manga_list_from_username(self.username)
-        for entry in manga_list:
-            mal_id = int(entry["mal_id"])
-            if mal_id in self.manga:
-                self.manga[mal_id].set_chapters_read(entry["read_chapters"])
-            else:
+                raise error.MangaFetchException(f"Error fetching manga {mal_id}: {e.args[0]}")
+
+        results = await asyncio.gather(*[fetch(mal_id) for mal_id in self.manga], return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def fetch_manga_list(self) -> None:
+        """
+        Fetch the users manga list from MyAnimeList
+
+        The entries are processed page by page while the list is streamed in.
+        Manga are only removed after the whole list was received, so a failed request never drops any manga.
+        """
+
+        listed_mal_ids = set()
+        async for entry in mal_helper.iter_manga_list(self.username):
+            mal_id = entry.mal_id
+            listed_mal_ids.add(mal_id)
+            if mal_id not in self.manga:
                 try:
-                    manga = Manga.from_mal_id(mal_id)
-                    manga.set_chapters_read(entry["read_chapters"])
-                    self.manga[mal_id] = manga
+                    await registry.fetch(mal_id, entry.details)
                 except error.MediaTypeError:
-                    pass
+                    continue
+                self.manga[mal_id] = ReadingState(mal_id)
+            elif entry.details is not None:
+                # the details of the list keep the status and titles of the registered manga up to date
+                await registry.fetch(mal_id, entry.details)
+
+            self.manga[mal_id].set_chapters_read(entry.read_chapters)
 
         # remove manga that no longer have the 'Reading' status on MAL
-        correct_mal_ids = [int(entry["mal_id"]) for entry in manga_list]
         for mal_id in list(self.manga.keys()):
-            if mal_id not in correct_mal_ids:
+            if mal_id not in listed_mal_ids:
                 self.manga.pop(mal_id)
 
     def save_to_storage(self) -> None:
         """Save the current object to the ``PersistentStorage``"""
 
         PersistentStorage[f"mal.user.{self.discord_id}"] = self.export()
+
+def saved_mal_ids() -> set[int]:
+    """
+    Return the ids of all manga followed by the users saved to the ``PersistentStorage``
+
+    This includes users which couldn't be imported, whose manga must not be removed from the ``registry``.
+    """
+
+    mal_ids = set()
+    for export in PersistentStorage.get("mal.user", default={}).values():
+        if not isinstance(export, dict) or not isinstance(export.get("manga"), list):
+            continue
+
+        for manga_export in export["manga"]:
+            if isinstance(manga_export, dict) and isinstance(manga_export.get("mal_id"), int):
+                mal_ids.add(manga_export["mal_id"])
+    return mal_ids
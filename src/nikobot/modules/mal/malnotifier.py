@@ -1,12 +1,13 @@
 """A module containing MyAnimeList-related commands"""
 
+import asyncio
 import os
-from asyncio import sleep
+from dataclasses import asdict
 from datetime import datetime, timedelta
-from threading import Thread
+from time import time
 
+import aiohttp
 import discord as discordpy
-import requests
 from abllib import fs
 from abllib.log import get_logger
 from abllib.storage import PersistentStorage, VolatileStorage
@@ -15,9 +16,12 @@ from discord.ext import commands, tasks
 from PIL import Image, ImageDraw
 
 from ... import util
-from . import error, mal_helper, manganato_helper, natomanga_helper
-from .mal_user import MALUser
-from .manga import Manga
+from . import error, flare_solverr, mal_helper, manganato_helper, natomanga_helper, polling, registry
+from . import resolution_cache, update_scanner
+from .mal_user import MALUser, saved_mal_ids
+from .manga import Manga, MangaProvider
+from .reading_state import ReadingState
+from .scheduler import CheckScheduler
 
 # pylint: disable=protected-access
 
@@ -34,11 +38,21 @@ class MALNotifier(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
         self.users = []
+        self.import_task: asyncio.Task | None = None
+        self.warm_task: asyncio.Task | None = None
+        self.scheduler = CheckScheduler(self._check_manga)
+
+    async def cog_unload(self) -> None:
+        """Stop the scheduled checks and destroy the FlareSolverr sessions"""
+
+        await self.scheduler.stop()
+        await flare_solverr.close()
 
     @util.discord.grouped_hybrid_command(
             name="manga",
             description="Search for a manga on MyAnimeList",
-            command_group=command_group
+            command_group=command_group,
+            cost=util.admission.Cost(backends=("mal", "natomanga"))
     )
     async def manga(self, ctx: commands.context.Context | discordpy.interactions.Interaction, title: str):
         """The discord command 'niko.mal.manga'"""
@@ -46,14 +60,20 @@ class MALNotifier(commands.Cog):
         user_id = util.discord.get_user_id(ctx)
         manga = await self.get_manga(title, user_id, ctx)
 
+        chapters_read = None
+        maluser: MALUser | None = VolatileStorage.get(f"mal.user.{user_id}", default=None)
+        if maluser is not None and manga.mal_id in maluser.manga:
+            chapters_read = maluser.manga[manga.mal_id].chapters_read
+
         # pylint: disable-next=redefined-outer-name
-        embed, file = manga.to_embed()
+        embed, file = await manga.to_embed(chapters_read)
         await util.discord.reply(ctx, embed=embed, file=file)
 
     @util.discord.grouped_hybrid_command(
             name="palette",
             description="Search for a manga on MyAnimeList and display its dominant colors",
-            command_group=command_group
+            command_group=command_group,
+            cost=util.admission.Cost(backends=("mal",))
     )
     async def palette(self, ctx: commands.context.Context | discordpy.interactions.Interaction, title: str):
         """The discord command 'niko.mal.palette'"""
@@ -61,8 +81,8 @@ class MALNotifier(commands.Cog):
         user_id = util.discord.get_user_id(ctx)
         manga = await self.get_manga(title, user_id, ctx)
 
-        cover_image = Image.open(manga.picture_file())
-        dominant_colors = manga.get_dominant_colors(10)
+        cover_image = Image.open(await manga.picture_file())
+        dominant_colors = await manga.get_dominant_colors(10)
 
         # general size variables
         orig_size = cover_image.size
@@ -84,14 +104,15 @@ class MALNotifier(commands.Cog):
         palette_img.save(path)
 
         embed = Embed(title=manga.title,
-                      color=Color.from_rgb(*manga.get_color().rgb()))
+                      color=Color.from_rgb(*(await manga.get_color()).rgb()))
         embed.set_image(url=f"attachment://{os.path.basename(path)}")
         await util.discord.reply(ctx, embed=embed, file=File(path))
 
     @util.discord.grouped_hybrid_command(
         name="register",
         description="Register an existing MyAnimeList account for use with the discord bot",
-        command_group=command_group
+        command_group=command_group,
+        cost=util.admission.Cost(backends=("mal", "natomanga"), tokens=2)
     )
     async def register(self, ctx: commands.context.Context | discordpy.interactions.Interaction, username: str):
         """The discord command 'niko.mal.register'"""
@@ -102,18 +123,21 @@ class MALNotifier(commands.Cog):
             await util.discord.reply(ctx, embed=Embed(title="You are already registered", color=Color.orange()))
             return
 
-        message = await util.discord.reply(ctx, embed=Embed(title="Fetching user from MyAnimeList", color=Color.blue()))
+        await util.discord.progress(ctx, embed=Embed(title="Fetching user from MyAnimeList", color=Color.blue()))
 
         try:
             maluser = MALUser(username.lower(), user_id)
 
-            await message.edit(embed=Embed(title="Fetching manga list from MyAnimeList", color=Color.blue()))
-            maluser.fetch_manga_list()
+            await util.discord.progress(ctx, embed=Embed(title="Fetching manga list from MyAnimeList",
+                                                         color=Color.blue()))
+            await maluser.fetch_manga_list()
 
-            await message.edit(embed=Embed(title="Fetching manga chapters from Nelomanga", color=Color.blue()))
-            maluser.fetch_manga_chapters()
+            await util.discord.progress(ctx, embed=Embed(title="Fetching manga chapters from Nelomanga",
+                                                         color=Color.blue()))
+            await maluser.fetch_manga_chapters()
         except error.UserNotFound:
-            await message.edit(embed=Embed(title="MyAnimeList user wasn't found", color=Color.dark_orange()))
+            await util.discord.progress(ctx, embed=Embed(title="MyAnimeList user wasn't found",
+                                                         color=Color.dark_orange()))
             return
 
         VolatileStorage[f"mal.user.{user_id}"] = maluser
@@ -121,11 +145,11 @@ class MALNotifier(commands.Cog):
         # save new user, in case that notify_user crashes the bot
         maluser.save_to_storage()
 
-        await message.edit(embed=Embed(title="Successfully registered for new release notifications",
-                                       color=Color.blue()))
+        await util.discord.progress(ctx, embed=Embed(title="Successfully registered for new release notifications",
+                                                     color=Color.blue()))
 
         # force-update the user once after registration
-        await self.notify_user(user_id, maluser)
+        await self.notify_user(user_id, maluser, force=True)
 
     @util.discord.grouped_hybrid_command(
         name="deregister",
@@ -152,7 +176,8 @@ class MALNotifier(commands.Cog):
     @util.discord.grouped_hybrid_command(
         name="update",
         description="Check for new manga chapters for the MyAnimeList account connected to your discord account",
-        command_group=command_group
+        command_group=command_group,
+        cost=util.admission.Cost(backends=("mal", "natomanga"), tokens=2)
     )
     async def update(self, ctx: commands.context.Context | discordpy.interactions.Interaction):
         """The discord command 'niko.mal.update'"""
@@ -170,12 +195,12 @@ class MALNotifier(commands.Cog):
         embed = Embed(title="Checking for new chapters...",
                       description="Please wait a few minutes",
                       color=Color.blue())
-        message = await util.discord.reply(ctx, embed=embed)
+        await util.discord.progress(ctx, embed=embed)
 
         maluser = VolatileStorage[f"mal.user.{user_id}"]
-        await self.notify_user(int(user_id), maluser)
+        await self.notify_user(int(user_id), maluser, force=True)
 
-        await message.edit(embed=Embed(title="Finished checking!", color=Color.blue()))
+        await util.discord.progress(ctx, embed=Embed(title="Finished checking!", color=Color.blue()))
 
     @util.discord.grouped_hybrid_command(
         name="updateall",
@@ -189,16 +214,24 @@ class MALNotifier(commands.Cog):
         embed = Embed(title="Checking for new chapters...",
                       description="Please wait a few minutes",
                       color=Color.blue())
-        message = await util.discord.reply(ctx, embed=embed)
+        await util.discord.progress(ctx, embed=embed)
 
-        for user_id, maluser in VolatileStorage["mal.user"].items():
-            await self.notify_user(int(user_id), maluser)
+        users = list(VolatileStorage["mal.user"].items())
+        for c, (user_id, maluser) in enumerate(users):
+            await util.discord.progress(ctx, embed=Embed(title="Checking for new chapters...",
+                                                         description=f"Checked {c}/{len(users)} users",
+                                                         color=Color.blue()))
+            await self.notify_user(int(user_id), maluser, force=True)
 
-        await message.edit(embed=Embed(title="Finished checking!", color=Color.blue()))
+        await util.discord.progress(ctx, embed=Embed(title="Finished checking!", color=Color.blue()))
 
     @tasks.loop(hours=1, reconnect=True, name="notify-users-task")
     async def notify_users(self):
-        """A method responsible for notifying users if a new manga chapter was released"""
+        """
+        A method responsible for refreshing the manga lists of all users
+
+        The manga themselves are checked for new chapters by ``self.scheduler`` once they are due.
+        """
 
         if not VolatileStorage.contains("mal.user"):
             return
@@ -208,14 +241,25 @@ class MALNotifier(commands.Cog):
                 if not isinstance(user_id, str): raise TypeError()
                 if not isinstance(maluser, MALUser): raise TypeError()
 
-                await self.notify_user(int(user_id), maluser)
+                await maluser.fetch_manga_list()
+                maluser.save_to_storage()
+                self.schedule_user(maluser)
+
+            # users whose import failed are only saved, so their manga are kept as well
+            followed = saved_mal_ids()
+            followed.update(mal_id for maluser in VolatileStorage["mal.user"].values() for mal_id in maluser.manga)
+            registry.prune(followed)
+            mal_helper.cache.save()
 
-                # avoid rate limits
-                await sleep(60)
-        except requests.exceptions.ConnectionError as exc:
-            if "NameResolutionError" in str(exc):
+            # the scheduled checks only scrape the manga which the latest updates listing shows as changed
+            await update_scanner.scan(registry.provider_urls(MangaProvider.NATOMANGA))
+        except util.error.CircuitOpen as exc:
+            logger.warning(f"Skipping the refresh of the manga lists: {exc}")
+            return
+        except aiohttp.ClientConnectionError as exc:
+            if isinstance(exc, aiohttp.ClientConnectorDNSError):
                 try:
-                    requests.get("https://google.com", timeout=5)
+                    await util.http.get("https://google.com", timeout=5, retries=0, tag="mal.dns_check")
                 except:
                     logger.error("NameResolutionError while fetching new chapters: DNS server not reachable")
                     return
@@ -226,41 +270,80 @@ class MALNotifier(commands.Cog):
             logger.error(f"ConnectionError while fetching new chapters: {exc}")
             return
 
-    async def notify_user(self, user_id: int, maluser: MALUser) -> None:
-        """Notify the user if any of his ``Manga`` got a new chapter"""
+    def schedule_user(self, maluser: MALUser) -> None:
+        """
+        Schedule all ``Manga`` of the user for the check for new chapters
+
+        Every manga is scheduled once for all users following it, at the earliest time one of them is due.
+        """
+
+        if not isinstance(maluser, MALUser): raise TypeError()
+
+        for mal_id, state in maluser.manga.items():
+            # manga removed from the list are dropped by the check itself
+            due = self.scheduler.due(mal_id)
+            if due is None or state.time_next_notify.timestamp() < due:
+                self.scheduler.schedule(mal_id, state.time_next_notify.timestamp())
+
+    async def notify_user(self, user_id: int, maluser: MALUser, force: bool = False) -> None:
+        """
+        Notify the user if any of his ``Manga`` got a new chapter
+
+        If ``force`` is set, e.g. for a manual update, every manga is scraped, even if it isn't due yet.
+        """
 
         if not isinstance(user_id, int): raise TypeError()
         if not isinstance(maluser, MALUser): raise TypeError()
+        if not isinstance(force, bool): raise TypeError()
 
-        maluser.fetch_manga_list()
+        await maluser.fetch_manga_list()
 
-        for manga in maluser.manga.values():
-            if not isinstance(manga, Manga): raise TypeError()
+        due_states = []
+        for state in maluser.manga.values():
+            if not isinstance(state, ReadingState): raise TypeError()
 
-            if manga._time_next_notify < datetime.now():
-                await self.notify_manga(user_id, manga)
+            if force or state.is_due():
+                due_states.append(state)
 
-                # avoid rate limits
-                await sleep(5)
+        # the checks are limited by the FlareSolverr sessions and the per-host rate limiters, so they can overlap
+        results = await asyncio.gather(*[self.notify_manga(user_id, state, force) for state in due_states],
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
         maluser.save_to_storage()
 
-    async def notify_manga(self, user_id: int, manga: Manga) -> None:
-        """Notify the user if the given ``Manga`` received a new chapter"""
+    async def notify_manga(self, user_id: int, state: ReadingState, force: bool = False) -> None:
+        """
+        Notify the user if the manga of the given ``ReadingState`` received a new chapter
+
+        The chapters are scraped once for all users checking the same manga at the same time.
+        The next check is derived from the release history and publishing status of the manga.
+        If ``force`` is set, the chapters are scraped even if the ``update_scanner`` saw no new chapter.
+        """
 
         if not isinstance(user_id, int): raise TypeError()
-        if not isinstance(manga, Manga): raise TypeError()
+        if not isinstance(state, ReadingState): raise TypeError()
+        if not isinstance(force, bool): raise TypeError()
+
+        # the reading progress is unknown until the manga list was fetched once
+        if state.chapters_read is None:
+            return
 
-        if not manga.fetch_chapters():
-            manga._time_next_notify = datetime.now() + timedelta(days=7)
+        manga = await registry.fetch(state.mal_id)
+        fetched = await manga.fetch_chapters(force)
+        registry.save(manga)
+        if not fetched:
+            state.time_next_notify = datetime.now() + timedelta(days=7)
             return
 
-        if manga._chapters_total > manga._chapters_read \
-            and manga._chapters_total > manga._chapters_last_notified:
+        if manga._chapters_total > state.chapters_read \
+            and manga._chapters_total > state.chapters_last_notified:
             # pylint: disable-next=redefined-outer-name
-            embed, file = manga.to_embed()
+            embed, file = await manga.to_embed(state.chapters_read)
 
-            new_chapters = manga._chapters_total - manga._chapters_read
+            new_chapters = manga._chapters_total - state.chapters_read
             if new_chapters == 1:
                 embed.title += "  |  1 new chapter"
             else:
@@ -268,8 +351,34 @@ class MALNotifier(commands.Cog):
 
             await util.discord.private_message(user_id, embed=embed, file=file)
 
-            manga._chapters_last_notified = manga._chapters_total
-            manga._time_next_notify = datetime.now() + timedelta(hours=12)
+            state.chapters_last_notified = manga._chapters_total
+
+        # check often around the expected release of the next chapter and rarely otherwise
+        state.time_next_notify = datetime.fromtimestamp(manga.next_check())
+
+    async def _check_manga(self, mal_id: int) -> float | None:
+        """Check a single scheduled manga for all users following it, returning the timestamp of its next check"""
+
+        followers: list[tuple[int, MALUser]] = [
+            (int(user_id), maluser)
+            for user_id, maluser in VolatileStorage.get("mal.user", default={}).items()
+            if mal_id in maluser.manga
+        ]
+        if len(followers) == 0:
+            return None
+
+        due = [(user_id, maluser) for user_id, maluser in followers if maluser.manga[mal_id].is_due()]
+        results = await asyncio.gather(*[self.notify_manga(user_id, maluser.manga[mal_id])
+                                         for user_id, maluser in due],
+                                       return_exceptions=True)
+        for _, maluser in due:
+            maluser.save_to_storage()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        next_notify = min(maluser.manga[mal_id].time_next_notify for _, maluser in followers)
+        return max(next_notify.timestamp(), time() + polling.MIN_INTERVAL)
 
     async def get_manga(self,
                         input_data: str,
@@ -281,7 +390,7 @@ class MALNotifier(commands.Cog):
         if input_data.isdecimal():
             mal_id = int(input_data)
         else:
-            mal_id = mal_helper.search_for_manga(input_data)
+            mal_id = await mal_helper.search_for_manga(input_data)
             if mal_id is None:
                 if ctx is not None:
                     embed = Embed(title="Manga not found on MyAnimeList", color=Color.orange())
@@ -295,16 +404,20 @@ class MALNotifier(commands.Cog):
         if VolatileStorage.contains(f"mal.user.{user_id}"):
             maluser: MALUser = VolatileStorage[f"mal.user.{user_id}"]
 
-            maluser.fetch_manga_list()
+            await maluser.fetch_manga_list()
 
             if mal_id in maluser.manga:
-                manga = maluser.manga[mal_id]
+                manga = await registry.fetch(mal_id)
+
+                # the chapter list is needed for the link to the next chapter
+                await manga.fetch_chapters(force=True)
 
-                manga.fetch_chapters()
+        if manga is None:
+            manga = registry.get(mal_id)
 
         if manga is None:
             try:
-                manga = Manga.from_mal_id(mal_id)
+                manga = await Manga.from_mal_id(mal_id)
             except error.MediaTypeError:
                 if ctx is not None:
                     embed = Embed(title="Currently only supports manga and not light novel/novel",
@@ -316,15 +429,38 @@ class MALNotifier(commands.Cog):
 
         return manga
 
-    def import_users(self):
-        """Import all MALUsers from ``abllib.PersistentStorage``"""
+    def stats(self) -> dict[str, dict[str, int | float | str]]:
+        """Return the statistics of the mal module, which are listed by the dev module"""
+
+        # pylint: disable-next=no-member
+        shared = Manga.fetch_chapters.singleflight.coalesced
+        return {
+            "mal cache": mal_helper.cache.stats(),
+            "mal scheduler": {"scheduled": len(self.scheduler), "overdue": self.scheduler.overdue()}
+                             | asdict(self.scheduler.stats),
+            "mal registry": {"manga": registry.count(), "in_memory": registry.hydrated(),
+                             "shared_chapter_fetches": shared},
+            "natomanga update scanner": asdict(update_scanner.stats),
+            "natomanga url resolution": asdict(resolution_cache.stats)
+        } | flare_solverr.stats()
+
+    async def import_users(self):
+        """
+        Import all MALUsers and their ``Manga`` from ``abllib.PersistentStorage``
+
+        No request is sent, the manga are recreated by the ``registry`` and checked by ``self.scheduler``
+        once they are due.
+        """
+
+        # the saved manga are indexed in a thread, so that startup doesn't block the event loop
+        await registry.load()
 
         if PersistentStorage.contains("mal.user"):
             for user_id, maluser_json in PersistentStorage["mal.user"].items():
                 try:
                     maluser = MALUser.from_export(int(user_id), maluser_json)
-                    util.general.sync(self.notify_user(int(user_id), maluser))
                     VolatileStorage[f"mal.user.{user_id}"] = maluser
+                    self.schedule_user(maluser)
                 # pylint: disable-next=broad-exception-caught
                 except Exception:
                     logger.exception(f"Failed to import MAL user {user_id}, error:")
@@ -336,15 +472,20 @@ class MALNotifier(commands.Cog):
 async def setup(bot: commands.Bot):
     """Setup the bot_commands cog"""
 
+    flare_solverr._setup()
     mal_helper._setup()
     manganato_helper._setup()
     natomanga_helper._setup()
 
     cog = MALNotifier(bot)
 
+    cog.scheduler.start()
     cog.notify_users.start()
+    # open the FlareSolverr sessions in advance
+    cog.warm_task = asyncio.create_task(flare_solverr.sessions.warm(), name="warm-flaresolverr-sessions")
 
-    Thread(target=cog.import_users, daemon=True).start()
+    # keep a reference to the task, so that it isn't garbage collected
+    cog.import_task = asyncio.create_task(cog.import_users(), name="import-mal-users")
 
     await bot.add_cog(cog)
 
@@ -2,22 +2,24 @@
 
 from __future__ import annotations
 
+import math
 import os
-from datetime import datetime
+from time import time
 from enum import Enum
 from typing import Any
 
 from abllib import fs
 from abllib.log import get_logger
 from abllib.storage import VolatileStorage
-import requests
 from PIL import Image
 import discord as discordpy
 from discord import Embed, File
 
-from . import error, mal_helper, manganato_helper, natomanga_helper
+from . import error, mal_helper, manganato_helper, natomanga_helper, polling, resolution_cache, update_scanner
 from .chapter import Chapter
-from ...util import Color
+from .dclasses import MangaDetails
+from ...util import Color, http
+from ...util.singleflight import coalesce
 
 logger = get_logger("mal")
 
@@ -33,9 +35,10 @@ class MangaProvider(Enum):
 
 class Manga():
     """
-    A class representing a specific Manga belonging to an user
+    A class representing a specific Manga, which is shared between all users following it
     
     Manga are comics or graphic novels originating from Japan 
+    The reading progress of every user is kept in a separate ``ReadingState``.
     """
 
     def __init__(self, mal_id: int, title: str, title_translated: str | None, synonyms: list[str],
@@ -65,81 +68,179 @@ class Manga():
         self.chapters: list[Chapter] = []
         self._manga_provider: MangaProvider | None = None
         self._manga_provider_url: str | None = None
-        self._chapters_read: int | None = None
         self._chapters_total: int | None = None
-        self._chapters_last_notified: int | None = None
-        self._time_next_notify: datetime = datetime.now()
+        self._time_fetched: float | None = None
+        # the timestamps at which new chapters were first seen, the oldest first
+        self._release_times: list[float] = []
+        self._color: Color | None = None
 
-    # pylint: disable=protected-access
     @staticmethod
-    def from_export(export: dict[str, Any]) -> Manga:
-        """Factory method creating a new Manga object using the export data created by my_manga.export()"""
+    async def from_export(export: dict[str, Any]) -> Manga:
+        """
+        Factory method creating a new Manga object using the export data created by my_manga.export()
+
+        Exports containing the details are restored without any request,
+        exports of older versions only contain the provider, so the details are fetched from MyAnimeList.
+        """
 
         if not isinstance(export["mal_id"], int):
             raise TypeError()
-        if "provider" in export and not isinstance(export["provider"], str):
-            raise TypeError()
-        if "provider_url" in export and not isinstance(export["provider_url"], str):
-            raise TypeError()
-        if "chapters_last_notified" in export and not isinstance(export["chapters_last_notified"], int):
-            raise TypeError()
 
-        manga = Manga.from_mal_id(export["mal_id"])
+        if Manga.is_complete_export(export):
+            return Manga.restore(export)
 
-        if "provider" in export \
-           and "provider_url" in export \
-           and export["provider"] != MangaProvider.MANGANATO.name:
-            manga.set_manga_provider(MangaProvider[export["provider"]], export["provider_url"])
-        if "chapters_last_notified" in export:
-            manga._chapters_last_notified = export["chapters_last_notified"]
+        manga = await Manga.from_mal_id(export["mal_id"])
+        manga.load_provider(export)
+        return manga
 
+    @staticmethod
+    def restore(export: dict[str, Any]) -> Manga:
+        """Factory method recreating a Manga object from complete export data, without sending any request"""
+
+        if not Manga.is_complete_export(export):
+            raise ValueError("The export data doesn't contain the details of the manga")
+
+        manga = Manga(export["mal_id"],
+                      export["title"],
+                      export["title_translated"],
+                      list(export["synonyms"]),
+                      export["status"],
+                      export["picture_url"],
+                      float("nan") if export["score"] is None else float(export["score"]))
+        # pylint: disable=protected-access
+        manga._chapters_total = export.get("chapters_total")
+        manga._time_fetched = export.get("time_fetched")
+        manga._release_times = [float(released) for released in export.get("release_times", [])]
+        # pylint: enable=protected-access
+        manga.load_provider(export)
         return manga
-    # pylint: enable=protected-access
 
     @staticmethod
-    def from_mal_id(mal_id: int) -> Manga:
+    def is_complete_export(export: dict[str, Any]) -> bool:
+        """Whether the export data contains everything needed to restore the Manga without any request"""
+
+        return all(key in export for key in ("title", "title_translated", "synonyms", "status", "picture_url", "score"))
+
+    @staticmethod
+    async def from_mal_id(mal_id: int) -> Manga:
         """Factory method creating a new Manga object using the MyAnimeList id"""
 
         if not isinstance(mal_id, int):
             raise TypeError()
 
-        data = mal_helper.get_manga_from_id(mal_id)
-        manga = Manga(mal_id,
-                      data["title"],
-                      data["title_en"],
-                      data["synonyms"],
-                      data["status"],
-                      data["picture"],
-                      data["score"])
-        return manga
+        details = await mal_helper.get_manga_from_id(mal_id)
+        return Manga.from_details(details)
+
+    @staticmethod
+    def from_details(details: MangaDetails) -> Manga:
+        """Factory method creating a new Manga object using the already fetched ``MangaDetails``"""
+
+        if not isinstance(details, MangaDetails):
+            raise TypeError()
+
+        return Manga(details.id,
+                     details.title,
+                     details.title_en,
+                     list(details.synonyms),
+                     details.status,
+                     details.picture,
+                     details.score)
+
+    def update_details(self, details: MangaDetails) -> bool:
+        """
+        Apply the freshly fetched ``MangaDetails`` to this manga, returning whether anything changed
+
+        The status and titles change over time, e.g. once a series is finished or gets an english title.
+        """
+
+        if not isinstance(details, MangaDetails):
+            raise TypeError()
+        if details.id != self.mal_id:
+            raise ValueError()
+
+        updated = Manga.from_details(details)
+
+        if self.picture_url != updated.picture_url:
+            # the color is taken from the picture
+            self._color = None
+
+        changed = False
+        for attribute in ("title", "title_translated", "synonyms", "status", "picture_url"):
+            if getattr(self, attribute) != getattr(updated, attribute):
+                setattr(self, attribute, getattr(updated, attribute))
+                changed = True
+        # NaN never equals itself
+        if self.score != updated.score and not (math.isnan(self.score) and math.isnan(updated.score)):
+            self.score = updated.score
+            changed = True
+
+        return changed
+
+    def load_provider(self, export: dict[str, Any]) -> None:
+        """Set the manga provider saved in the export data, if there is one and no provider is set yet"""
+
+        if "provider" in export and not isinstance(export["provider"], str):
+            raise TypeError()
+        if "provider_url" in export and not isinstance(export["provider_url"], str):
+            raise TypeError()
+
+        if self._manga_provider is None \
+           and "provider" in export \
+           and "provider_url" in export \
+           and export["provider"] != MangaProvider.MANGANATO.name:
+            self.set_manga_provider(MangaProvider[export["provider"]], export["provider_url"])
 
     def export(self) -> dict[str, Any]:
         """Create a dictionary which is JSON-compliant and can be used to recreate this exact Manga"""
 
         export_data = {
-            "mal_id": self.mal_id
+            "mal_id": self.mal_id,
+            "title": self.title,
+            "title_translated": self.title_translated,
+            "synonyms": self.synonyms,
+            "status": self.status,
+            "picture_url": self.picture_url,
+            # NaN isn't valid JSON
+            "score": None if math.isnan(self.score) else self.score
         }
+        if self._chapters_total is not None:
+            export_data["chapters_total"] = self._chapters_total
+        if self._time_fetched is not None:
+            export_data["time_fetched"] = self._time_fetched
+        if len(self._release_times) > 0:
+            export_data["release_times"] = self._release_times
         if self._manga_provider is not None \
            and self._manga_provider_url is not None:
             export_data["provider"] = self._manga_provider.name
             export_data["provider_url"] = self._manga_provider_url
-        if self._chapters_last_notified is not None and self._chapters_last_notified > 0:
-            export_data["chapters_last_notified"] = self._chapters_last_notified
         return export_data
 
-    def fetch_chapters(self) -> bool:
+    @coalesce("mal.chapters", grace=60, key=lambda self, force=False: (self.mal_id, force))
+    async def fetch_chapters(self, force: bool = False) -> bool:
         """
         Fetch the newest released chapter from the set provider, using manganato as the default
         
         Return whether fetching worked or not
+        Concurrent calls for the same manga, e.g. from multiple users following it, share a single scrape.
+        Forced calls never share the result of a call which could have skipped the scrape.
+        Natomanga pages are only scraped if the ``update_scanner`` can't rule out a new chapter,
+        unless ``force`` is set.
+        The natomanga url of a manga without a provider is looked up in the ``resolution_cache`` first.
         """
 
+        if not force \
+           and self._manga_provider == MangaProvider.NATOMANGA \
+           and not update_scanner.needs_fetch(self._manga_provider_url, self._chapters_total, self._time_fetched):
+            update_scanner.stats.skipped_fetches += 1
+            return True
+
         if self._manga_provider is not None:
             # this sets manga_provider to None if it was deleted
-            self._fetch_chapters()
+            await self._fetch_chapters()
 
         if self._manga_provider is None:
-            manga_url = natomanga_helper.get_manga_url([self.title, self.title_translated] + self.synonyms)
+            manga_url = await resolution_cache.resolve(self.mal_id,
+                                                       [self.title, self.title_translated] + self.synonyms)
             if manga_url is None:
                 logger.warning(f"Manga {self.mal_id} could not be found automatically")
                 return False
@@ -147,7 +248,7 @@ class Manga():
             self.set_manga_provider(MangaProvider.NATOMANGA, manga_url)
 
             try:
-                self._fetch_chapters()
+                await self._fetch_chapters()
             except error.CustomException as e:
                 # reset manga_provider if fetching didn't work
                 self.set_manga_provider(None, None)
@@ -155,13 +256,16 @@ class Manga():
 
         return True
 
-    def _fetch_chapters(self) -> None:
+    async def _fetch_chapters(self) -> None:
+        # chapters released after this point are found by the next scan of the update_scanner
+        time_fetched = time()
+
         chapters: list[Chapter] = None
         match self._manga_provider:
             case MangaProvider.MANGANATO:
-                chapters = manganato_helper.get_chapters(self._manga_provider_url)
+                chapters = await manganato_helper.get_chapters(self._manga_provider_url)
             case MangaProvider.NATOMANGA:
-                chapters = natomanga_helper.get_chapters(self._manga_provider_url)
+                chapters = await natomanga_helper.get_chapters(self._manga_provider_url)
             # default case
             case _:
                 raise error.UnknownProvider()
@@ -170,14 +274,23 @@ class Manga():
             logger.warning(f"Manga {self.mal_id} was propably deleted at url {self._manga_provider_url}, " +
                            "removing and trying again later")
             self.set_manga_provider(None, None)
+            resolution_cache.forget(self.mal_id)
             return
 
         self.chapters = chapters
 
         latest_chapter = max(chapters, key=lambda x: x.number)
+        if self._chapters_total is not None and int(latest_chapter.number) > self._chapters_total:
+            polling.record_release(self._release_times, time_fetched)
         self._chapters_total = int(latest_chapter.number)
+        self._time_fetched = time_fetched
+
+    def next_check(self) -> float:
+        """Return the timestamp at which this manga should be checked for new chapters again"""
 
-    def picture_file(self) -> str:
+        return polling.next_check(self.status, self._release_times)
+
+    async def picture_file(self) -> str:
         """
         Download the preview picture, returning the picture file path
 
@@ -194,27 +307,12 @@ class Manga():
         if os.path.isfile(path):
             return path
 
-        r = requests.get(self.picture_url, timeout=30)
+        r = await http.get(self.picture_url, tag="mal.picture")
         with open(path, "wb") as f:
             f.write(r.content)
 
         return path
 
-    def set_chapters_read(self, chapters_read: int) -> None:
-        """
-        Set the number of chapters that the user already read
-        
-        Also initializes ``self._chapters_last_notified`` if not yet set
-        """
-
-        if not isinstance(chapters_read, int):
-            raise TypeError()
-
-        self._chapters_read = chapters_read
-
-        if self._chapters_last_notified is None:
-            self._chapters_last_notified = 0
-
     def set_manga_provider(self, manga_provider: MangaProvider | None, manga_provider_url: str | None) -> None:
         """Set the manga_provider and its url to the current ``Manga``"""
 
@@ -228,21 +326,25 @@ class Manga():
         self._manga_provider = manga_provider
         self._manga_provider_url = manga_provider_url
 
-    def to_embed(self) -> tuple[Embed, File]:
-        """Convert the ``Manga`` to a ``discord.Embed`` and ``discord.File``"""
+    async def to_embed(self, chapters_read: int | None = None) -> tuple[Embed, File]:
+        """
+        Convert the ``Manga`` to a ``discord.Embed`` and ``discord.File``
 
-        image_path = self.picture_file()
+        ``chapters_read`` is the reading progress of the user the embed is sent to, if there is one.
+        """
+
+        image_path = await self.picture_file()
 
         embed_var = Embed(title=self.title,
-                          color=discordpy.Color.from_rgb(*self.get_color().rgb()))
+                          color=discordpy.Color.from_rgb(*(await self.get_color()).rgb()))
 
         embed_var.add_field(name="English title",
                             value=self.title_translated,
                             inline=False)
 
-        if self._chapters_read is not None or self._chapters_total is not None:
+        if chapters_read is not None or self._chapters_total is not None:
             embed_var.add_field(name="Chapters read",
-                                value=f"{self._chapters_read or '?'} / {self._chapters_total or '?'}",
+                                value=f"{chapters_read or '?'} / {self._chapters_total or '?'}",
                                 inline=False)
 
         embed_var.add_field(name="Score",
@@ -252,9 +354,9 @@ class Manga():
                             value=self.status,
                             inline=False)
 
-        if len(self.chapters) > 0 and self._chapters_read is not None:
+        if len(self.chapters) > 0 and chapters_read is not None:
             for chapter in self.chapters:
-                if int(chapter.number) == self._chapters_read + 1:
+                if int(chapter.number) == chapters_read + 1:
                     embed_var.add_field(name="Next chapter link",
                                         value=chapter.url,
                                         inline=False)
@@ -275,22 +377,28 @@ class Manga():
     def __str__(self) -> str:
         return self.title
 
-    def get_color(self) -> Color:
+    async def get_color(self) -> Color:
         """
         Return the color that best represents the cover picture.
 
         This prefers brighter and more vibrant colors.
+        The color is calculated once and then reused, because the cover doesn't change.
         """
-        colors = self.get_dominant_colors(10)
+
+        if self._color is not None:
+            return self._color
+
+        colors = await self.get_dominant_colors(10)
 
         colors_clamped = list(filter(lambda x: x.hsv()[2] >= 40.0, colors))
         # only clamp colors when at least one color is valid
         if len(colors_clamped) > 0:
             colors = colors_clamped
 
-        return max(colors, key=lambda x: x.hsv()[1])
+        self._color = max(colors, key=lambda x: x.hsv()[1])
+        return self._color
 
-    def get_dominant_colors(self, palette_size: int = 5) -> list[Color]:
+    async def get_dominant_colors(self, palette_size: int = 5) -> list[Color]:
         """
         Return the most dominant colors of the cover picture.
         
@@ -299,7 +407,7 @@ class Manga():
 
         # Original code from https://stackoverflow.com/a/61730849/15436169
 
-        pil_img = Image.open(self.picture_file())
+        pil_img = Image.open(await self.picture_file())
 
         # Resize image to speed up processing
         img = pil_img.copy()
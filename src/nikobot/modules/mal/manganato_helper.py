@@ -2,9 +2,9 @@
 
 from abllib.alg import levenshtein_distance
 import bs4 as bs
-import requests
 
 from .chapter import Chapter
+from ...util import http
 
 BASE_URL = "https://manganato.com"
 HEADERS = {
@@ -27,7 +27,7 @@ def create_chapter(title: str, url: str) -> Chapter:
 
     return Chapter(title, url, number)
 
-def get_manga_url(titles: str | list[str]) -> str | None:
+async def get_manga_url(titles: str | list[str]) -> str | None:
     """Return the url of the searched manga, or None if it isn't found"""
 
     if isinstance(titles, str):
@@ -44,7 +44,7 @@ def get_manga_url(titles: str | list[str]) -> str | None:
                               .replace(":", "") \
                               .replace("!", "") \
                               .lower()
-        r = requests.get(f"{BASE_URL}/search/story/{name_sanitized}", timeout=30)
+        r = await http.get(f"{BASE_URL}/search/story/{name_sanitized}", tag="mal.scrape")
 
         soup = bs.BeautifulSoup(r.content, features="html.parser")
         search_results = soup.find("div", {"class": "panel-search-story"})
@@ -69,10 +69,10 @@ def get_manga_url(titles: str | list[str]) -> str | None:
     closest_match = max(results, default=(None,None), key=lambda x: x[0])
     return closest_match[1]
 
-def get_chapters(url: str) -> list[Chapter]:
+async def get_chapters(url: str) -> list[Chapter]:
     """Get a list of ``Chapter``s from a given manganato url"""
 
-    r = requests.get(url, timeout=30)
+    r = await http.get(url, tag="mal.scrape")
 
     soup = bs.BeautifulSoup(r.content, features="html.parser")
     chapter_class = soup.find("ul", {"class": "row-content-chapter"})
@@ -1,5 +1,7 @@
 """Module containing functions for webscraping natomanga.com"""
 
+import asyncio
+
 from abllib import fs, VolatileStorage
 from abllib.log import get_logger
 import bs4 as bs
@@ -10,6 +12,8 @@ from .chapter import Chapter
 logger = get_logger("mal")
 
 BASE_URL = "https://natomanga.com"
+# the number of title pages probed at the same time while searching a manga
+PROBE_CONCURRENCY = 4
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:130.0) Gecko/20100101 Firefox/130.0"
 }
@@ -30,8 +34,14 @@ def create_chapter(title: str, url: str) -> Chapter:
 
     return Chapter(title, url, number)
 
-def get_manga_url(titles: str | list[str]) -> str | None:
-    """Return the url of the searched manga, or None if it isn't found"""
+async def get_manga_url(titles: str | list[str]) -> str | None:
+    """
+    Return the url of the searched manga, or None if it isn't found
+
+    The page of every title is probed at the same time, at most ``PROBE_CONCURRENCY`` at once.
+    If multiple titles are found, the one with the most chapters is picked,
+    which are read from the already probed pages instead of scraping them again.
+    """
 
     if isinstance(titles, str):
         titles = [titles]
@@ -46,42 +56,71 @@ def get_manga_url(titles: str | list[str]) -> str | None:
         else:
             titles.pop(i)
 
-    result_urls: list[str] = []
-    for title in titles:
+    probe_limit = asyncio.Semaphore(PROBE_CONCURRENCY)
+
+    async def probe(title: str) -> tuple[str, list[Chapter]] | None:
         url = f"{BASE_URL}/manga/{_sanitize_title(title)}"
 
-        content = flare_solverr.get(url)
+        async with probe_limit:
+            content = await flare_solverr.fetch("natomanga", url)
 
         if "cannot be found" in content: # not found
-            continue
+            return None
+
+        return url, _parse_chapters(url, content)
 
-        result_urls.append(url)
+    results = [result for result in await asyncio.gather(*[probe(title) for title in titles]) if result is not None]
 
-    if len(result_urls) == 0:
+    if len(results) == 0:
         return None
 
-    if len(result_urls) == 1:
-        return result_urls[0]
+    if len(results) == 1:
+        return results[0][0]
 
-    logger.debug(f"found multiple urls {result_urls} for manga {titles[0]}")
+    logger.debug(f"found multiple urls {[url for url, _ in results]} for manga {titles[0]}")
 
-    max_chapters = -1
-    max_url = ""
-    for url in result_urls:
-        chapters = get_chapters(url)
-        if len(chapters) > max_chapters:
-            max_chapters = len(chapters)
-            max_url = url
+    # the first title wins if multiple ones have the same number of chapters
+    max_url, max_chapters = max(results, key=lambda result: len(result[1]))
 
-    logger.debug(f"picked {max_url} with {max_chapters} chapters")
+    logger.debug(f"picked {max_url} with {len(max_chapters)} chapters")
 
     return max_url
 
-def get_chapters(url: str) -> list[Chapter]:
+async def get_chapters(url: str) -> list[Chapter]:
     """Get a list of ``Chapter``s from a given manganato url"""
 
-    content = flare_solverr.get(url)
+    content = await flare_solverr.fetch("natomanga", url)
+
+    return _parse_chapters(url, content)
+
+async def get_latest_updates(page: int = 1) -> list[tuple[str, float]]:
+    """
+    Get a page of the latest updates listing, which contains the most recently updated manga first
+
+    Return the manga url and the newest listed chapter number of every manga on the page.
+    """
+
+    if not isinstance(page, int):
+        raise TypeError(f"Expected {int}, got {type(page)}")
+
+    content = await flare_solverr.fetch("natomanga", f"{BASE_URL}/manga-list/latest-manga?page={page}")
+
+    soup = bs.BeautifulSoup(content, features="html.parser")
+    updates: dict[str, float] = {}
+    for item in soup.find_all("a", href=True):
+        manga_url, _, chapter_slug = item["href"].rstrip("/").rpartition("/")
+        if "/manga/" not in manga_url or not chapter_slug.startswith("chapter-"):
+            continue
+
+        try:
+            number = create_chapter(chapter_slug, item["href"]).number
+        except ValueError:
+            continue
+        updates[manga_url] = max(updates.get(manga_url, number), number)
+
+    return list(updates.items())
 
+def _parse_chapters(url: str, content: str) -> list[Chapter]:
     soup = bs.BeautifulSoup(content, features="html.parser")
     chapter_class = soup.find("div", {"class": "chapter-list"})
     if chapter_class is None:
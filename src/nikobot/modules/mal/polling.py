@@ -0,0 +1,73 @@
+"""
+A module deciding when a manga should be checked for new chapters again
+
+Every manga remembers when its last chapters were released.
+The median time between these releases is its cadence, which predicts when the next chapter is expected.
+A manga is checked often around the expected release and rarely in between,
+while finished, discontinued or paused series are only checked occasionally.
+"""
+
+from statistics import median
+from time import time
+
+from .scheduler import CHECK_INTERVAL
+
+# the number of release times remembered per manga
+RELEASE_HISTORY = 8
+
+# the shortest and longest time between two checks of a publishing manga
+MIN_INTERVAL = CHECK_INTERVAL
+MAX_INTERVAL = 24 * 60 * 60
+# the time between two checks of a series which isn't publishing at the moment
+INACTIVE_INTERVAL = 3 * 24 * 60 * 60
+FINISHED_INTERVAL = 7 * 24 * 60 * 60
+
+INACTIVE_STATUSES = ["on_hiatus", "discontinued", "not_yet_published"]
+FINISHED_STATUSES = ["finished"]
+
+def record_release(release_times: list[float], released: float) -> None:
+    """Add the time of a newly observed release to the history, forgetting the oldest releases"""
+
+    if not isinstance(release_times, list): raise TypeError()
+    if not isinstance(released, (int, float)): raise TypeError()
+
+    release_times.append(float(released))
+    del release_times[:-RELEASE_HISTORY]
+
+def cadence(release_times: list[float]) -> float | None:
+    """Return the typical number of seconds between two releases, or None if it isn't known yet"""
+
+    if len(release_times) < 2:
+        return None
+
+    return median(later - earlier for earlier, later in zip(release_times, release_times[1:]))
+
+def next_check(status: str, release_times: list[float], now: float | None = None) -> float:
+    """Return the timestamp at which a manga with the given MyAnimeList status and release history is due"""
+
+    if not isinstance(status, str): raise TypeError()
+
+    if now is None:
+        now = time()
+
+    if status in FINISHED_STATUSES:
+        return now + FINISHED_INTERVAL
+    if status in INACTIVE_STATUSES:
+        return now + INACTIVE_INTERVAL
+
+    expected_gap = cadence(release_times)
+    if expected_gap is None:
+        return now + MIN_INTERVAL
+
+    expected = release_times[-1] + expected_gap
+    window = max(expected_gap / 4, MIN_INTERVAL)
+
+    # sleep until the release window starts, but never longer than a day in case the schedule changed
+    if now < expected - window:
+        return min(expected - window, now + MAX_INTERVAL)
+
+    if now <= expected + window:
+        return now + MIN_INTERVAL
+
+    # the release is late, so check less often the longer it is overdue
+    return now + min(max((now - expected) / 4, MIN_INTERVAL), MAX_INTERVAL)
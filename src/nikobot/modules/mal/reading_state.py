@@ -0,0 +1,70 @@
+"""A module containing the ``ReadingState`` class"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+class ReadingState():
+    """
+    The reading progress of a single user for a single manga
+
+    The ``Manga`` itself is shared between all users through the ``registry``,
+    so this only holds what differs between the users following it.
+    """
+
+    def __init__(self, mal_id: int) -> None:
+        if not isinstance(mal_id, int):
+            raise TypeError()
+
+        self.mal_id = mal_id
+        self.chapters_read: int | None = None
+        self.chapters_last_notified: int = 0
+        self.time_next_notify: datetime = datetime.now()
+
+    @staticmethod
+    def from_export(export: dict[str, Any]) -> ReadingState:
+        """Factory method creating a new ReadingState object using the export data created by my_state.export()"""
+
+        if not isinstance(export["mal_id"], int):
+            raise TypeError()
+        if "chapters_last_notified" in export and not isinstance(export["chapters_last_notified"], int):
+            raise TypeError()
+        if "chapters_read" in export and not isinstance(export["chapters_read"], int):
+            raise TypeError()
+        if "time_next_notify" in export and not isinstance(export["time_next_notify"], (int, float)):
+            raise TypeError()
+
+        state = ReadingState(export["mal_id"])
+        state.chapters_last_notified = export.get("chapters_last_notified", 0)
+        state.chapters_read = export.get("chapters_read")
+        if "time_next_notify" in export:
+            state.time_next_notify = datetime.fromtimestamp(export["time_next_notify"])
+        return state
+
+    def export(self) -> dict[str, Any]:
+        """Create a dictionary which is JSON-compliant and can be used to recreate this exact ReadingState"""
+
+        export_data = {
+            "mal_id": self.mal_id
+        }
+        if self.chapters_last_notified > 0:
+            export_data["chapters_last_notified"] = self.chapters_last_notified
+        if self.chapters_read is not None:
+            export_data["chapters_read"] = self.chapters_read
+        if self.time_next_notify > datetime.now():
+            export_data["time_next_notify"] = self.time_next_notify.timestamp()
+        return export_data
+
+    def set_chapters_read(self, chapters_read: int) -> None:
+        """Set the number of chapters that the user already read"""
+
+        if not isinstance(chapters_read, int):
+            raise TypeError()
+
+        self.chapters_read = chapters_read
+
+    def is_due(self) -> bool:
+        """Whether the user should be notified about new chapters again"""
+
+        return self.time_next_notify <= datetime.now()
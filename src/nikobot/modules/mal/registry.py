@@ -0,0 +1,279 @@
+"""
+A module containing the manga registry, which holds a single shared ``Manga`` for every followed MyAnimeList id
+
+The registry owns the metadata, provider url, chapters and cover of every manga,
+while every ``MALUser`` only keeps its own ``ReadingState``.
+A manga followed by many users is therefore fetched, scraped and has its cover processed only once.
+
+The details, provider and chapter count of every manga are saved to their own json file in the 'mal/manga'
+directory of the storage, so only the ids and provider urls of all manga are kept in memory.
+Only the ``MAX_HYDRATED`` most recently used manga are kept as ``Manga`` objects with their chapters and cover color,
+all others are recreated from their file without any request once they are needed again.
+An evicted ``Manga`` which is still in use is handed out again instead of being recreated,
+so there is never more than one ``Manga`` object per id.
+"""
+
+import asyncio
+import json
+import os
+import weakref
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from abllib import fs
+from abllib.log import get_logger
+from abllib.storage import PersistentStorage, VolatileStorage
+
+from . import resolution_cache
+from .dclasses import MangaDetails
+from .manga import Manga, MangaProvider
+from ...util.singleflight import coalesce
+
+logger = get_logger("mal.registry")
+
+# the number of ``Manga`` objects kept in memory
+MAX_HYDRATED = 2000
+
+# the hydrated manga, the least recently used first
+_manga: OrderedDict[int, Manga] = OrderedDict()
+# every ``Manga`` object which is still referenced somewhere, including evicted ones
+_live: weakref.WeakValueDictionary[int, Manga] = weakref.WeakValueDictionary()
+# the provider name and url of every saved manga, or None if it has no provider
+# this is read from the saved files by load()
+_index: dict[int, tuple[str, str] | None] | None = None
+
+async def load() -> None:
+    """
+    Read the provider of every saved manga, without blocking the event loop
+
+    This needs to be awaited once at startup, before any manga is used.
+    """
+
+    # pylint: disable-next=global-statement
+    global _index
+
+    index = await asyncio.to_thread(_read_index)
+    if _index is None:
+        _index = index
+    _migrate()
+
+def get(mal_id: int) -> Manga | None:
+    """
+    Return the registered ``Manga`` with the given id, or None if it isn't registered
+
+    A manga which was saved with its details is recreated without any request.
+    """
+
+    if not isinstance(mal_id, int): raise TypeError()
+
+    if mal_id in _manga:
+        _manga.move_to_end(mal_id)
+        return _manga[mal_id]
+
+    manga = _live.get(mal_id)
+    if manga is None:
+        export = _read(mal_id)
+        if export is None or not Manga.is_complete_export(export):
+            return None
+        manga = Manga.restore(export)
+
+    _hydrate(manga)
+    return manga
+
+@coalesce("mal.registry", key=lambda mal_id, details=None: mal_id)
+async def fetch(mal_id: int, details: MangaDetails | None = None) -> Manga:
+    """
+    Return the registered ``Manga`` with the given id, fetching and registering it if necessary
+
+    If the ``MangaDetails`` are already known, e.g. from the users' manga list, no request is sent at all.
+    They are also applied to an already registered manga, so its status and titles never go stale.
+    The provider saved by an earlier run is restored, so the manga doesn't need to be searched again.
+    """
+
+    if not isinstance(mal_id, int): raise TypeError()
+    if not isinstance(details, MangaDetails) and details is not None: raise TypeError()
+
+    manga = get(mal_id)
+    if manga is not None:
+        if details is not None and manga.update_details(details):
+            save(manga)
+        return manga
+
+    export = _read(mal_id)
+    if details is not None:
+        manga = Manga.from_details(details)
+        if export is not None:
+            manga.load_provider(export)
+    elif export is not None:
+        manga = await Manga.from_export(export)
+    else:
+        manga = await Manga.from_mal_id(mal_id)
+
+    _hydrate(manga)
+    save(manga)
+    return manga
+
+def restore_provider(export: dict[str, Any]) -> None:
+    """Save the provider contained in the manga export of a user, which older versions saved for every user"""
+
+    if not isinstance(export["mal_id"], int): raise TypeError()
+
+    if "provider" not in export or "provider_url" not in export:
+        return
+
+    mal_id = export["mal_id"]
+    manga = _manga[mal_id] if mal_id in _manga else _live.get(mal_id)
+    if manga is not None:
+        manga.load_provider(export)
+    elif mal_id not in _load_index():
+        _write({
+            "mal_id": mal_id,
+            "provider": export["provider"],
+            "provider_url": export["provider_url"]
+        })
+
+def save(manga: Manga) -> None:
+    """Save the details, provider and chapter count of the given ``Manga`` to its file"""
+
+    if not isinstance(manga, Manga): raise TypeError()
+
+    _write(manga.export())
+
+def prune(followed: Iterable[int]) -> int:
+    """Remove all manga which aren't followed by any user anymore, returning the number of removed manga"""
+
+    followed = set(followed)
+
+    removed = [mal_id for mal_id in _known() if mal_id not in followed]
+    for mal_id in removed:
+        _manga.pop(mal_id, None)
+        _live.pop(mal_id, None)
+        if mal_id in _load_index():
+            del _load_index()[mal_id]
+            os.remove(_path(mal_id))
+        resolution_cache.forget(mal_id)
+
+    if len(removed) > 0:
+        logger.debug(f"Removed {len(removed)} manga which aren't followed anymore")
+    return len(removed)
+
+def provider_urls(provider: MangaProvider) -> list[str]:
+    """Return the url of every registered manga with the given provider"""
+
+    if not isinstance(provider, MangaProvider): raise TypeError()
+
+    urls = {}
+    for mal_id, saved in _load_index().items():
+        if saved is not None and saved[0] == provider.name:
+            urls[mal_id] = saved[1]
+    for mal_id, manga in list(_live.items()) + list(_manga.items()):
+        # pylint: disable-next=protected-access
+        if manga._manga_provider == provider:
+            # pylint: disable-next=protected-access
+            urls[mal_id] = manga._manga_provider_url
+
+    return list(urls.values())
+
+def count() -> int:
+    """Return the number of registered manga, including the ones which aren't kept in memory"""
+
+    return len(_known())
+
+def hydrated() -> int:
+    """Return the number of manga currently kept in memory as ``Manga`` objects"""
+
+    return len(_manga)
+
+def clear() -> None:
+    """Drop all manga kept in memory, without touching the saved files"""
+
+    # pylint: disable-next=global-statement
+    global _index
+
+    _manga.clear()
+    _live.clear()
+    _index = None
+
+def _known() -> set[int]:
+    return set(_manga) | set(_load_index())
+
+def _hydrate(manga: Manga) -> None:
+    _manga[manga.mal_id] = manga
+    _manga.move_to_end(manga.mal_id)
+    _live[manga.mal_id] = manga
+
+    while len(_manga) > MAX_HYDRATED:
+        _, evicted = _manga.popitem(last=False)
+        # the chapters and the cover color are dropped, everything else is restored from the file
+        # callers still using the manga keep it alive, and get() returns it until they drop it
+        save(evicted)
+
+def _directory() -> str:
+    directory = fs.absolute(VolatileStorage["storage_dir"], "mal", "manga")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def _path(mal_id: int) -> str:
+    return os.path.join(_directory(), f"{mal_id}.json")
+
+def _read(mal_id: int) -> dict[str, Any] | None:
+    if mal_id not in _load_index():
+        return None
+
+    try:
+        with open(_path(mal_id), "r", encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Couldn't read the saved manga {mal_id}: {e}")
+        return None
+
+def _write(export: dict[str, Any]) -> None:
+    path = _path(export["mal_id"])
+    # write to a temporary file first, so that a crash never leaves a half-written file behind
+    with open(f"{path}.tmp", "w", encoding="utf8") as f:
+        json.dump(export, f)
+    os.replace(f"{path}.tmp", path)
+
+    _load_index()[export["mal_id"]] = _provider_of(export)
+
+def _provider_of(export: dict[str, Any]) -> tuple[str, str] | None:
+    if "provider" not in export or "provider_url" not in export:
+        return None
+    return export["provider"], export["provider_url"]
+
+def _load_index() -> dict[int, tuple[str, str] | None]:
+    # pylint: disable-next=global-statement
+    global _index
+
+    if _index is None:
+        # load() wasn't awaited, e.g. in the benchmarks
+        _index = _read_index()
+    return _index
+
+def _read_index() -> dict[int, tuple[str, str] | None]:
+    """Read the provider of every saved manga, which reads every file and should therefore run in a thread"""
+
+    index = {}
+    for filename in os.listdir(_directory()):
+        if not filename.endswith(".json"):
+            continue
+
+        try:
+            with open(os.path.join(_directory(), filename), "r", encoding="utf8") as f:
+                export = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Couldn't read the saved manga {filename}: {e}")
+            continue
+        index[export["mal_id"]] = _provider_of(export)
+    return index
+
+def _migrate() -> None:
+    """Move the manga saved to the PersistentStorage by older versions, which is kept in memory, to their files"""
+
+    if not PersistentStorage.contains("mal.manga"):
+        return
+
+    for export in PersistentStorage["mal.manga"].values():
+        _write(export)
+    del PersistentStorage["mal.manga"]
+    logger.info("Moved the saved manga to their own files")
@@ -0,0 +1,70 @@
+"""
+A module containing the cache of the natomanga urls resolved for every manga
+
+Resolving the url of a manga probes one page per title and synonym, and scrapes the chapters of every match.
+The result is saved to the ``PersistentStorage`` under 'mal.resolved', together with the sanitized titles
+it was resolved from, so every manga is only resolved again if its titles changed on MyAnimeList.
+Manga which couldn't be found are remembered for ``NEGATIVE_TTL`` seconds before they are searched again.
+"""
+
+from dataclasses import dataclass
+from time import time
+
+from abllib.log import get_logger
+from abllib.storage import PersistentStorage
+
+from . import natomanga_helper
+from ...util.singleflight import coalesce
+
+logger = get_logger("mal.resolution")
+
+# the number of seconds until a manga which couldn't be found is searched again
+NEGATIVE_TTL = 24 * 60 * 60
+
+@dataclass
+class ResolutionStats:
+    """The statistics of the resolution cache"""
+
+    hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+
+stats = ResolutionStats()
+
+@coalesce("mal.resolution", key=lambda mal_id, titles: mal_id)
+async def resolve(mal_id: int, titles: list[str]) -> str | None:
+    """Return the natomanga url of the manga with the given id and titles, or None if it isn't found"""
+
+    if not isinstance(mal_id, int): raise TypeError()
+    if not isinstance(titles, list): raise TypeError()
+
+    sanitized = _sanitize(titles)
+    entry = PersistentStorage.get(f"mal.resolved.{mal_id}", default=None)
+    if entry is not None and entry["titles"] == sanitized:
+        if entry["url"] is not None:
+            stats.hits += 1
+            return entry["url"]
+        if time() - entry["time"] < NEGATIVE_TTL:
+            stats.negative_hits += 1
+            return None
+
+    stats.misses += 1
+    url = await natomanga_helper.get_manga_url(list(titles))
+    PersistentStorage[f"mal.resolved.{mal_id}"] = {
+        "titles": sanitized,
+        "url": url,
+        "time": time()
+    }
+    return url
+
+def forget(mal_id: int) -> None:
+    """Remove the resolved url of the manga, e.g. because it was deleted from natomanga"""
+
+    if not isinstance(mal_id, int): raise TypeError()
+
+    if PersistentStorage.contains(f"mal.resolved.{mal_id}"):
+        del PersistentStorage[f"mal.resolved.{mal_id}"]
+
+def _sanitize(titles: list[str]) -> list[str]:
+    # pylint: disable-next=protected-access
+    return sorted({natomanga_helper._sanitize_title(title) for title in titles})
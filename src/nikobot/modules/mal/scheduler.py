@@ -0,0 +1,186 @@
+"""
+A module containing the ``CheckScheduler``, which checks every manga for new chapters once it is due
+
+Instead of visiting all users one after another every hour, every manga has its own due time in a priority queue.
+A bounded number of workers takes the most overdue manga first, while the per-host rate limiters in
+``flare_solverr`` and ``util.http`` pace the actual requests.
+The lag between the due time and the start of a check shows whether the workers keep up.
+"""
+
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass
+from time import time
+from typing import Awaitable, Callable, Hashable
+
+from abllib.log import get_logger
+
+from ...util import error
+
+logger = get_logger("mal.scheduler")
+
+# the number of manga checked at the same time
+WORKERS = 4
+# the number of seconds until a manga without new chapters is checked again
+CHECK_INTERVAL = 60 * 60
+# the weight of the newest lag in the moving average
+LAG_SMOOTHING = 0.1
+
+@dataclass
+class CheckSchedulerStats:
+    """The statistics of a ``CheckScheduler``"""
+
+    checks: int = 0
+    errors: int = 0
+    running: int = 0
+    lag_last: float = 0.0
+    lag_avg: float = 0.0
+    lag_max: float = 0.0
+
+class CheckScheduler():
+    """
+    Run ``check`` for every scheduled key once its due time is reached, the most overdue key first
+
+    ``check`` returns the timestamp at which the key is due again, or None if it shouldn't be checked anymore.
+    """
+
+    def __init__(self, check: Callable[[Hashable], Awaitable[float | None]], workers: int = WORKERS) -> None:
+        if not callable(check): raise TypeError()
+        if not isinstance(workers, int): raise TypeError()
+        if workers <= 0:
+            raise ValueError("workers needs to be positive")
+
+        self.stats = CheckSchedulerStats()
+        self._check = check
+        self._workers = workers
+        # every entry is (due timestamp, insertion counter, key), outdated entries are skipped when popped
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._due: dict[Hashable, float] = {}
+        self._running: set[Hashable] = set()
+        self._counter = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def schedule(self, key: Hashable, due: float) -> None:
+        """Schedule ``key`` to be checked at the timestamp ``due``, replacing its previous due time"""
+
+        if not isinstance(due, (int, float)): raise TypeError()
+
+        if key in self._running:
+            # the running check schedules its key again itself
+            return
+
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._counter), key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def unschedule(self, key: Hashable) -> None:
+        """Stop checking ``key``"""
+
+        self._due.pop(key, None)
+
+    def is_scheduled(self, key: Hashable) -> bool:
+        """Whether ``key`` is currently scheduled or being checked"""
+
+        return key in self._due or key in self._running
+
+    def due(self, key: Hashable) -> float | None:
+        """Return the timestamp at which ``key`` is due, or None if it isn't scheduled"""
+
+        return self._due.get(key)
+
+    def overdue(self) -> int:
+        """Return the number of keys whose due time already passed"""
+
+        now = time()
+        return len([due for due in self._due.values() if due <= now])
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def start(self) -> None:
+        """Start checking the scheduled keys in the background"""
+
+        if self._task is not None and not self._task.done():
+            return
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="mal-check-scheduler")
+
+    async def stop(self) -> None:
+        """Stop checking and cancel all running checks"""
+
+        tasks = list(self._tasks)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    async def _run(self) -> None:
+        semaphore = asyncio.Semaphore(self._workers)
+        while True:
+            await semaphore.acquire()
+            try:
+                key, due = await self._next_due()
+            except BaseException:
+                semaphore.release()
+                raise
+
+            self._running.add(key)
+            task = asyncio.create_task(self._run_check(key, due), name=f"mal-check-{key}")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+
+    async def _next_due(self) -> tuple[Hashable, float]:
+        """Wait until the most overdue key is due and remove it from the queue"""
+
+        while True:
+            # skip entries which were rescheduled or unscheduled in the meantime
+            while len(self._heap) > 0 and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            timeout = None
+            if len(self._heap) > 0:
+                due, _, key = self._heap[0]
+                timeout = due - time()
+                if timeout <= 0:
+                    heapq.heappop(self._heap)
+                    del self._due[key]
+                    return key, due
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_check(self, key: Hashable, due: float) -> None:
+        lag = max(time() - due, 0.0)
+        self.stats.lag_last = lag
+        self.stats.lag_max = max(self.stats.lag_max, lag)
+        self.stats.lag_avg += (lag - self.stats.lag_avg) * LAG_SMOOTHING
+        self.stats.running += 1
+
+        next_due = time() + CHECK_INTERVAL
+        try:
+            next_due = await self._check(key)
+            self.stats.checks += 1
+        except error.CircuitOpen as e:
+            # the backend is down, so there is no point in checking before it can be reached again
+            next_due = time() + (getattr(e, "retry_after", None) or CHECK_INTERVAL)
+        # pylint: disable-next=broad-exception-caught
+        except Exception:
+            self.stats.errors += 1
+            logger.exception(f"Checking {key} failed, error:")
+        finally:
+            self.stats.running -= 1
+            self._running.discard(key)
+
+        if next_due is not None:
+            self.schedule(key, next_due)
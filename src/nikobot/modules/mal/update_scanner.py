@@ -0,0 +1,141 @@
+"""
+A module containing the scanner of the natomanga latest updates listing
+
+Instead of scraping the page of every tracked manga, the listing of the most recently updated manga is read
+once per cycle, until it reaches the updates which were already seen by the previous scan.
+A manga only needs to be scraped again if it appeared in the listing with a newer chapter.
+
+If a scan fails or doesn't reach the previous one, updates could have been missed,
+so every manga fetched before that scan is scraped again.
+Chapters released after the latest scan are found by the next one.
+"""
+
+from dataclasses import dataclass
+from time import time
+from typing import Iterable
+from urllib.parse import urlparse
+
+from abllib.log import get_logger
+
+from . import natomanga_helper
+
+logger = get_logger("mal.scanner")
+
+# the number of listing pages read at most per scan
+MAX_PAGES = 10
+# the number of seconds the latest scan is trusted, afterwards every manga is scraped again
+MAX_AGE = 2 * 60 * 60
+
+@dataclass
+class ScanStats:
+    """The statistics of the update scanner"""
+
+    scans: int = 0
+    incomplete: int = 0
+    pages: int = 0
+    updates: int = 0
+    skipped_fetches: int = 0
+
+stats = ScanStats()
+
+# the newest listed chapter of every tracked manga, keyed by the path of its url
+_latest: dict[str, float] = {}
+# the updates listed by the previous scan
+_seen: set[tuple[str, float]] = set()
+# the timestamp since which every update is known
+_covered_since: float | None = None
+# the timestamp at which the latest scan started
+_scanned: float | None = None
+
+async def scan(tracked_urls: Iterable[str]) -> int:
+    """
+    Read the latest updates listing and remember the newest chapter of every tracked manga
+
+    Return the number of tracked manga which were listed with a newer chapter.
+    """
+
+    # pylint: disable-next=global-statement
+    global _seen, _covered_since, _scanned
+
+    tracked = {_path(url) for url in tracked_urls}
+    start = time()
+    stats.scans += 1
+
+    # without a previous scan, the first page is enough to know where the next scan can stop
+    last_page = MAX_PAGES if _scanned is not None else 1
+
+    seen: set[tuple[str, float]] = set()
+    updated = 0
+    complete = False
+    try:
+        for page in range(1, last_page + 1):
+            updates = await natomanga_helper.get_latest_updates(page)
+            stats.pages += 1
+            # the end of the listing was reached
+            if len(updates) == 0:
+                complete = True
+                break
+
+            for url, chapter in updates:
+                update = (_path(url), chapter)
+                complete = complete or update in _seen
+                seen.add(update)
+                if update[0] in tracked and chapter > _latest.get(update[0], -1):
+                    _latest[update[0]] = chapter
+                    updated += 1
+
+            if complete:
+                break
+    # pylint: disable-next=broad-exception-caught
+    except Exception as e:
+        logger.warning(f"Scanning the latest updates failed, scraping every manga instead: {e}")
+        stats.incomplete += 1
+        _covered_since = None
+        _scanned = None
+        return 0
+
+    if not complete or _covered_since is None:
+        # the updates between the previous scan and the last read page are unknown
+        if _scanned is not None:
+            stats.incomplete += 1
+            logger.info(f"The latest updates didn't reach the previous scan within {MAX_PAGES} pages")
+        _covered_since = start
+
+    for path in [path for path in _latest if path not in tracked]:
+        del _latest[path]
+    _seen = seen
+    _scanned = start
+    stats.updates += updated
+
+    logger.debug(f"Found {updated} updated manga in the latest updates")
+    return updated
+
+def needs_fetch(url: str, chapters_total: int | None, time_fetched: float | None) -> bool:
+    """
+    Whether the natomanga page at ``url`` needs to be scraped for new chapters
+
+    ``chapters_total`` and ``time_fetched`` are the result and timestamp of the last scrape of the page.
+    """
+
+    if _scanned is None or time() - _scanned > MAX_AGE:
+        return True
+    if chapters_total is None or time_fetched is None or _covered_since is None or time_fetched < _covered_since:
+        return True
+
+    return _latest.get(_path(url), -1) > chapters_total
+
+def clear() -> None:
+    """Forget all scans, so that every manga is scraped again"""
+
+    # pylint: disable-next=global-statement
+    global _covered_since, _scanned
+
+    _latest.clear()
+    _seen.clear()
+    _covered_since = None
+    _scanned = None
+
+def _path(url: str) -> str:
+    """Return the path of the url, because the listing doesn't always use the same host as the manga pages"""
+
+    return urlparse(url).path.rstrip("/")
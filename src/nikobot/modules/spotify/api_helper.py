@@ -19,7 +19,7 @@ async def get_user_spotify_id(user_id: int) -> str:
     headers = auth_helper.get_auth_headers(user_id)
 
     res = await req.get(url, headers)
-    json_res = await res.json()
+    json_res = res.json()
 
     return json_res["id"]
 
@@ -39,7 +39,7 @@ async def create_playlist(user_id: int, playlist_name: str) -> Playlist:
     }
 
     res = await req.post(url, headers, json=body)
-    json_res = await res.json()
+    json_res = res.json()
 
     return Playlist(playlist_name, json_res["id"], 0, None)
 
@@ -58,7 +58,7 @@ async def get_playlists(user_id: int) -> list[Playlist]:
     }
 
     res = await req.get(BASE_URL, headers, params)
-    json_res = await res.json()
+    json_res = res.json()
 
     playlists = []
     total_playlists = json_res["total"]
@@ -71,7 +71,7 @@ async def get_playlists(user_id: int) -> list[Playlist]:
         }
 
         res = await req.get(BASE_URL, headers, params)
-        json_res = await res.json()
+        json_res = res.json()
 
         for playlist_json in json_res["items"]:
             if playlist_json["owner"]["id"] == user_spotify_id:
@@ -97,7 +97,7 @@ async def get_playlist_meta(user_id: int, playlist_id: str) -> Playlist:
     }
 
     res = await req.get(url, headers, params)
-    json_res = await res.json()
+    json_res = res.json()
 
     return Playlist(json_res["name"], playlist_id, json_res["tracks"]["total"], json_res["snapshot_id"])
 
@@ -111,7 +111,7 @@ async def get_saved_tracks_meta(user_id: int) -> Playlist:
     headers = auth_helper.get_auth_headers(user_id)
 
     res = await req.get(BASE_URL, headers)
-    json_res = await res.json()
+    json_res = res.json()
 
     return Playlist("Liked Songs", f"saved_tracks:{user_id}", json_res["total"], None)
 
@@ -139,7 +139,7 @@ async def get_tracks(user_id: int, playlist_id: str) -> AsyncGenerator[Track, No
     headers = auth_helper.get_auth_headers(user_id)
 
     res = await req.get(BASE_URL, headers, params)
-    json_res = await res.json()
+    json_res = res.json()
 
     playlist_name = json_res["name"]
     total_tracks = json_res["tracks"]["total"]
@@ -154,7 +154,7 @@ async def get_tracks(user_id: int, playlist_id: str) -> AsyncGenerator[Track, No
         }
 
         res = await req.get(BASE_URL + "/tracks", headers, params)
-        json_res = await res.json()
+        json_res = res.json()
 
         for track_json in json_res["items"]:
             if track_json["track"]["id"] is not None:
@@ -178,7 +178,7 @@ async def get_saved_tracks(user_id: int) -> AsyncGenerator[Track, None]:
     headers = auth_helper.get_auth_headers(user_id)
 
     res = await req.get(BASE_URL, headers)
-    json_res = await res.json()
+    json_res = res.json()
 
     total_tracks = json_res["total"]
     logger.debug(f"Requesting {total_tracks} tracks from liked songs")
@@ -191,7 +191,7 @@ async def get_saved_tracks(user_id: int) -> AsyncGenerator[Track, None]:
         }
 
         res = await req.get(BASE_URL, headers, params)
-        json_res = await res.json()
+        json_res = res.json()
 
         for track_json in json_res["items"]:
             if track_json["track"]["id"] is not None:
@@ -63,7 +63,7 @@ async def complete_auth(user_id: int, auth_code: str):
     }
 
     res = await req.post(BASE_URL, headers, params)
-    json_res = await res.json()
+    json_res = res.json()
 
     PersistentStorage[f"spotify.{user_id}.access_token"] = json_res["access_token"]
     PersistentStorage[f"spotify.{user_id}.refresh_token"] = json_res["refresh_token"]
@@ -116,7 +116,7 @@ async def refresh_token(user_id: int) -> None:
     }
 
     res = await req.post(BASE_URL, headers, params)
-    json_res = await res.json()
+    json_res = res.json()
 
     PersistentStorage[f"spotify.{user_id}.access_token"] = json_res["access_token"]
     if "refresh_token" in json_res:
@@ -23,6 +23,15 @@ class Playlist:
     total_tracks: int
     snapshot_id: str | None
 
+@dataclass
+class PlaylistUpdate:
+    """A custom dataclass which holds the changes made by a single update of the all_playlist"""
+
+    all_playlist: Playlist
+    changed_playlists: list[Playlist]
+    removed: int
+    added: int
+
 class TrackSet:
     """
     A custom set type which only stores each track id once.
@@ -1,84 +1,76 @@
-"""A module containing wrapping functions around requests which retries on rate-limit exceedings"""
+"""A module containing wrapping functions around ``util.http`` which pace and check the Spotify API requests"""
 
-import asyncio
+from urllib.parse import urlsplit
 
-import aiohttp
 from abllib import log
 
 from .error import ApiResponseError
+from .scheduler import RequestScheduler
+from ...util import http
 
 logger = log.get_logger("spotify.req")
 
-_session = None
+# all requests of the app share one scheduler, because spotify rate-limits the whole app
+scheduler = RequestScheduler()
 
 async def get(url: str, headers: dict, params: dict | None = None, json: dict | None = None, **kwargs) \
-             -> aiohttp.ClientResponse:
+             -> http.Response:
     """Send a get request asynchronously"""
 
-    await _ensure_session()
+    res = await scheduler.run(lambda: http.get(url,
+                                               headers=headers,
+                                               params=params,
+                                               json=json,
+                                               rate_limit_retries=0,
+                                               tag=_tag(url),
+                                               **kwargs))
 
-    code = 429
-    while code == 429:
-        res = await _session.get(url, headers=headers, params=params, json=json, **kwargs)
-        code = res.status
-        if code == 429:
-            timeout = int(res.headers["Retry-After"])
-            logger.warning(f"We are being rate-limited, sleeping for {timeout} seconds")
-            await asyncio.sleep(timeout)
-
-    await _check_res(res)
+    _check_res(res)
 
     return res
 
 async def post(url: str, headers: dict, params: dict | None = None, json: dict | None = None, **kwargs) \
-              -> aiohttp.ClientResponse:
+              -> http.Response:
     """Send a post request asynchronously"""
 
-    await _ensure_session()
-
-    code = 429
-    while code == 429:
-        res = await _session.post(url, headers=headers, params=params, json=json, **kwargs)
-        code = res.status
-        if code == 429:
-            timeout = int(res.headers["Retry-After"])
-            logger.warning(f"We are being rate-limited, sleeping for {timeout} seconds")
-            await asyncio.sleep(timeout)
+    res = await scheduler.run(lambda: http.post(url,
+                                                headers=headers,
+                                                params=params,
+                                                json=json,
+                                                rate_limit_retries=0,
+                                                tag=_tag(url),
+                                                **kwargs))
 
-    await _check_res(res)
+    _check_res(res)
 
     return res
 
 async def delete(url: str, headers: dict, params: dict | None = None, json: dict | None = None, **kwargs) \
-                -> aiohttp.ClientResponse:
+                -> http.Response:
     """Send a delete request asynchronously"""
 
-    await _ensure_session()
-
-    code = 429
-    while code == 429:
-        res = await _session.delete(url, headers=headers, params=params, json=json, **kwargs)
-        code = res.status
-        if code == 429:
-            timeout = int(res.headers["Retry-After"])
-            logger.warning(f"We are being rate-limited, sleeping for {timeout} seconds")
-            await asyncio.sleep(timeout)
+    res = await scheduler.run(lambda: http.delete(url,
+                                                  headers=headers,
+                                                  params=params,
+                                                  json=json,
+                                                  rate_limit_retries=0,
+                                                  tag=_tag(url),
+                                                  **kwargs))
 
-    await _check_res(res)
+    _check_res(res)
 
     return res
 
-async def _ensure_session() -> None:
-    # pylint: disable-next=global-statement
-    global _session
-    if _session is None:
-        _session = aiohttp.ClientSession()
+def _tag(url: str) -> str:
+    # the first path segment after the api version, e.g. 'playlists' for /v1/playlists/{id}/tracks
+    segments = urlsplit(url).path.strip("/").split("/")
+    return f"spotify.{segments[1] if len(segments) > 1 else segments[0]}"
 
-async def _check_res(res: aiohttp.ClientResponse) -> None:
+def _check_res(res: http.Response) -> None:
     # also see https://developer.spotify.com/documentation/web-api/concepts/api-calls
 
-    if await _has_json(res) and "error" in await res.json():
-        error_json = await res.json()
+    if _has_json(res) and "error" in res.json():
+        error_json = res.json()
 
         # authentication error
         if isinstance(error_json["error"], str):
@@ -95,14 +87,17 @@ async def _check_res(res: aiohttp.ClientResponse) -> None:
 
     if res.status not in [200, 201]:
         err = ApiResponseError(f"Unexpected status code {res.status}")
-        err.message = await res.text()
+        err.message = res.text()
         err.status_code = res.status
 
         raise err
 
-async def _has_json(res: aiohttp.ClientResponse) -> bool:
+def _has_json(res: http.Response) -> bool:
+    if "application/json" not in res.headers.get("Content-Type", ""):
+        return False
+
     try:
-        await res.json()
+        res.json()
         return True
-    except aiohttp.ContentTypeError:
+    except ValueError:
         return False
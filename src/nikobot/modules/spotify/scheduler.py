@@ -0,0 +1,110 @@
+"""
+A module containing the ``RequestScheduler``, which paces all requests of the Spotify app
+
+Spotify calculates its rate limit over a rolling 30 second window for the whole app, not per user.
+All requests therefore share one token bucket and one backoff gate:
+if any request receives a 429, every request waits until the Retry-After time has passed.
+"""
+
+import asyncio
+import random
+from dataclasses import asdict, dataclass
+from time import monotonic
+from typing import Awaitable, Callable
+
+from abllib import log
+
+from ...util import http
+from ...util.ratelimit import TokenBucket
+
+logger = log.get_logger("spotify.scheduler")
+
+# the number of requests we allow ourselves per rolling window
+WINDOW_SECONDS = 30
+WINDOW_REQUESTS = 150
+# the number of requests which can be sent in a burst
+BURST = 20
+# the maximum random delay added to every backoff, so that waiting requests don't all retry at once
+JITTER = 1.0
+# the number of 429 responses a single request retries before giving up
+MAX_RATE_LIMITED = 5
+
+@dataclass
+class SchedulerStats:
+    """The statistics of a ``RequestScheduler``"""
+
+    queued: int = 0
+    max_queued: int = 0
+    requests: int = 0
+    rate_limited: int = 0
+    throttled_seconds: float = 0.0
+
+class RequestScheduler():
+    """Schedule requests using a shared token bucket and a global backoff gate"""
+
+    def __init__(self,
+                 window_requests: int = WINDOW_REQUESTS,
+                 window_seconds: float = WINDOW_SECONDS,
+                 burst: int = BURST) -> None:
+        self.bucket = TokenBucket(burst, window_requests / window_seconds)
+        self._stats = SchedulerStats()
+        self._blocked_until = 0.0
+
+    def stats(self) -> dict[str, int | float]:
+        """Return the ``SchedulerStats``"""
+
+        return asdict(self._stats)
+
+    async def run(self, send: Callable[[], Awaitable[http.Response]]) -> http.Response:
+        """
+        Wait for a free slot and call ``send``, retrying after 429 responses
+
+        The last response is returned if it is still rate-limited after ``MAX_RATE_LIMITED`` tries.
+        """
+
+        rate_limited = 0
+        while True:
+            await self._wait_for_slot()
+
+            res = await send()
+            self._stats.requests += 1
+
+            if res.status != 429 or rate_limited >= MAX_RATE_LIMITED:
+                return res
+
+            rate_limited += 1
+            self._stats.rate_limited += 1
+            self.block(http.retry_after(res))
+
+    def block(self, seconds: float) -> None:
+        """Block all requests for the given number of seconds"""
+
+        blocked_until = monotonic() + seconds
+        if blocked_until > self._blocked_until:
+            logger.warning(f"We are being rate-limited, pausing all requests for {seconds} seconds")
+            self._blocked_until = blocked_until
+
+    def blocked_for(self) -> float:
+        """Return the number of seconds until requests are allowed again"""
+
+        return max(self._blocked_until - monotonic(), 0.0)
+
+    async def _wait_for_slot(self) -> None:
+        start = monotonic()
+        self._stats.queued += 1
+        self._stats.max_queued = max(self._stats.max_queued, self._stats.queued)
+        try:
+            while True:
+                blocked_for = self.blocked_for()
+                if blocked_for > 0:
+                    await asyncio.sleep(blocked_for + random.uniform(0, JITTER))
+                    continue
+
+                await self.bucket.acquire()
+
+                # the gate could have closed while waiting for the token
+                if self.blocked_for() == 0:
+                    return
+        finally:
+            self._stats.queued -= 1
+            self._stats.throttled_seconds += monotonic() - start
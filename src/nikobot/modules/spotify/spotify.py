@@ -9,11 +9,12 @@ from abllib.log import get_logger
 from discord import app_commands, Color, Embed
 from discord.ext import commands, tasks
 
-from . import api_helper, auth_helper, auth_server, update_helper
+from . import api_helper, auth_helper, auth_server, req, update_helper
 from .cache import PlaylistCache
 from .dclasses import Playlist, Track
 from .error import ApiResponseError
-from ...util.discord import grouped_hybrid_command, reply, get_user_id, private_message
+from ...util.admission import Cost
+from ...util.discord import grouped_hybrid_command, reply, get_user_id, private_message, progress
 
 logger = get_logger("spotify")
 
@@ -139,7 +140,8 @@ class Spotify(commands.Cog):
     @grouped_hybrid_command(
         "all_playlist",
         "Create or update a playlist with all your songs from every playlist you created",
-        command_group
+        command_group,
+        cost=Cost(backends=("spotify",), tokens=2)
     )
     async def all_playlist(self, ctx: commands.context.Context):
         """The discord command 'niko.spotify.all_playlist'"""
@@ -150,9 +152,6 @@ class Spotify(commands.Cog):
             await reply(ctx, embed=Embed(title=REGISTER_MSG, color=Color.orange()))
             return
 
-        # to make pylint happy
-        message = None
-
         is_new_playlist = True
 
         if f"spotify.{user_id}.all_playlist.id" in PersistentStorage:
@@ -160,8 +159,8 @@ class Spotify(commands.Cog):
                 all_playlist = await api_helper.get_playlist_meta(
                     user_id,
                     PersistentStorage[f"spotify.{user_id}.all_playlist.id"])
-                message = await reply(ctx, embed=Embed(title=f"Updating existing playlist {all_playlist.name}",
-                                                       color=Color.blue()))
+                await progress(ctx, embed=Embed(title=f"Updating existing playlist {all_playlist.name}",
+                                                color=Color.blue()))
                 is_new_playlist = False
             except ApiResponseError as err:
                 if err.status_code == 404:
@@ -173,8 +172,8 @@ class Spotify(commands.Cog):
         if is_new_playlist:
             all_playlist = await api_helper.create_playlist(user_id, "🌎 everything")
             PersistentStorage[f"spotify.{user_id}.all_playlist.id"] = all_playlist.id
-            message = await reply(ctx, embed=Embed(title=f"Creating new playlist {all_playlist.name}",
-                                                   color=Color.blue()))
+            await progress(ctx, embed=Embed(title=f"Creating new playlist {all_playlist.name}",
+                                            color=Color.blue()))
 
         await update_helper.run(user_id, True)
 
@@ -195,7 +194,7 @@ class Spotify(commands.Cog):
         embed.add_field(name="Note",
                         value="Do not delete the playlist on your own, use niko.spotify.all_playlist_remove instead!",
                         inline=False)
-        await message.edit(embed=embed)
+        await progress(ctx, embed=embed)
 
     @grouped_hybrid_command(
         "all_playlist_remove",
@@ -234,6 +233,11 @@ class Spotify(commands.Cog):
                 except ApiResponseError as err:
                     logger.exception(err)
 
+    def stats(self) -> dict[str, dict[str, int | float | str]]:
+        """Return the statistics of the spotify module, which are listed by the dev module"""
+
+        return {"spotify scheduler": req.scheduler.stats()}
+
 def import_cache():
     """Import playlist cache from PersistentStorage"""
 
@@ -10,8 +10,9 @@ from discord.interactions import InteractionMessage
 
 from . import api_helper
 from .cache import PlaylistCache
-from .dclasses import Track, TrackSet, Playlist
+from .dclasses import Track, TrackSet, Playlist, PlaylistUpdate
 from ...util import discord
+from ...util.singleflight import coalesce
 
 logger = log.get_logger("spotify.update_helper")
 
@@ -23,6 +24,18 @@ async def run(user_id: int, notify_user: bool = True) -> None:
     """Check if any playlist changed, and update all_playlist accordingly"""
 
     if not isinstance(user_id, int): raise WrongTypeError.with_values(user_id, int)
+    if not isinstance(notify_user, bool): raise WrongTypeError.with_values(notify_user, bool)
+
+    update = await _update(user_id)
+
+    # the update is shared by all concurrent callers, so every caller decides on its own whether to notify
+    if notify_user and update is not None:
+        await _notify(user_id, update)
+
+# the background task and the all_playlist command can overlap for the same user
+@coalesce("spotify.update")
+async def _update(user_id: int) -> PlaylistUpdate | None:
+    """Update the all_playlist of the user, returning the made changes or None if nothing changed"""
 
     if f"spotify.{user_id}.all_playlist.id" not in PersistentStorage:
         raise Exception(f"Expected all_playlist to exist for user {user_id}")
@@ -52,7 +65,7 @@ async def run(user_id: int, notify_user: bool = True) -> None:
     if len(changed_playlists) == 0 and cache.get(liked_songs_playlist) is not None:
         # yay, nothing changed and we can exit early
         logger.debug("Nothing changed, we can exit early")
-        return
+        return None
 
     new_tracks_set = TrackSet()
 
@@ -66,10 +79,9 @@ async def run(user_id: int, notify_user: bool = True) -> None:
     total = len(changed_playlists) + len(cached_playlists)
     logger.debug(f"{changes}/{total} playlists changed, fetching tracks")
     for playlist in changed_playlists:
-        tracks = []
-        async for track in api_helper.get_tracks(user_id, playlist.id):
+        tracks = await _fetch_tracks(user_id, playlist)
+        for track in tracks:
             new_tracks_set.add(track)
-            tracks.append(track)
         # order doesn't matter because its sorted by timestamp after
         cache.set(playlist, tracks)
 
@@ -124,7 +136,7 @@ async def run(user_id: int, notify_user: bool = True) -> None:
 
     if len(to_add) == 0 and len(to_remove) == 0:
         logger.debug("nothing was added or removed")
-        return
+        return None
 
     # wait for spotify to finish processing
     remote_track_count = 0
@@ -138,32 +150,45 @@ async def run(user_id: int, notify_user: bool = True) -> None:
 
     cache.set(all_playlist, new_tracks_set.tracks())
 
-    if notify_user:
-        embed = Embed(
-            title="Successfully updated your playlist",
-            description=f"Removed **{len(to_remove)}** and added **{len(to_add)}** tracks"
-                        f" for a total of **{all_playlist.total_tracks}** tracks.",
-            color=Color.green()
-        )
-        embed.add_field(name="Changed playlist",
-                        value=all_playlist.name,
-                        inline=False)
-        embed.add_field(name="Source playlists with changes",
-                        value="\n".join([item.name for item in changed_playlists]),
-                        inline=False)
-        embed.add_field(name="Url",
-                        value=f"https://open.spotify.com/playlist/{all_playlist.id}",
-                        inline=False)
-        embed.add_field(name="Note",
-                        value="Local tracks are not supported by the Spotify Web API, so they were ignored.",
-                        inline=False)
-        embed.add_field(name="Note",
-                        value="Do not delete the playlist on your own, use niko.spotify.all_playlist_remove instead!",
-                        inline=False)
-        await discord.private_message(
-            user_id,
-            embed=embed
-        )
+    return PlaylistUpdate(all_playlist, changed_playlists, len(to_remove), len(to_add))
+
+# concurrent callers sharing an update only send a single message, every update has its own snapshot_id
+@coalesce("spotify.notify", grace=60, key=lambda user_id, update: (user_id, update.all_playlist.snapshot_id))
+async def _notify(user_id: int, update: PlaylistUpdate) -> None:
+    """Send the user a message about the changes made to the all_playlist"""
+
+    all_playlist = update.all_playlist
+    embed = Embed(
+        title="Successfully updated your playlist",
+        description=f"Removed **{update.removed}** and added **{update.added}** tracks"
+                    f" for a total of **{all_playlist.total_tracks}** tracks.",
+        color=Color.green()
+    )
+    embed.add_field(name="Changed playlist",
+                    value=all_playlist.name,
+                    inline=False)
+    embed.add_field(name="Source playlists with changes",
+                    value="\n".join([item.name for item in update.changed_playlists]),
+                    inline=False)
+    embed.add_field(name="Url",
+                    value=f"https://open.spotify.com/playlist/{all_playlist.id}",
+                    inline=False)
+    embed.add_field(name="Note",
+                    value="Local tracks are not supported by the Spotify Web API, so they were ignored.",
+                    inline=False)
+    embed.add_field(name="Note",
+                    value="Do not delete the playlist on your own, use niko.spotify.all_playlist_remove instead!",
+                    inline=False)
+    await discord.private_message(
+        user_id,
+        embed=embed
+    )
+
+@coalesce("spotify.playlist", grace=60, key=lambda user_id, playlist: (playlist.id, playlist.snapshot_id))
+async def _fetch_tracks(user_id: int, playlist: Playlist) -> list[Track]:
+    """Fetch all tracks of the given playlist, sharing the result with concurrent fetches of the same playlist"""
+
+    return [track async for track in api_helper.get_tracks(user_id, playlist.id)]
 
 def calculate_diff(saved_track_ids: list[str], updated_track_ids: list[str]) -> tuple[list[str], list[str]]:
     """
@@ -1,11 +1,18 @@
 """Exports discord, error, general, VolatileStorage, PersistentStorage"""
 
-from . import discord, error, general
+from . import accounting, admission, discord, error, general, http, httpcache, jobs, ratelimit, singleflight
 from .color import Color
 
 __exports__ = [
+    accounting,
+    admission,
     discord,
     error,
     general,
+    http,
+    httpcache,
+    jobs,
+    ratelimit,
+    singleflight,
     Color
 ]
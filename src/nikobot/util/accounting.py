@@ -0,0 +1,117 @@
+"""
+Module containing the request accounting of all outbound HTTP requests
+
+Every request sent with ``util.http`` is counted under its tag, which names the module and the purpose
+like 'mal.manga', together with its host. The counts are kept in rolling one-minute buckets for the last day,
+so the usage can be reported for any window up to 24 hours and projected to a whole day.
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+
+BUCKET_SECONDS = 60
+MAX_WINDOW = 24 * 60 * 60
+
+# the number of requests per day we allow ourselves per host
+# Spotify allows roughly 150 requests per 30 seconds, the others don't publish a limit, so these are our own budgets
+DAILY_BUDGETS = {
+    "api.myanimelist.net": 10_000,
+    "natomanga.com": 5_000,
+    "api.spotify.com": 150 * 2 * 60 * 24,
+    "accounts.spotify.com": 1_000
+}
+
+@dataclass
+class Usage:
+    """The requests sent with a single tag to a single host within a window"""
+
+    tag: str
+    host: str
+    requests: int
+    bytes_received: int
+    projected_daily: float
+
+class RollingCounter():
+    """Count requests and bytes in buckets of ``BUCKET_SECONDS``, forgetting buckets older than ``MAX_WINDOW``"""
+
+    def __init__(self) -> None:
+        # every bucket is [bucket index, requests, bytes received]
+        self._buckets: deque[list[int]] = deque()
+
+    def add(self, bytes_received: int) -> None:
+        """Count a single request"""
+
+        index = int(monotonic() // BUCKET_SECONDS)
+        if len(self._buckets) == 0 or self._buckets[-1][0] != index:
+            self._buckets.append([index, 0, 0])
+            self._forget(index)
+
+        self._buckets[-1][1] += 1
+        self._buckets[-1][2] += bytes_received
+
+    def totals(self, seconds: float) -> tuple[int, int]:
+        """Return the number of requests and bytes within the last ``seconds``"""
+
+        oldest = int((monotonic() - seconds) // BUCKET_SECONDS)
+        requests = 0
+        bytes_received = 0
+        for index, bucket_requests, bucket_bytes in reversed(self._buckets):
+            if index <= oldest:
+                break
+            requests += bucket_requests
+            bytes_received += bucket_bytes
+        return requests, bytes_received
+
+    def _forget(self, index: int) -> None:
+        oldest = index - MAX_WINDOW // BUCKET_SECONDS
+        while self._buckets[0][0] <= oldest:
+            self._buckets.popleft()
+
+_counters: dict[tuple[str, str], RollingCounter] = {}
+_lock = threading.Lock()
+_started = monotonic()
+
+def record(tag: str, host: str, bytes_received: int) -> None:
+    """Count a single request with the given tag to the given host"""
+
+    if not isinstance(tag, str): raise TypeError()
+    if not isinstance(host, str): raise TypeError()
+
+    with _lock:
+        if (tag, host) not in _counters:
+            _counters[(tag, host)] = RollingCounter()
+        _counters[(tag, host)].add(bytes_received)
+
+def usage(seconds: float = 60 * 60) -> list[Usage]:
+    """
+    Return the usage of every tag and host within the last ``seconds``, sorted by the number of requests
+
+    The projection to a whole day only uses the time since startup if the bot runs for less than ``seconds``.
+    """
+
+    if seconds <= 0 or seconds > MAX_WINDOW:
+        raise ValueError(f"seconds needs to be between 0 and {MAX_WINDOW}")
+
+    measured = max(min(seconds, monotonic() - _started), 1.0)
+
+    result = []
+    with _lock:
+        for (tag, host), counter in _counters.items():
+            requests, bytes_received = counter.totals(seconds)
+            if requests > 0:
+                result.append(Usage(tag, host, requests, bytes_received, requests * MAX_WINDOW / measured))
+
+    result.sort(key=lambda item: item.requests, reverse=True)
+    return result
+
+def clear() -> None:
+    """Forget all counted requests"""
+
+    # pylint: disable-next=global-statement
+    global _started
+
+    with _lock:
+        _counters.clear()
+        _started = monotonic()
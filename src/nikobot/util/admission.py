@@ -0,0 +1,133 @@
+"""
+Module containing the admission control for expensive commands
+
+Every command execution has to fit into the budget of the user, the guild and every backend the command uses.
+Requests that would fit soon are queued, all others are rejected with a retry-after time.
+"""
+
+import asyncio
+import math
+from collections import Counter
+from dataclasses import dataclass
+from time import monotonic
+
+from abllib.log import get_logger
+
+from . import error
+from .ratelimit import TokenBucket
+
+logger = get_logger("admission")
+
+@dataclass(frozen=True)
+class Budget:
+    """The budget of a single admission scope"""
+
+    burst: float
+    per_minute: float
+
+@dataclass(frozen=True)
+class Cost:
+    """The admission cost of a single command execution"""
+
+    backends: tuple[str, ...] = ()
+    tokens: float = 1.0
+
+USER_BUDGET = Budget(burst=3, per_minute=2)
+GUILD_BUDGET = Budget(burst=10, per_minute=6)
+BACKEND_BUDGETS = {
+    "mal": Budget(burst=20, per_minute=20),
+    "natomanga": Budget(burst=10, per_minute=6),
+    "spotify": Budget(burst=10, per_minute=10)
+}
+DEFAULT_BACKEND_BUDGET = Budget(burst=10, per_minute=10)
+
+# requests which fit into the budget within this many seconds are queued instead of rejected
+MAX_QUEUE_TIME = 10.0
+
+# full buckets are dropped every this many seconds, a full bucket is the same as a new one
+SWEEP_INTERVAL = 10 * 60
+
+_buckets: dict[str, TokenBucket] = {}
+# the number of queued executions waiting for every bucket, whose buckets are never dropped
+_waiting: Counter[str] = Counter()
+_last_sweep = monotonic()
+_stats: dict[str, dict[str, int]] = {}
+
+async def admit(command_name: str, user_id: int, guild_id: int | None, cost: Cost) -> None:
+    """
+    Wait until the command execution fits into all budgets and consume them
+
+    Raises an ``error.AdmissionRejected`` if the wait would be longer than ``MAX_QUEUE_TIME``
+    """
+
+    if not isinstance(cost, Cost): raise TypeError()
+
+    _sweep()
+    buckets = _get_buckets(user_id, guild_id, cost)
+
+    queued = False
+    try:
+        while True:
+            # a cost above the burst size would never fit, so it is clamped
+            wait = max(bucket.time_until(min(cost.tokens, bucket.capacity)) for bucket in buckets.values())
+
+            if wait <= 0:
+                for bucket in buckets.values():
+                    bucket.consume(cost.tokens)
+                _count(command_name, "queued" if queued else "admitted")
+                return
+
+            if wait > MAX_QUEUE_TIME:
+                _count(command_name, "rejected")
+                retry_after = math.ceil(wait)
+                logger.info(f"Rejected command {command_name} of user {user_id}, retry after {retry_after}s")
+
+                err = error.AdmissionRejected.with_values(retry_after)
+                err.retry_after = retry_after
+                raise err
+
+            if not queued:
+                queued = True
+                _waiting.update(buckets.keys())
+            await asyncio.sleep(wait)
+    finally:
+        if queued:
+            _waiting.subtract(buckets.keys())
+
+def stats() -> dict[str, dict[str, int]]:
+    """Return the number of admitted, queued and rejected executions per command"""
+
+    return {name: counts.copy() for name, counts in _stats.items()}
+
+def _get_buckets(user_id: int, guild_id: int | None, cost: Cost) -> dict[str, TokenBucket]:
+    keys: list[tuple[str, Budget]] = [(f"user.{user_id}", USER_BUDGET)]
+    if guild_id is not None:
+        keys.append((f"guild.{guild_id}", GUILD_BUDGET))
+    for backend in cost.backends:
+        keys.append((f"backend.{backend}", BACKEND_BUDGETS.get(backend, DEFAULT_BACKEND_BUDGET)))
+
+    buckets = {}
+    for key, budget in keys:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(budget.burst, budget.per_minute / 60)
+        buckets[key] = _buckets[key]
+    return buckets
+
+def _sweep() -> None:
+    """Drop the full buckets, so that a bucket isn't kept forever for every user and guild"""
+
+    # pylint: disable-next=global-statement
+    global _last_sweep
+
+    if monotonic() - _last_sweep < SWEEP_INTERVAL:
+        return
+    _last_sweep = monotonic()
+
+    for key in [key for key, bucket in _buckets.items() if bucket.is_full() and _waiting[key] <= 0]:
+        del _buckets[key]
+        _waiting.pop(key, None)
+
+def _count(command_name: str, result: str) -> None:
+    if command_name not in _stats:
+        _stats[command_name] = {"admitted": 0, "queued": 0, "rejected": 0}
+    _stats[command_name][result] += 1
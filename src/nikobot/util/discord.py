@@ -1,5 +1,6 @@
 """Module containing general functionality which works for both 'normal' text commands and slash commands"""
 
+import asyncio
 import functools
 import inspect
 import re
@@ -11,12 +12,20 @@ import discord as discordpy
 from discord import app_commands
 from discord.ext import commands
 
-from . import error
+from . import admission, error, jobs
 
 logger = get_logger("core")
 
 CONTEXT = commands.context.Context | discordpy.interactions.Interaction
 
+# the number of seconds after which slash commands are deferred
+# discord requires an answer within 3 seconds
+DEFER_AFTER = 2.0
+
+# interaction ids which were deferred, but not yet replied to
+_deferred: set[int] = set()
+_response_locks: dict[int, asyncio.Lock] = {}
+
 def get_command_name(ctx: commands.context.Context | discordpy.interactions.Interaction) -> str:
     """Return the full name of the contexts' command"""
 
@@ -59,6 +68,14 @@ async def get_reply(ctx: commands.context.Context | discordpy.interactions.Inter
 
     return await ctx.original_response()
 
+def get_guild_id(ctx: commands.context.Context | discordpy.interactions.Interaction) -> int | None:
+    """Get the id of the guild the message was sent in, or None for private messages"""
+
+    if ctx.guild is None:
+        return None
+
+    return ctx.guild.id
+
 def get_user_id(ctx: commands.context.Context | discordpy.interactions.Interaction) -> int:
     """Get discords user id from the message's sender"""
 
@@ -194,8 +211,20 @@ def hybrid_command(name: str, description: str):
         return wrapper
     return decorator
 
-def grouped_hybrid_command(name: str, description: str, command_group: app_commands.Group):
-    """Register the provided method as both a normal and a slash command of a given command group"""
+def grouped_hybrid_command(name: str,
+                           description: str,
+                           command_group: app_commands.Group,
+                           defer_after: float | None = DEFER_AFTER,
+                           cost: admission.Cost | None = None):
+    """
+    Register the provided method as both a normal and a slash command of a given command group
+
+    The command is run as a tracked ``jobs.Job``.
+    If it doesn't reply within ``defer_after`` seconds, slash commands are automatically deferred.
+    Set ``defer_after`` to None to disable this behaviour.
+
+    If a ``cost`` is given, every execution needs to pass the admission control first.
+    """
 
     def decorator(func):
         """The decorator, which is called at program start"""
@@ -208,7 +237,23 @@ def grouped_hybrid_command(name: str, description: str, command_group: app_comma
             """The wrapped function that is called on command execution"""
 
             cog = get_bot().cogs[cls_name]
-            return await func(cog, *args, **kwargs)
+            ctx = args[0]
+
+            coro = func(cog, *args, **kwargs)
+            if cost is not None:
+                coro = _admitted(ctx, f"{command_group.name}.{name}", cost, coro)
+
+            if defer_after is None:
+                return await coro
+
+            job = jobs.start(f"{command_group.name}.{name}", get_user_id(ctx), coro)
+            try:
+                await _defer_if_slow(ctx, job, defer_after)
+                return await job.wait()
+            finally:
+                if is_slash_command(ctx):
+                    _deferred.discard(ctx.id)
+                    _response_locks.pop(ctx.id, None)
 
         # for some reason the decorator gets called twice for every command
         # so we skip registrating an already existing command
@@ -240,6 +285,46 @@ def grouped_hybrid_command(name: str, description: str, command_group: app_comma
         return wrapper
     return decorator
 
+async def _admitted(ctx: CONTEXT, command_name: str, cost: admission.Cost, coro: typing.Coroutine) -> typing.Any:
+    """Run the command coroutine if the admission control lets it through, otherwise reply with the retry time"""
+
+    try:
+        await admission.admit(command_name, get_user_id(ctx), get_guild_id(ctx), cost)
+    except error.AdmissionRejected as e:
+        coro.close()
+        embed = discordpy.Embed(title="You are using this command too often",
+                                description=f"Please try again in {e.retry_after} seconds",
+                                color=discordpy.Color.orange())
+        await reply(ctx, embed=embed)
+        return None
+
+    return await coro
+
+async def _defer_if_slow(ctx: CONTEXT, job: jobs.Job, defer_after: float) -> None:
+    """Defer the slash command if the ``jobs.Job`` didn't reply within ``defer_after`` seconds"""
+
+    if not is_slash_command(ctx):
+        return
+
+    done, _ = await asyncio.wait({job.task}, timeout=defer_after)
+    if len(done) > 0:
+        return
+
+    async with _response_lock(ctx):
+        if ctx.response.is_done():
+            return
+
+        logger.debug(f"Deferring command {job.name} after {defer_after} seconds")
+        await ctx.response.defer(thinking=True)
+        _deferred.add(ctx.id)
+
+def _response_lock(ctx: discordpy.interactions.Interaction) -> asyncio.Lock:
+    """Return the lock which prevents deferring and replying at the same time"""
+
+    if ctx.id not in _response_locks:
+        _response_locks[ctx.id] = asyncio.Lock()
+    return _response_locks[ctx.id]
+
 # pylint: disable=f-string-without-interpolation
 
 # pylint: disable-next=too-many-statements
@@ -543,13 +628,61 @@ async def reply(ctx: commands.context.Context | discordpy.interactions.Interacti
     """
 
     if not is_slash_command(ctx):
-        return await ctx.reply(*args, **kwargs)
+        message = await ctx.reply(*args, **kwargs)
+        _set_job_message(message)
+        return message
+
+    async with _response_lock(ctx):
+        if ctx.id in _deferred:
+            # the 'thinking...' message of the deferred interaction is replaced
+            _deferred.discard(ctx.id)
+            if "file" in kwargs:
+                kwargs["attachments"] = [kwargs.pop("file")]
+            if len(args) > 0:
+                kwargs["content"] = args[0]
+            message = await ctx.edit_original_response(**kwargs)
+            _set_job_message(message)
+            return message
+
+        if ctx.response.is_done():
+            raise error.MultipleReplies()
+
+        await ctx.response.send_message(*args, **kwargs)
+
+    message = await ctx.original_response()
+    _set_job_message(message)
+    return message
+
+async def progress(ctx: commands.context.Context | discordpy.interactions.Interaction, *args, **kwargs) \
+          -> discordpy.Message | discordpy.interactions.InteractionMessage:
+    """
+    Report the progress of a long-running command
 
-    if ctx.response.is_done():
-        raise error.MultipleReplies()
+    The first call sends a reply, all following calls edit that reply.
+    The ``args`` and ``kwargs`` are passed on as-is.
+    """
 
-    await ctx.response.send_message(*args, **kwargs)
-    return await ctx.original_response()
+    job = jobs.current()
+
+    if "embed" in kwargs and kwargs["embed"] is not None and job is not None:
+        job.progress = kwargs["embed"].title
+
+    if job is None or job.message is None:
+        return await reply(ctx, *args, **kwargs)
+
+    if len(args) > 0:
+        kwargs["content"] = args[0]
+    if "file" in kwargs:
+        kwargs["attachments"] = [kwargs.pop("file")]
+
+    return await job.message.edit(**kwargs)
+
+def _set_job_message(message: discordpy.Message | discordpy.interactions.InteractionMessage) -> None:
+    """Store the reply message in the current ``jobs.Job``, if any"""
+
+    job = jobs.current()
+    if job is not None and job.message is None:
+        job.message = message
 
 async def channel_message(channel_id: int, *args, **kwargs) -> discordpy.Message:
     """
@@ -598,12 +731,13 @@ async def parse_user(ctx: commands.context.Context | discordpy.interactions.Inte
             # this is stupid, but it works
             # pylint: disable-next=missing-class-docstring
             class ConverterCtx():
-                def __init__(self, bot, message) -> None:
+                def __init__(self, bot, guild, message) -> None:
                     self.bot = bot
-                    self.guild = None
+                    # the guild is needed to lazily query members, because they aren't cached
+                    self.guild = guild
                     self.message = message
 
-            user = await converter.convert(ConverterCtx(get_bot(), ctx.message), user)
+            user = await converter.convert(ConverterCtx(get_bot(), ctx.guild, ctx.message), user)
         return user
     except:
         pass
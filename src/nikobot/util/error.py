@@ -31,3 +31,21 @@ class MissingRequiredArgument(commands.MissingRequiredArgument):
 
 class TooManyArguments(commands.TooManyArguments):
     """Exception raised when a command was called with too many arguments"""
+
+class AdmissionRejected(CustomException):
+    """Exception raised when a command exceeded its admission budget"""
+
+    default_messages = {
+        0: "The command exceeded its admission budget",
+        1: "The command exceeded its admission budget, retry after {0} seconds"
+    }
+    retry_after: float | None
+
+class CircuitOpen(CustomException):
+    """Exception raised when a backend is unavailable and its circuit breaker doesn't let requests through"""
+
+    default_messages = {
+        0: "The backend is currently unavailable",
+        2: "The backend {0} is currently unavailable, retry after {1} seconds"
+    }
+    retry_after: float | None
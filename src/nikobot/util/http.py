@@ -0,0 +1,256 @@
+"""
+Module containing the shared asynchronous HTTP client, which is used by all modules
+
+All requests go through a single ``aiohttp.ClientSession``, which keeps connections to every host alive.
+Every host has its own concurrency limit, and failed or rate-limited requests are retried using the same policy.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json as jsonlib
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any
+from urllib.parse import urlsplit
+
+import aiohttp
+from abllib.log import get_logger
+from multidict import CIMultiDictProxy
+
+from . import accounting
+
+logger = get_logger("http")
+
+# the maximum number of concurrent requests per host
+HOST_LIMITS = {
+    "api.myanimelist.net": 4,
+    "natomanga.com": 2,
+    "api.spotify.com": 8,
+    "accounts.spotify.com": 2
+}
+DEFAULT_HOST_LIMIT = 4
+
+# the number of retries after a connection error, timeout or server error
+RETRIES = 3
+RETRY_BACKOFF = 1.0
+RETRY_STATUS_CODES = [500, 502, 503, 504]
+
+# the number of retries after a 429 response, and the longest Retry-After we are willing to wait
+RATE_LIMIT_RETRIES = 5
+MAX_RETRY_AFTER = 300.0
+
+DEFAULT_TIMEOUT = 30.0
+
+@dataclass
+class Response():
+    """A completed HTTP response, whose body is already fully read"""
+
+    status: int
+    headers: CIMultiDictProxy[str]
+    content: bytes
+    url: str
+
+    @property
+    def ok(self) -> bool:
+        """Return whether the status code is below 400"""
+
+        return self.status < 400
+
+    def text(self, encoding: str = "utf8") -> str:
+        """Return the body decoded as text"""
+
+        return self.content.decode(encoding, errors="replace")
+
+    def json(self) -> Any:
+        """Return the body parsed as json, raising a ``ValueError`` if it isn't valid json"""
+
+        return jsonlib.loads(self.content)
+
+@dataclass
+class HostMetrics():
+    """The request metrics of a single host"""
+
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    bytes_received: int = 0
+    latency_total: float = 0.0
+    latency_max: float = 0.0
+    status_codes: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def latency_avg(self) -> float:
+        """Return the average request latency in seconds"""
+
+        if self.requests == 0:
+            return 0.0
+        return self.latency_total / self.requests
+
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+_metrics: dict[str, HostMetrics] = {}
+
+async def get(url: str, **kwargs) -> Response:
+    """Send a GET request, see ``request`` for the arguments"""
+
+    return await request("GET", url, **kwargs)
+
+async def post(url: str, **kwargs) -> Response:
+    """Send a POST request, see ``request`` for the arguments"""
+
+    return await request("POST", url, **kwargs)
+
+async def delete(url: str, **kwargs) -> Response:
+    """Send a DELETE request, see ``request`` for the arguments"""
+
+    return await request("DELETE", url, **kwargs)
+
+async def request(method: str,
+                  url: str,
+                  headers: dict[str, str] | None = None,
+                  params: dict[str, Any] | None = None,
+                  json: Any = None,
+                  data: Any = None,
+                  timeout: float = DEFAULT_TIMEOUT,
+                  retries: int = RETRIES,
+                  rate_limit_retries: int = RATE_LIMIT_RETRIES,
+                  tag: str = "other") -> Response:
+    """
+    Send a HTTP request and return the ``Response``
+
+    ``tag`` names the module and purpose of the request, like 'mal.manga', and is used for the request accounting.
+
+    Connection errors, timeouts and server errors are retried ``retries`` times with an exponential backoff.
+    429 responses are retried ``rate_limit_retries`` times after the time in their Retry-After header.
+    If all retries fail, the last response is returned or the last exception is raised.
+    """
+
+    if not isinstance(method, str): raise TypeError()
+    if not isinstance(url, str): raise TypeError()
+
+    host = urlsplit(url).hostname or ""
+    host_metrics = _metrics.setdefault(host, HostMetrics())
+    session = _get_session()
+
+    attempt = 0
+    rate_limited = 0
+    while True:
+        start = monotonic()
+        try:
+            async with _get_semaphore(host):
+                async with session.request(method,
+                                           url,
+                                           headers=headers,
+                                           params=params,
+                                           json=json,
+                                           data=data,
+                                           timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+                    content = await res.read()
+                    response = Response(res.status, res.headers, content, str(res.url))
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            _record(host_metrics, start, None, 0)
+            accounting.record(tag, host, 0)
+            host_metrics.errors += 1
+            if attempt >= retries:
+                logger.warning(f"{method} {host} failed after {attempt + 1} attempts: {type(e).__name__}")
+                raise
+            attempt += 1
+            host_metrics.retries += 1
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            continue
+
+        _record(host_metrics, start, response.status, len(content))
+        accounting.record(tag, host, len(content))
+
+        if response.status == 429 and rate_limited < rate_limit_retries:
+            wait = retry_after(response)
+            if wait <= MAX_RETRY_AFTER:
+                rate_limited += 1
+                host_metrics.rate_limited += 1
+                logger.warning(f"We are being rate-limited by {host}, sleeping for {wait} seconds")
+                await asyncio.sleep(wait)
+                continue
+
+        if response.status in RETRY_STATUS_CODES and attempt < retries:
+            attempt += 1
+            host_metrics.retries += 1
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+            continue
+
+        return response
+
+def metrics() -> dict[str, HostMetrics]:
+    """Return a copy of the request metrics per host"""
+
+    return {
+        host: HostMetrics(m.requests, m.retries, m.rate_limited, m.errors, m.bytes_received,
+                          m.latency_total, m.latency_max, m.status_codes.copy())
+        for host, m in _metrics.items()
+    }
+
+def stats() -> dict[str, dict[str, int | float]]:
+    """Return the number of requests, the received KiB and the latencies in milliseconds per host"""
+
+    return {
+        host: {
+            "requests": m.requests,
+            "retries": m.retries,
+            "rate_limited": m.rate_limited,
+            "errors": m.errors,
+            "received_kib": m.bytes_received / 1024,
+            "latency_avg_ms": m.latency_avg * 1000,
+            "latency_max_ms": m.latency_max * 1000
+        }
+        for host, m in _metrics.items()
+    }
+
+def retry_after(response: Response) -> float:
+    """Return the number of seconds from the responses' Retry-After header, defaulting to 1 second"""
+
+    try:
+        return max(float(response.headers.get("Retry-After", "1")), 0.0)
+    except ValueError:
+        return 1.0
+
+async def close() -> None:
+    """Close the shared session and all its open connections"""
+
+    # pylint: disable-next=global-statement
+    global _session, _session_loop
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+    _session = None
+    _session_loop = None
+    _host_semaphores.clear()
+
+def _get_session() -> aiohttp.ClientSession:
+    # pylint: disable-next=global-statement
+    global _session, _session_loop
+
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        # sessions and semaphores are bound to an event loop, so a new loop (e.g. in tests) needs new ones
+        _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60))
+        _session_loop = loop
+        _host_semaphores.clear()
+
+    return _session
+
+def _get_semaphore(host: str) -> asyncio.Semaphore:
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT))
+    return _host_semaphores[host]
+
+def _record(metrics_obj: HostMetrics, start: float, status: int | None, size: int) -> None:
+    latency = monotonic() - start
+    metrics_obj.requests += 1
+    metrics_obj.bytes_received += size
+    metrics_obj.latency_total += latency
+    metrics_obj.latency_max = max(metrics_obj.latency_max, latency)
+    if status is not None:
+        metrics_obj.status_codes[status] = metrics_obj.status_codes.get(status, 0) + 1
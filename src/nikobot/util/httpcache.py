@@ -0,0 +1,209 @@
+"""
+Module containing the ``HttpCache`` class, a conditional-request cache in front of ``util.http``
+
+Responses with an ETag or Last-Modified header are revalidated on every request,
+which only transfers the body if it changed.
+Responses without validators are reused for a fixed time to live instead.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import time
+
+from abllib.log import get_logger
+from multidict import CIMultiDict, CIMultiDictProxy
+
+from . import http
+
+logger = get_logger("httpcache")
+
+# the response headers which are stored with every entry
+STORED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Cache-Control"]
+
+@dataclass
+class CacheEntry():
+    """A single cached response"""
+
+    url: str
+    content: bytes
+    headers: dict[str, str]
+    fresh_until: float
+
+    @property
+    def etag(self) -> str | None:
+        """Return the ETag validator, or None if the response had none"""
+
+        return self.headers.get("ETag")
+
+    @property
+    def last_modified(self) -> str | None:
+        """Return the Last-Modified validator, or None if the response had none"""
+
+        return self.headers.get("Last-Modified")
+
+    def to_response(self) -> http.Response:
+        """Convert the entry back to a ``http.Response``"""
+
+        return http.Response(200, CIMultiDictProxy(CIMultiDict(self.headers)), self.content, self.url)
+
+class HttpCache():
+    """
+    A cache for GET responses, which is persisted to a json file
+
+    The cache holds at most ``max_entries`` responses, removing the least recently used ones first.
+    """
+
+    def __init__(self, name: str, max_entries: int = 5000) -> None:
+        if not isinstance(name, str): raise TypeError()
+        if not isinstance(max_entries, int): raise TypeError()
+
+        self.name = name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._path: str | None = None
+
+    async def get(self,
+                  url: str,
+                  headers: dict[str, str] | None = None,
+                  ttl: float = 0.0,
+                  tag: str = "other") -> http.Response:
+        """
+        Send a GET request to the given url, using the cached response if possible
+
+        ``ttl`` is the number of seconds a response without validators is reused without asking the server.
+        ``tag`` is passed on to ``http.request``.
+        """
+
+        if not isinstance(url, str): raise TypeError()
+        if not isinstance(ttl, (int, float)): raise TypeError()
+
+        entry = self._entries.get(url)
+        if entry is not None:
+            self._entries.move_to_end(url)
+
+            if entry.fresh_until > time():
+                self.hits += 1
+                return entry.to_response()
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry.etag is not None:
+                request_headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                request_headers["If-Modified-Since"] = entry.last_modified
+
+        res = await http.get(url, headers=request_headers, tag=tag)
+
+        if res.status == 304 and entry is not None:
+            self.revalidated += 1
+            entry.fresh_until = self._fresh_until(res.headers, ttl, True)
+            return entry.to_response()
+
+        self.misses += 1
+
+        if res.status == 200:
+            self._store(url, res, ttl)
+        elif entry is not None:
+            # the server couldn't revalidate the entry, so it is outdated
+            del self._entries[url]
+
+        return res
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of hits, misses, revalidations and stored entries"""
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "entries": len(self._entries)
+        }
+
+    def clear(self) -> None:
+        """Remove all entries"""
+
+        self._entries.clear()
+
+    def load(self, path: str) -> None:
+        """Load the entries from the given file, which is also used by ``save``"""
+
+        if not isinstance(path, str): raise TypeError()
+
+        self._path = path
+        if not os.path.isfile(path):
+            return
+
+        try:
+            with open(path, "r", encoding="utf8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"Couldn't read http cache file {path}, starting with an empty cache")
+            return
+
+        for item in data:
+            self._entries[item["url"]] = CacheEntry(item["url"],
+                                                    item["content"].encode("utf8"),
+                                                    item["headers"],
+                                                    item["fresh_until"])
+
+        logger.info(f"Loaded {len(self._entries)} entries into http cache {self.name}")
+
+    def save(self) -> None:
+        """Save the entries to the file given to ``load``"""
+
+        if self._path is None:
+            return
+
+        data = []
+        for entry in self._entries.values():
+            try:
+                content = entry.content.decode("utf8")
+            except UnicodeDecodeError:
+                # binary responses aren't persisted
+                continue
+
+            data.append({
+                "url": entry.url,
+                "content": content,
+                "headers": entry.headers,
+                "fresh_until": entry.fresh_until
+            })
+
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, "w", encoding="utf8") as f:
+            json.dump(data, f)
+
+    def _store(self, url: str, res: http.Response, ttl: float) -> None:
+        headers = {key: res.headers[key] for key in STORED_HEADERS if key in res.headers}
+        has_validators = "ETag" in headers or "Last-Modified" in headers
+
+        self._entries[url] = CacheEntry(url, res.content, headers, self._fresh_until(res.headers, ttl, has_validators))
+        self._entries.move_to_end(url)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _fresh_until(self, headers: CIMultiDictProxy[str], ttl: float, has_validators: bool) -> float:
+        # an explicit max-age from the server always wins
+        for directive in headers.get("Cache-Control", "").split(","):
+            directive = directive.strip().lower()
+            if directive in ("no-cache", "no-store"):
+                return 0.0
+            if directive.startswith("max-age="):
+                try:
+                    return time() + int(directive.split("=", maxsplit=1)[1])
+                except ValueError:
+                    pass
+
+        if has_validators:
+            # revalidating is cheap, so the entry is revalidated on every request
+            return 0.0
+
+        return time() + ttl
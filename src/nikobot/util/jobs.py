@@ -0,0 +1,94 @@
+"""Module containing the ``Job`` class, which tracks long-running command executions"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from datetime import datetime
+from typing import Any, Coroutine
+
+import discord as discordpy
+from abllib.log import get_logger
+
+logger = get_logger("jobs")
+
+_jobs: dict[int, Job] = {}
+_current_job: contextvars.ContextVar[Job | None] = contextvars.ContextVar("current_job", default=None)
+
+class Job():
+    """
+    A single command execution, running as a tracked background task
+
+    The progress and the reply message are stored so that the command can keep editing its reply.
+    """
+
+    def __init__(self, name: str, user_id: int, coro: Coroutine) -> None:
+        if not isinstance(name, str): raise TypeError()
+        if not isinstance(user_id, int): raise TypeError()
+
+        self.name = name
+        self.user_id = user_id
+        self.started_at = datetime.now()
+        self.progress: str | None = None
+        self.message: discordpy.Message | discordpy.InteractionMessage | None = None
+        self.task: asyncio.Task = asyncio.get_running_loop().create_task(self._run(coro), name=f"job-{name}")
+
+    async def _run(self, coro: Coroutine) -> Any:
+        _current_job.set(self)
+        return await coro
+
+    @property
+    def id(self) -> int:
+        """Return the unique id of this job"""
+
+        return id(self)
+
+    def done(self) -> bool:
+        """Return whether the job has already finished"""
+
+        return self.task.done()
+
+    def elapsed(self) -> float:
+        """Return the number of seconds since the job was started"""
+
+        return (datetime.now() - self.started_at).total_seconds()
+
+    async def wait(self) -> Any:
+        """Wait for the job to finish and return its result, re-raising any exception"""
+
+        return await self.task
+
+    def __str__(self) -> str:
+        text = f"{self.name} by {self.user_id}, running for {int(self.elapsed())}s"
+        if self.progress is not None:
+            text += f": {self.progress}"
+        return text
+
+def start(name: str, user_id: int, coro: Coroutine) -> Job:
+    """Start the given coroutine as a tracked ``Job``"""
+
+    job = Job(name, user_id, coro)
+
+    _jobs[job.id] = job
+    job.task.add_done_callback(lambda _: _jobs.pop(job.id, None))
+
+    logger.debug(f"Started job {job.name} for user {job.user_id}")
+
+    return job
+
+def current() -> Job | None:
+    """Return the ``Job`` the caller is running in, or None if it isn't running in one"""
+
+    return _current_job.get()
+
+def running() -> list[Job]:
+    """Return all jobs which are currently running, oldest first"""
+
+    return sorted(_jobs.values(), key=lambda x: x.started_at)
+
+def cancel_all() -> None:
+    """Cancel all running jobs"""
+
+    for job in list(_jobs.values()):
+        logger.debug(f"Cancelling job {job.name}")
+        job.task.cancel()
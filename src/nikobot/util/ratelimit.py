@@ -0,0 +1,225 @@
+"""Module containing rate limiting primitives"""
+
+import asyncio
+import math
+import threading
+from time import monotonic
+
+from abllib.log import get_logger
+
+from . import error
+
+logger = get_logger("ratelimit")
+
+class TokenBucket():
+    """
+    A token bucket, which holds up to ``capacity`` tokens and refills ``rate`` tokens per second
+
+    A full bucket allows a burst of ``capacity`` requests, after which requests are limited to ``rate`` per second.
+    """
+
+    def __init__(self, capacity: float, rate: float) -> None:
+        if not isinstance(capacity, (int, float)): raise TypeError()
+        if not isinstance(rate, (int, float)): raise TypeError()
+        if capacity <= 0 or rate <= 0:
+            raise ValueError("capacity and rate need to be positive")
+
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._tokens = self.capacity
+        self._last_refill = monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        """Return the number of currently available tokens"""
+
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def time_until(self, tokens: float = 1.0) -> float:
+        """Return the number of seconds until the given amount of tokens is available"""
+
+        with self._lock:
+            self._refill()
+            return self._time_until(tokens)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take the given amount of tokens if they are available, returning whether it worked"""
+
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def consume(self, tokens: float = 1.0) -> None:
+        """Take the given amount of tokens, even if this puts the bucket into debt"""
+
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """Wait until the given amount of tokens is available and take them, returning the time waited"""
+
+        waited = 0.0
+        while not self.try_acquire(tokens):
+            wait = max(self.time_until(tokens), 0.001)
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def set_rate(self, rate: float) -> None:
+        """Change the refill rate, keeping the tokens refilled so far"""
+
+        if not isinstance(rate, (int, float)): raise TypeError()
+        if rate <= 0:
+            raise ValueError("rate needs to be positive")
+
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+    def is_full(self) -> bool:
+        """Return whether the bucket is completely refilled"""
+
+        return self.tokens >= self.capacity
+
+    def _time_until(self, tokens: float) -> float:
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+class AdaptiveLimiter():
+    """
+    A rate limiter for a single host, which slows down when the host pushes back
+
+    Every throttling response (e.g. 429, 503 or a Cloudflare challenge) halves the rate, down to ``min_rate``.
+    After ``INCREASE_AFTER`` successful requests in a row, the rate grows by ``increase`` again, up to ``max_rate``.
+    """
+
+    INCREASE_AFTER = 10
+
+    def __init__(self, name: str, rate: float, min_rate: float, max_rate: float, increase: float | None = None) -> None:
+        if not isinstance(name, str): raise TypeError()
+        if not min_rate <= rate <= max_rate:
+            raise ValueError("rate needs to be between min_rate and max_rate")
+
+        self.name = name
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase) if increase is not None else self.min_rate
+        self.throttled = 0
+        self._successes = 0
+        # no burst, requests are spread evenly
+        self._bucket = TokenBucket(1, rate)
+
+    @property
+    def rate(self) -> float:
+        """Return the current number of requests per second"""
+
+        return self._bucket.rate
+
+    async def acquire(self) -> float:
+        """Wait until the next request may be sent, returning the time waited"""
+
+        return await self._bucket.acquire()
+
+    def record_success(self) -> None:
+        """Record a successful request, which increases the rate after enough successes"""
+
+        self._successes += 1
+        if self._successes >= self.INCREASE_AFTER and self.rate < self.max_rate:
+            self._successes = 0
+            self._bucket.set_rate(min(self.rate + self.increase, self.max_rate))
+
+    def record_throttle(self) -> None:
+        """Record a throttling response, which halves the rate"""
+
+        self.throttled += 1
+        self._successes = 0
+        new_rate = max(self.rate / 2, self.min_rate)
+        if new_rate < self.rate:
+            logger.warning(f"{self.name} is throttling us, reducing the rate to {new_rate:.3f} requests per second")
+            self._bucket.set_rate(new_rate)
+
+class CircuitBreaker():
+    """
+    A circuit breaker, which stops sending requests to a backend that keeps failing
+
+    After ``failure_threshold`` failures in a row the breaker opens and every request fails fast.
+    Once ``reset_timeout`` seconds have passed, a single trial request is let through.
+    If it succeeds the breaker closes again, otherwise it stays open for another ``reset_timeout``.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 300.0) -> None:
+        if not isinstance(name, str): raise TypeError()
+        if not isinstance(failure_threshold, int): raise TypeError()
+        if not isinstance(reset_timeout, (int, float)): raise TypeError()
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = float(reset_timeout)
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        """Return 'closed', 'open' or 'half-open'"""
+
+        if self._opened_at is None:
+            return "closed"
+        if monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def check(self) -> None:
+        """Raise an ``error.CircuitOpen`` if the breaker doesn't let the request through"""
+
+        state = self.state
+        if state == "closed":
+            return
+
+        if state == "half-open":
+            # let a single trial request through, all others wait for its result
+            # if the trial never reports back, the next one is let through after another reset_timeout
+            self._opened_at = monotonic()
+            self._trial_running = True
+            return
+
+        self.rejected += 1
+        retry_after = self._opened_at + self.reset_timeout - monotonic()
+        err = error.CircuitOpen.with_values(self.name, math.ceil(retry_after))
+        err.retry_after = math.ceil(retry_after)
+        raise err
+
+    def record_success(self) -> None:
+        """Record a successful request, which closes the breaker"""
+
+        if self._opened_at is not None:
+            logger.info(f"{self.name} is available again, closing the circuit breaker")
+
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        """Record a failed request, which opens the breaker if the threshold is reached"""
+
+        self.failures += 1
+
+        if self._trial_running or (self._opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning(f"{self.name} failed {self.failures} times, opening the circuit breaker "
+                           f"for {self.reset_timeout} seconds")
+            self._opened_at = monotonic()
+            self._trial_running = False
@@ -0,0 +1,209 @@
+"""Module containing the ``SingleFlight`` class, which coalesces identical concurrent work"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import threading
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+from abllib.log import get_logger
+
+logger = get_logger("singleflight")
+
+# the result handed to the waiting callers if the caller running the flight was cancelled
+_OWNER_CANCELLED = object()
+
+class SingleFlight():
+    """
+    Coalesce concurrent calls with the same key into a single execution
+
+    All callers asking for a key which is already in flight wait for that execution and receive its result.
+    Successful results are shared for ``grace`` seconds afterwards, exceptions are never shared past the flight.
+    Shared results are the same object for every caller, so they must not be modified.
+    """
+
+    def __init__(self, name: str, grace: float = 0.0) -> None:
+        if not isinstance(name, str): raise TypeError()
+        if not isinstance(grace, (int, float)): raise TypeError()
+
+        self.name = name
+        self.grace = float(grace)
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._results: dict[Hashable, tuple[float, Any]] = {}
+        self._async_flights: dict[Hashable, asyncio.Future] = {}
+        self._sync_flights: dict[Hashable, _SyncFlight] = {}
+
+    async def run(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run the coroutine function ``func`` once for all concurrent callers with the same ``key``
+
+        If the caller running ``func`` is cancelled, one of the waiting callers takes over and runs it again.
+        """
+
+        while True:
+            with self._lock:
+                found, result = self._get_result(key)
+                if found:
+                    return result
+
+                if key in self._async_flights:
+                    self.coalesced += 1
+                    fut = self._async_flights[key]
+                else:
+                    fut = None
+                    self._async_flights[key] = asyncio.get_running_loop().create_future()
+
+            if fut is None:
+                return await self._run_flight(key, func, *args, **kwargs)
+
+            logger.debug(f"{self.name}: joining in-flight call for {key}")
+            # shield the shared future, so that a cancelled caller doesn't cancel the others
+            result = await asyncio.shield(fut)
+            if result is not _OWNER_CANCELLED:
+                return result
+
+            logger.debug(f"{self.name}: the in-flight call for {key} was cancelled, taking over")
+
+    async def _run_flight(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Run ``func`` as the owner of the flight with the given ``key`` and hand its result to all waiters"""
+
+        fut = self._async_flights[key]
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._async_flights[key]
+            if isinstance(e, asyncio.CancelledError):
+                # only the owner was cancelled, so the waiters are woken up to run func themselves
+                fut.set_result(_OWNER_CANCELLED)
+            else:
+                fut.set_exception(e)
+                # mark the exception as retrieved, so asyncio doesn't complain if no other caller waits
+                fut.exception()
+            raise
+
+        with self._lock:
+            del self._async_flights[key]
+            self._set_result(key, result)
+        fut.set_result(result)
+        return result
+
+    def run_sync(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Run the function ``func`` once for all concurrent threads with the same ``key``"""
+
+        with self._lock:
+            found, result = self._get_result(key)
+            if found:
+                return result
+
+            if key in self._sync_flights:
+                self.coalesced += 1
+                flight = self._sync_flights[key]
+                owner = False
+            else:
+                flight = _SyncFlight()
+                self._sync_flights[key] = flight
+                owner = True
+
+        if not owner:
+            logger.debug(f"{self.name}: joining in-flight call for {key}")
+            flight.done.wait()
+            if flight.exception is not None:
+                raise flight.exception
+            return flight.result
+
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as e:
+            flight.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._sync_flights[key]
+                if flight.exception is None:
+                    self._set_result(key, flight.result)
+            flight.done.set()
+
+        return flight.result
+
+    def forget(self, key: Hashable) -> None:
+        """Drop the shared result for the given key, forcing the next call to run again"""
+
+        with self._lock:
+            self._results.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all shared results"""
+
+        with self._lock:
+            self._results.clear()
+
+    def _get_result(self, key: Hashable) -> tuple[bool, Any]:
+        if key not in self._results:
+            return (False, None)
+
+        expires, result = self._results[key]
+        if expires < monotonic():
+            del self._results[key]
+            return (False, None)
+
+        self.coalesced += 1
+        return (True, result)
+
+    def _set_result(self, key: Hashable, result: Any) -> None:
+        if self.grace <= 0:
+            return
+
+        # remove expired results, so the dict doesn't grow forever
+        now = monotonic()
+        for expired_key in [k for k, v in self._results.items() if v[0] < now]:
+            del self._results[expired_key]
+
+        self._results[key] = (now + self.grace, result)
+
+class _SyncFlight():
+    """A single in-flight execution of ``SingleFlight.run_sync``"""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.exception: BaseException | None = None
+
+def coalesce(name: str, grace: float = 0.0, key: Callable[..., Hashable] | None = None):
+    """
+    Coalesce concurrent calls of the decorated function which share the same key
+
+    The key is calculated by calling ``key`` with the function arguments.
+    If ``key`` is None, all arguments are used as the key.
+    Works with both normal functions and coroutine functions.
+    """
+
+    flight = SingleFlight(name, grace)
+
+    def get_key(args: tuple, kwargs: dict) -> Hashable:
+        if key is not None:
+            return key(*args, **kwargs)
+        return (args, tuple(sorted(kwargs.items())))
+
+    def decorator(func: Callable) -> Callable:
+        """The decorator, which is called at program start"""
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await flight.run(get_key(args, kwargs), func, *args, **kwargs)
+
+            async_wrapper.singleflight = flight
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return flight.run_sync(get_key(args, kwargs), func, *args, **kwargs)
+
+        wrapper.singleflight = flight
+        return wrapper
+    return decorator
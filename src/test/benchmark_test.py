@@ -0,0 +1,200 @@
+"""
+    Ensure that the benchmark stand-in behaves like the real services and the mal module sheds load against it
+"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+import shutil
+
+import aiohttp
+from abllib import PersistentStorage, VolatileStorage, fs
+
+from benchmark import notifier_load
+from benchmark.standin import USER_AGENT, Standin, StandinConfig
+from nikobot.modules.mal import flare_solverr, mal_helper, natomanga_helper, registry, update_scanner
+from nikobot.modules.mal.flare_sessions import SessionPool
+from nikobot.modules.mal.mal_user import MALUser
+from nikobot.modules.mal.manga import Manga
+from nikobot.util import http
+from nikobot.util.ratelimit import AdaptiveLimiter
+
+def test_standin_responses():
+    """Ensure that the stand-in serves paged manga lists, challenges and FlareSolverr solutions"""
+
+    standin = Standin(StandinConfig(latency=0, browser_latency=0, challenge=True, manga_count=20, list_size=7))
+
+    async def run():
+        url = await standin.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{url}/v2/users/user0/mangalist", params={"limit": 5}) as r:
+                    first = await r.json()
+                async with session.get(first["paging"]["next"]) as r:
+                    second = await r.json()
+
+                async with session.get(f"{url}/manga/standin-manga-3") as r:
+                    challenged = (r.status, r.headers.get("cf-mitigated"))
+
+                async with session.post(f"{url}/v1", json={"cmd": "sessions.create", "session": "test"}) as r:
+                    assert (await r.json())["session"] == "test"
+                async with session.post(f"{url}/v1", json={"cmd": "request.get",
+                                                           "url": f"{url}/manga/standin-manga-3",
+                                                           "session": "test"}) as r:
+                    solution = (await r.json())["solution"]
+                async with session.post(f"{url}/v1", json={"cmd": "sessions.destroy", "session": "test"}) as r:
+                    assert r.status == 200
+                async with session.post(f"{url}/v1", json={"cmd": "sessions.list"}) as r:
+                    assert (await r.json())["sessions"] == []
+
+                headers = {"Cookie": f"cf_clearance={solution['cookies'][0]['value']}",
+                           "User-Agent": solution["userAgent"]}
+                async with session.get(f"{url}/manga/standin-manga-3", headers=headers) as r:
+                    direct = (r.status, await r.text())
+                async with session.get(f"{url}/manga/standin-manga-99", headers=headers) as r:
+                    missing = (r.status, await r.text())
+        finally:
+            await standin.stop()
+        return first, second, challenged, solution, direct, missing
+
+    first, second, challenged, solution, direct, missing = asyncio.run(run())
+
+    # the list is paged like MyAnimeList does it
+    assert [entry["node"]["id"] for entry in first["data"] + second["data"]] == standin.manga_ids("user0")
+    assert "offset=5" in first["paging"]["next"]
+    assert second["paging"] == {}
+
+    # natomanga only answers with a challenge until FlareSolverr solved it
+    assert challenged == (403, "challenge")
+    assert solution["status"] == 200
+    assert solution["userAgent"] == USER_AGENT
+    assert solution["cookies"][0]["name"] == "cf_clearance"
+    assert direct[0] == 200
+    assert f"chapter-{standin.chapter_count(3)}\"" in direct[1]
+    assert solution["response"] == direct[1]
+    assert missing[0] == 404
+    assert "cannot be found" in missing[1]
+
+    assert standin.requests["natomanga challenged"] == 1
+    assert standin.requests["natomanga"] == 2
+    assert standin.requests["flaresolverr request.get"] == 1
+
+def test_standin_releases():
+    """Ensure that released chapters show up on the manga pages and the latest updates listing"""
+
+    standin = Standin(StandinConfig(manga_count=20, seed=3))
+
+    before = {mal_id: standin.chapter_count(mal_id) for mal_id in range(1, 21)}
+    assert "standin-manga" not in standin.latest_page(1)
+
+    standin.release(5)
+
+    updated = [mal_id for mal_id in range(1, 21) if standin.chapter_count(mal_id) > before[mal_id]]
+    assert len(updated) > 0
+    for mal_id in updated:
+        assert f"standin-manga-{mal_id}/chapter-{standin.chapter_count(mal_id)}\"" in standin.latest_page(1)
+        assert f"chapter-{standin.chapter_count(mal_id)}\"" in standin.manga_page(f"standin-manga-{mal_id}")[1]
+    assert standin.manga_page("standin-manga-21")[0] == 404
+    assert "standin-manga" not in standin.latest_page(2)
+
+def test_concurrent_cold_fetches():
+    """Ensure that concurrent fetches without cached cookies share a single FlareSolverr solve"""
+
+    standin = Standin(StandinConfig(latency=0, browser_latency=0.1, challenge=True, manga_count=20))
+
+    async def run():
+        url = await standin.start()
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        sessions, flare_solverr.sessions = flare_solverr.sessions, SessionPool(size=2, prefix="test")
+        flare_solverr._limiters["127.0.0.1"] = AdaptiveLimiter("127.0.0.1", 100, 1, 100)
+        try:
+            results = await asyncio.gather(*(flare_solverr.fetch("test", f"{url}/manga/standin-manga-{mal_id}")
+                                             for mal_id in range(1, 6)))
+            return results, flare_solverr.stats()
+        finally:
+            await flare_solverr.close()
+            flare_solverr.sessions = sessions
+            # pylint: disable-next=no-member
+            flare_solverr.fetch.singleflight.clear()
+            del flare_solverr._limiters["127.0.0.1"]
+            del flare_solverr._breakers["127.0.0.1"]
+            del VolatileStorage["flaresolverr.test"]
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await standin.stop()
+
+    results, stats = asyncio.run(run())
+
+    for mal_id, html in enumerate(results, start=1):
+        assert f"standin-manga-{mal_id}/chapter-{standin.chapter_count(mal_id)}\"" in html
+    # the page loaded by the single solve is used, all others are fetched directly with its cookies
+    assert standin.requests["flaresolverr request.get"] == 1
+    assert standin.requests["natomanga"] == 4
+    assert standin.requests["natomanga challenged"] == 0
+
+    assert stats["flaresolverr sessions"]["requests"] == 1
+    assert stats["flaresolverr sessions"]["size"] == 2
+    assert stats["127.0.0.1 circuit breaker"]["state"] == "closed"
+    assert stats["127.0.0.1 limiter"]["throttled"] == 1
+
+def test_notifier_load_cycles():
+    """Ensure that later notifier cycles only scrape the manga with new chapters"""
+
+    standin = Standin(StandinConfig(latency=0, browser_latency=0, challenge=True, manga_count=30, list_size=8))
+    users = [MALUser(f"user{i}", i) for i in range(3)]
+    followed = {mal_id for user in users for mal_id in standin.manga_ids(user.username)}
+
+    async def run():
+        url = await standin.start()
+        base_urls = mal_helper.BASE_URL, natomanga_helper.BASE_URL
+        mal_helper.BASE_URL = f"{url}/v2"
+        natomanga_helper.BASE_URL = url
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        sessions, flare_solverr.sessions = flare_solverr.sessions, SessionPool(size=2, prefix="test")
+        flare_solverr._limiters["127.0.0.1"] = AdaptiveLimiter("127.0.0.1", 100, 1, 100)
+        registry.clear()
+        update_scanner.clear()
+        try:
+            first = await notifier_load.run_cycle(users, True)
+            scraped = standin.requests["natomanga"]
+
+            for func in (flare_solverr.fetch, Manga.fetch_chapters):
+                # pylint: disable-next=no-member
+                func.singleflight.clear()
+            standin.release(4)
+            second = await notifier_load.run_cycle(users, True)
+        finally:
+            await flare_solverr.close()
+            mal_helper.BASE_URL, natomanga_helper.BASE_URL = base_urls
+            flare_solverr.sessions = sessions
+            for func in (mal_helper.get_manga_list_from_username, flare_solverr.fetch, Manga.fetch_chapters):
+                # pylint: disable-next=no-member
+                func.singleflight.clear()
+            del flare_solverr._limiters["127.0.0.1"]
+            del flare_solverr._breakers["127.0.0.1"]
+            if "flaresolverr.natomanga" in VolatileStorage:
+                del VolatileStorage["flaresolverr.natomanga"]
+            del VolatileStorage["mal.flare_solverr_ip"]
+            for user in users:
+                if f"mal.user.{user.discord_id}" in PersistentStorage:
+                    del PersistentStorage[f"mal.user.{user.discord_id}"]
+            registry.prune([])
+            registry.clear()
+            update_scanner.clear()
+            shutil.rmtree(fs.absolute(VolatileStorage["storage_dir"], "mal"), ignore_errors=True)
+            await http.close()
+            await standin.stop()
+        return first, scraped, second
+
+    first, scraped, second = asyncio.run(run())
+
+    assert first == 0
+    assert second == 0
+    # every followed manga is scraped directly once, even if several users follow it
+    # the cookies were solved while scanning the latest updates
+    assert scraped == len(followed)
+    assert standin.requests["flaresolverr request.get"] == 1
+    # the second cycle only scrapes the followed manga which were listed as updated
+    updated = followed & set(standin._updated)
+    assert len(updated) > 0
+    assert standin.requests["natomanga"] - scraped == len(updated)
@@ -61,6 +61,8 @@ if "test" not in config_dict:
                      "You can find an example in config.template.json, located at the repository root.")
 
 # setup storage folders
+VolatileStorage["storage_dir"] = STORAGE_DIR
+
 VolatileStorage["cache_dir"] = os.path.join(STORAGE_DIR, "cache")
 os.makedirs(VolatileStorage["cache_dir"], exist_ok=True)
 
@@ -0,0 +1,13 @@
+"""Module containing tests for the ``DiscordBot`` configuration helpers"""
+
+from nikobot.discord_bot import get_intents
+
+def test_get_intents():
+    """Ensure that privileged intents are only requested by the modules needing them"""
+
+    intents = get_intents(["general", "help"])
+    assert intents.message_content
+    assert not intents.members
+    assert not intents.presences
+
+    assert get_intents(["general", "avatar"]).members
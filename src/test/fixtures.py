@@ -32,6 +32,7 @@ def setup_storages():
     keys_to_keep = [
         "storage_file",
         "config_file",
+        "storage_dir",
         "cache_dir",
         "temp_dir",
         "bot",
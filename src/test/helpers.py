@@ -1,4 +1,4 @@
-"""Module containing the CTXGrabber class"""
+"""Module containing the CTXGrabber class and other testing helpers"""
 
 import functools
 from time import sleep
@@ -6,6 +6,7 @@ from typing import Callable
 
 from abllib.log import get_logger
 from abllib.storage import VolatileStorage
+from aiohttp import web
 from discord.ext.commands import Context
 
 from nikobot.discord_bot import DiscordBot
@@ -90,3 +91,16 @@ class CTXGrabber():
 
             return callback(*args, **kwargs)
         return wrapper
+
+async def start_http_server(handler: Callable) -> tuple[web.AppRunner, str]:
+    """Start a local http server, which answers all requests using handler, and return its runner and base url"""
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    # pylint: disable-next=protected-access
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
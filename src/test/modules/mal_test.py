@@ -0,0 +1,778 @@
+"""Module containing tests for the discord.mal module"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+import math
+import os
+import shutil
+from time import time
+
+import pytest
+from abllib import PersistentStorage, VolatileStorage
+from aiohttp import web
+
+from nikobot.modules.mal import flare_solverr, mal_helper, natomanga_helper, polling, registry, resolution_cache
+from nikobot.modules.mal import update_scanner
+from nikobot.modules.mal.dclasses import FlareSolverrSolution, MangaDetails, MangaListEntry
+from nikobot.modules.mal.error import FlareSolverrResponseError
+from nikobot.modules.mal.flare_sessions import SessionPool
+from nikobot.modules.mal.mal_user import MALUser, saved_mal_ids
+from nikobot.modules.mal.manga import Manga, MangaProvider
+from nikobot.modules.mal.scheduler import CheckScheduler
+from nikobot.util import http
+from nikobot.util.ratelimit import AdaptiveLimiter
+
+from ..helpers import start_http_server
+
+def test_manga_details_from_json():
+    """Ensure that the MAL manga response is parsed correctly"""
+
+    details = MangaDetails.from_json({
+        "id": 2,
+        "title": "Berserk",
+        "main_picture": {"medium": "https://example.com/m.jpg", "large": "https://example.com/l.jpg"},
+        "alternative_titles": {"synonyms": ["Berserk: The Prototype"], "en": "Berserk", "ja": ""},
+        "media_type": "manga",
+        "status": "currently_publishing"
+    })
+
+    assert details.title_en == "Berserk"
+    assert details.synonyms == ("Berserk: The Prototype",)
+    assert details.status == "currently publishing"
+    assert details.picture == "https://example.com/l.jpg"
+    assert math.isnan(details.score)
+
+    manga = Manga.from_details(details)
+    assert manga.mal_id == 2
+    assert manga.synonyms == ["Berserk: The Prototype"]
+
+def test_manga_list_entry_from_json():
+    """Ensure that a single MAL manga list entry is parsed correctly"""
+
+    entry = MangaListEntry.from_json({"node": {"id": 13, "title": "One Piece"},
+                                      "list_status": {"status": "reading", "num_chapters_read": 1100}})
+
+    assert entry == MangaListEntry(13, 1100)
+
+    entry = MangaListEntry.from_json({"node": {"id": 13,
+                                               "title": "One Piece",
+                                               "main_picture": {"medium": "https://example.com/m.jpg",
+                                                                "large": "https://example.com/l.jpg"},
+                                               "alternative_titles": {"synonyms": [], "en": "One Piece", "ja": ""},
+                                               "mean": 9.22,
+                                               "media_type": "manga",
+                                               "status": "currently_publishing"},
+                                      "list_status": {"status": "reading", "num_chapters_read": 1100}})
+
+    assert entry.mal_id == 13
+    assert entry.details.title_en == "One Piece"
+    assert entry.details.status == "currently publishing"
+    assert entry.details.score == 9.22
+
+def test_flaresolverr_solution_from_json():
+    """Ensure that the FlareSolverr response is parsed correctly"""
+
+    solution = FlareSolverrSolution.from_json({
+        "status": "ok",
+        "message": "Challenge solved!",
+        "solution": {
+            "cookies": [{"name": "cf_clearance", "value": "abc", "expiry": 200},
+                        {"name": "other", "value": "def", "expiry": 100}],
+            "userAgent": "Mozilla/5.0",
+            "response": "<html></html>"
+        }
+    })
+
+    assert solution.challenged
+    assert solution.cookies == {"cf_clearance": "abc", "other": "def"}
+    assert solution.expires == 100
+    assert solution.response == "<html></html>"
+
+    solution = FlareSolverrSolution.from_json({
+        "status": "ok",
+        "message": "Challenge not detected!",
+        "solution": {"response": "<html></html>", "cookies": []}
+    })
+    assert not solution.challenged
+    assert solution.expires is None
+
+def _flaresolverr_handler(commands: list[dict], failing_urls: list[str]):
+    async def handler(request):
+        data = await request.json()
+        commands.append(data)
+        if data["cmd"] == "request.get" and data["url"] in failing_urls:
+            return web.json_response({"status": "error", "message": "Error: Timeout reached"})
+        return web.json_response({
+            "status": "ok",
+            "message": "Challenge not detected!",
+            "session": data.get("session"),
+            "solution": {"url": data.get("url"), "status": 200, "response": "<html></html>", "cookies": []}
+        })
+    return handler
+
+def test_flaresolverr_session_reuse():
+    """Ensure that FlareSolverr sessions are created once and reused for every request"""
+
+    commands = []
+
+    async def run():
+        runner, url = await start_http_server(_flaresolverr_handler(commands, []))
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        pool = SessionPool(size=2, prefix="test")
+        try:
+            await pool.warm()
+            for _ in range(3):
+                async with pool.session() as session:
+                    assert session.id in ("test-0", "test-1")
+            await pool.close()
+        finally:
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await runner.cleanup()
+        return pool
+
+    pool = asyncio.run(run())
+    assert [command["cmd"] for command in commands].count("sessions.create") == 2
+    assert [command["cmd"] for command in commands].count("sessions.destroy") == 2
+    assert pool.stats()["requests"] == 3
+    assert pool.idle == pool.busy == 0
+
+def test_flaresolverr_session_dispatch():
+    """Ensure that requests run in parallel up to the pool size and wait in the queue otherwise"""
+
+    commands = []
+    max_busy = 0
+
+    async def request(pool: SessionPool):
+        nonlocal max_busy
+        async with pool.session():
+            max_busy = max(max_busy, pool.busy)
+            await asyncio.sleep(0.05)
+
+    async def run():
+        runner, url = await start_http_server(_flaresolverr_handler(commands, []))
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        pool = SessionPool(size=2, prefix="test")
+        try:
+            await asyncio.gather(*[request(pool) for _ in range(6)])
+
+            async with pool.session(), pool.session():
+                with pytest.raises(asyncio.TimeoutError):
+                    async with pool.session(timeout=0.01):
+                        pass
+        finally:
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await runner.cleanup()
+        return pool
+
+    pool = asyncio.run(run())
+    assert max_busy == 2
+    assert pool.stats()["max_queued"] == 6
+    assert pool.stats()["queue_timeouts"] == 1
+    assert pool.stats()["created"] == 2
+
+def test_flaresolverr_session_resize(monkeypatch):
+    """Ensure that the configured parallelism is applied to the pool by the setup"""
+
+    commands = []
+    max_busy = 0
+
+    async def request(pool: SessionPool):
+        nonlocal max_busy
+        async with pool.session():
+            max_busy = max(max_busy, pool.busy)
+            await asyncio.sleep(0.05)
+
+    async def run():
+        runner, url = await start_http_server(_flaresolverr_handler(commands, []))
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        VolatileStorage["mal.flare_solverr_parallelism"] = 3
+        pool = SessionPool(size=1, prefix="test")
+        monkeypatch.setattr(flare_solverr, "sessions", pool)
+        try:
+            flare_solverr._setup()
+            await asyncio.gather(*[request(pool) for _ in range(6)])
+
+            # the sessions are already open
+            with pytest.raises(RuntimeError):
+                pool.resize(2)
+            await pool.close()
+        finally:
+            del VolatileStorage["mal.flare_solverr_parallelism"]
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await runner.cleanup()
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.size == 3
+    assert max_busy == 3
+    assert sorted(command["session"] for command in commands if command["cmd"] == "sessions.create") \
+           == ["test-0", "test-1", "test-2"]
+
+def test_flaresolverr_session_recycling():
+    """Ensure that a session is replaced after a failed request"""
+
+    commands = []
+
+    async def run():
+        runner, url = await start_http_server(_flaresolverr_handler(commands, ["http://127.0.0.1/broken"]))
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        sessions, flare_solverr.sessions = flare_solverr.sessions, SessionPool(size=1, prefix="test")
+        flare_solverr._limiters["127.0.0.1"] = AdaptiveLimiter("127.0.0.1", 100, 1, 100)
+        try:
+            await flare_solverr._request("http://127.0.0.1/manga")
+            with pytest.raises(FlareSolverrResponseError):
+                await flare_solverr._request("http://127.0.0.1/broken")
+            await flare_solverr._request("http://127.0.0.1/manga")
+        finally:
+            flare_solverr.sessions = sessions
+            del flare_solverr._limiters["127.0.0.1"]
+            del flare_solverr._breakers["127.0.0.1"]
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+    assert [(command["cmd"], command.get("session")) for command in commands] == [
+        ("sessions.create", "test-0"),
+        ("request.get", "test-0"),
+        ("request.get", "test-0"),
+        ("sessions.destroy", "test-0"),
+        ("sessions.create", "test-0"),
+        ("request.get", "test-0")
+    ]
+
+def test_flaresolverr_session_cancellation():
+    """Ensure that a cancelled request returns its session slot to the pool"""
+
+    commands = []
+    entered = asyncio.Event()
+
+    async def request(pool: SessionPool):
+        async with pool.session():
+            entered.set()
+            await asyncio.sleep(10)
+
+    async def run():
+        runner, url = await start_http_server(_flaresolverr_handler(commands, []))
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        pool = SessionPool(size=1, prefix="test")
+        try:
+            task = asyncio.create_task(request(pool))
+            await entered.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            assert pool.busy == pool.idle == 0
+            async with pool.session(timeout=1) as session:
+                assert session.id == "test-0"
+            await pool.close()
+        finally:
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+    assert [(command["cmd"], command.get("session")) for command in commands] == [
+        ("sessions.create", "test-0"),
+        ("sessions.destroy", "test-0"),
+        ("sessions.create", "test-0"),
+        ("sessions.destroy", "test-0")
+    ]
+
+def test_flaresolverr_cookie_replay():
+    """Ensure that cached cookies are replayed directly and FlareSolverr is only used for challenges"""
+
+    clearance = {"value": "first"}
+    browser_requests = []
+    direct_requests = []
+
+    async def handler(request):
+        if request.path == "/v1":
+            data = await request.json()
+            if data["cmd"] != "request.get":
+                return web.json_response({"status": "ok", "message": ""})
+            browser_requests.append(data["url"])
+            return web.json_response({
+                "status": "ok",
+                "message": "Challenge solved!",
+                "solution": {
+                    "url": data["url"],
+                    "status": 200,
+                    "response": f"<html>{data['url']}</html>",
+                    "cookies": [{"name": "cf_clearance", "value": clearance["value"], "expiry": 4102444800}],
+                    "userAgent": "Mozilla/5.0 Test"
+                }
+            })
+
+        direct_requests.append(request.path)
+        if request.cookies.get("cf_clearance") != clearance["value"] \
+           or request.headers["User-Agent"] != "Mozilla/5.0 Test":
+            return web.Response(status=403, text="<title>Just a moment...</title>", content_type="text/html")
+        return web.Response(text=f"<html>direct {request.path}</html>", content_type="text/html")
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        VolatileStorage["mal.flare_solverr_ip"] = url.removeprefix("http://")
+        sessions, flare_solverr.sessions = flare_solverr.sessions, SessionPool(size=1, prefix="test")
+        flare_solverr._limiters["127.0.0.1"] = AdaptiveLimiter("127.0.0.1", 100, 1, 100)
+        flare_solverr.REPLAY_MIN_AGE, min_age = 0, flare_solverr.REPLAY_MIN_AGE
+        try:
+            results = [await flare_solverr.fetch("test", f"{url}/manga/a"),
+                       await flare_solverr.fetch("test", f"{url}/manga/b")]
+            clearance["value"] = "second"
+            results.append(await flare_solverr.fetch("test", f"{url}/manga/c"))
+            results.append(await flare_solverr.fetch("test", f"{url}/manga/d"))
+        finally:
+            flare_solverr.REPLAY_MIN_AGE = min_age
+            flare_solverr.sessions = sessions
+            del flare_solverr._limiters["127.0.0.1"]
+            del flare_solverr._breakers["127.0.0.1"]
+            del VolatileStorage["flaresolverr.test"]
+            del VolatileStorage["mal.flare_solverr_ip"]
+            await http.close()
+            await runner.cleanup()
+        return url, results
+
+    url, results = asyncio.run(run())
+
+    # the cookies are solved for the first page and again after they were rejected for the third page
+    assert browser_requests == [f"{url}/manga/a", f"{url}/manga/c"]
+    # the pages loaded by FlareSolverr aren't fetched again
+    assert results == [f"<html>{url}/manga/a</html>", "<html>direct /manga/b</html>",
+                       f"<html>{url}/manga/c</html>", "<html>direct /manga/d</html>"]
+    assert direct_requests == ["/manga/b", "/manga/c", "/manga/d"]
+
+def test_check_scheduler():
+    """Ensure that the most overdue keys are checked first, with a bounded number of concurrent checks"""
+
+    checked = []
+    running = 0
+    max_running = 0
+
+    async def check(key):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        checked.append(key)
+        await asyncio.sleep(0.02)
+        running -= 1
+        # check 'a' again shortly, drop all others
+        return time() + 0.05 if key == "a" and checked.count("a") < 2 else None
+
+    async def run():
+        scheduler = CheckScheduler(check, workers=2)
+        now = time()
+        scheduler.schedule("c", now - 10)
+        scheduler.schedule("a", now - 30)
+        scheduler.schedule("b", now - 20)
+        scheduler.schedule("d", now - 5)
+        scheduler.schedule("later", now + 60)
+        scheduler.unschedule("d")
+        scheduler.start()
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert checked == ["a", "b", "c", "a"]
+    assert max_running == 2
+    assert scheduler.stats.checks == 4
+    assert scheduler.stats.lag_max >= 30
+    assert len(scheduler) == 1
+    assert scheduler.overdue() == 0
+
+def test_manga_registry(monkeypatch):
+    """Ensure that users following the same manga share a single ``Manga`` and only keep their reading progress"""
+
+    fetched = []
+
+    async def get_manga_from_id(mal_id):
+        fetched.append(mal_id)
+        await asyncio.sleep(0.01)
+        return MangaDetails.from_json({
+            "id": mal_id,
+            "title": f"Manga {mal_id}",
+            "main_picture": {"medium": "https://example.com/m.jpg", "large": "https://example.com/l.jpg"},
+            "alternative_titles": {"synonyms": [], "en": "", "ja": ""},
+            "media_type": "manga",
+            "status": "finished"
+        })
+
+    monkeypatch.setattr(mal_helper, "get_manga_from_id", get_manga_from_id)
+
+    registry.clear()
+    try:
+        user_a = MALUser.from_export(1, {"mal_username": "a", "manga": [
+            # the format of older versions, which saved the provider for every user
+            {"mal_id": 1, "provider": "NATOMANGA", "provider_url": "https://natomanga.com/manga/one",
+             "chapters_last_notified": 5},
+            {"mal_id": 2}
+        ]})
+        user_b = MALUser.from_export(2, {"mal_username": "b", "manga": [{"mal_id": 1}, {"mal_id": 3}]})
+
+        # restoring the users doesn't send any request
+        assert len(fetched) == 0
+        assert user_a.manga[1] is not user_b.manga[1]
+        assert user_a.manga[1].chapters_last_notified == 5
+        assert user_b.manga[1].chapters_last_notified == 0
+        assert user_a.export()["manga"] == [{"mal_id": 1, "chapters_last_notified": 5}, {"mal_id": 2}]
+
+        async def fetch_all():
+            return await asyncio.gather(*[registry.fetch(mal_id) for mal_id in (1, 2, 1, 3)])
+
+        manga = asyncio.run(fetch_all())
+        assert sorted(fetched) == [1, 2, 3]
+        assert manga[0] is manga[2]
+        assert registry.count() == 3
+        assert registry.get(1)._manga_provider_url == "https://natomanga.com/manga/one"
+
+        assert registry.prune([1, 3]) == 1
+        assert registry.get(2) is None
+
+        # a restart restores the saved manga without any request
+        registry.clear()
+        assert registry.hydrated() == 0
+        assert registry.count() == 2
+        assert registry.get(1).title == "Manga 1"
+        assert registry.get(1)._manga_provider_url == "https://natomanga.com/manga/one"
+        assert sorted(fetched) == [1, 2, 3]
+
+        # only the most recently used manga are kept in memory
+        monkeypatch.setattr(registry, "MAX_HYDRATED", 1)
+        assert asyncio.run(registry.fetch(3)).mal_id == 3
+        assert registry.hydrated() == 1
+        assert registry.get(1) is not None
+        assert registry.hydrated() == 1
+        assert sorted(fetched) == [1, 2, 3]
+
+        # an evicted manga which is still in use is handed out again instead of a second copy
+        in_use = registry.get(1)
+        in_use._chapters_total = 12
+        assert registry.get(3) is not None
+        assert registry.hydrated() == 1
+        assert registry.get(1) is in_use
+        assert registry.get(1)._chapters_total == 12
+
+        # the manga aren't kept in the PersistentStorage, which lives in memory
+        assert not PersistentStorage.contains("mal.manga")
+        assert sorted(os.listdir(os.path.join(VolatileStorage["storage_dir"], "mal", "manga"))) \
+               == ["1.json", "3.json"]
+    finally:
+        registry.clear()
+        shutil.rmtree(os.path.join(VolatileStorage["storage_dir"], "mal", "manga"), ignore_errors=True)
+
+def test_manga_registry_migration():
+    """Ensure that manga saved to the PersistentStorage by older versions are moved to their own files"""
+
+    PersistentStorage["mal.manga.7"] = {"mal_id": 7, "provider": "NATOMANGA",
+                                        "provider_url": "https://natomanga.com/manga/seven"}
+
+    registry.clear()
+    try:
+        # the manga are only moved once the saved manga are loaded
+        assert PersistentStorage.contains("mal.manga")
+        asyncio.run(registry.load())
+        assert registry.count() == 1
+        assert registry.provider_urls(MangaProvider.NATOMANGA) == ["https://natomanga.com/manga/seven"]
+        assert not PersistentStorage.contains("mal.manga")
+
+        # the export doesn't contain the details, so it can't be restored without a request
+        registry.clear()
+        assert registry.get(7) is None
+        assert registry.count() == 1
+    finally:
+        registry.clear()
+        if PersistentStorage.contains("mal.manga"):
+            del PersistentStorage["mal.manga"]
+        shutil.rmtree(os.path.join(VolatileStorage["storage_dir"], "mal", "manga"), ignore_errors=True)
+
+def test_saved_mal_ids():
+    """Ensure that the manga of saved users are kept, even if the users couldn't be imported"""
+
+    PersistentStorage["mal.user.901"] = {"mal_username": "a", "manga": [{"mal_id": 4}, {"mal_id": 6}]}
+    # an export which fails to import
+    PersistentStorage["mal.user.902"] = {"mal_username": 902, "manga": [{"mal_id": 8}, {}]}
+
+    registry.clear()
+    try:
+        for mal_id in (4, 6, 8, 9):
+            registry.save(Manga(mal_id, f"Manga {mal_id}", f"Manga {mal_id}", [],
+                                "finished", "https://example.com/l.jpg", 1.0))
+
+        assert {4, 6, 8} <= saved_mal_ids()
+        assert registry.prune(saved_mal_ids()) == 1
+        assert registry.count() == 3
+        assert registry.get(9) is None
+    finally:
+        del PersistentStorage["mal.user.901"]
+        del PersistentStorage["mal.user.902"]
+        registry.clear()
+        shutil.rmtree(os.path.join(VolatileStorage["storage_dir"], "mal", "manga"), ignore_errors=True)
+
+def test_manga_details_refresh(monkeypatch):
+    """Ensure that the details of the manga list keep an already registered manga up to date"""
+
+    status = {"value": "currently_publishing"}
+
+    # pylint: disable-next=unused-argument
+    async def iter_manga_list(username):
+        yield MangaListEntry.from_json({
+            "node": {
+                "id": 5,
+                "title": "Manga 5",
+                "main_picture": {"medium": "https://example.com/m.jpg", "large": "https://example.com/l.jpg"},
+                "alternative_titles": {"synonyms": [], "en": "", "ja": ""},
+                "media_type": "manga",
+                "status": status["value"]
+            },
+            "list_status": {"num_chapters_read": 3}
+        })
+
+    monkeypatch.setattr(mal_helper, "iter_manga_list", iter_manga_list)
+
+    registry.clear()
+    try:
+        user = MALUser("a", 1)
+        asyncio.run(user.fetch_manga_list())
+        manga = registry.get(5)
+        assert manga.status == "currently publishing"
+        publishing_check = manga.next_check()
+
+        status["value"] = "finished"
+        asyncio.run(user.fetch_manga_list())
+        assert registry.get(5) is manga
+        assert manga.status == "finished"
+        assert manga.next_check() > publishing_check
+        assert user.manga[5].chapters_read == 3
+
+        # the new status is saved, so it survives a restart
+        registry.clear()
+        assert registry.get(5).status == "finished"
+    finally:
+        registry.clear()
+        shutil.rmtree(os.path.join(VolatileStorage["storage_dir"], "mal", "manga"), ignore_errors=True)
+
+def test_manga_list_paging(monkeypatch):
+    """Ensure that the manga list follows the paging of MyAnimeList and streams every entry"""
+
+    requested_offsets = []
+
+    async def handler(request: web.Request) -> web.Response:
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query["limit"])
+        requested_offsets.append(offset)
+
+        data = [{"node": {"id": mal_id,
+                          "title": f"Manga {mal_id}",
+                          "media_type": "light_novel" if mal_id == 3 else "manga",
+                          "status": "finished"},
+                 "list_status": {"status": "reading", "num_chapters_read": mal_id}}
+                for mal_id in range(offset + 1, min(offset + limit, 5) + 1)]
+        paging = {"next": str(request.url.update_query(offset=offset + limit))} if offset + limit < 5 else {}
+        return web.json_response({"data": data, "paging": paging})
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        monkeypatch.setattr(mal_helper, "BASE_URL", url)
+        try:
+            return [entry async for entry in mal_helper.iter_manga_list("user", page_size=2)]
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    entries = asyncio.run(run())
+    assert requested_offsets == [0, 2, 4]
+    assert [entry.mal_id for entry in entries] == [1, 2, 4, 5]
+    assert [entry.read_chapters for entry in entries] == [1, 2, 4, 5]
+
+def test_update_scanner(monkeypatch):
+    """Ensure that only manga listed with a newer chapter in the latest updates need to be scraped again"""
+
+    listing = []
+    requested_pages = []
+
+    async def fetch(_key, url):
+        page = int(url.rsplit("=", maxsplit=1)[1])
+        requested_pages.append(page)
+        items = "".join(f'<div><a href="https://www.natomanga.com/manga/{slug}">{slug}</a>'
+                        f'<a href="https://www.natomanga.com/manga/{slug}/chapter-{chapter}">Chapter</a></div>'
+                        for slug, chapter in listing[(page - 1) * 2:page * 2])
+        return f"<html><body>{items}</body></html>"
+
+    monkeypatch.setattr(flare_solverr, "fetch", fetch)
+    tracked = ["https://natomanga.com/manga/a", "https://natomanga.com/manga/b", "https://natomanga.com/manga/c"]
+
+    update_scanner.clear()
+    try:
+        # nothing is known before the first scan
+        assert update_scanner.needs_fetch(tracked[0], 10, time())
+
+        listing[:] = [("x", "5"), ("a", "10"), ("y", "3")]
+        assert asyncio.run(update_scanner.scan(tracked)) == 1
+        assert requested_pages == [1]
+        fetched = time()
+
+        # a, b and c were scraped after the first scan, then b and c received new chapters
+        listing[:] = [("b", "21"), ("c", "7-5"), ("z", "1")] + listing
+        requested_pages.clear()
+        assert asyncio.run(update_scanner.scan(tracked)) == 2
+        assert requested_pages == [1, 2]
+
+        assert not update_scanner.needs_fetch(tracked[0], 10, fetched)
+        assert update_scanner.needs_fetch(tracked[1], 20, fetched)
+        assert update_scanner.needs_fetch(tracked[2], 7, fetched)
+        assert not update_scanner.needs_fetch(tracked[1], 21, fetched)
+        # manga scraped before the first scan could have missed an update
+        assert update_scanner.needs_fetch(tracked[0], 10, fetched - 3600)
+    finally:
+        update_scanner.clear()
+
+def test_polling():
+    """Ensure that manga are checked often around their expected release and rarely otherwise"""
+
+    day = 24 * 60 * 60
+    releases = []
+    for released in range(20):
+        polling.record_release(releases, released * 7 * day)
+    assert len(releases) == polling.RELEASE_HISTORY
+    assert releases[-1] == 19 * 7 * day
+    assert polling.cadence(releases) == 7 * day
+    assert polling.cadence(releases[-1:]) is None
+
+    # a weekly series released a chapter a day ago, so it sleeps for a day
+    now = releases[-1] + day
+    assert polling.next_check("currently publishing", releases, now) == now + polling.MAX_INTERVAL
+    # until the release window starts
+    now = releases[-1] + 5 * day
+    assert polling.next_check("currently publishing", releases, now) == releases[-1] + 7 * day - 7 * day / 4
+    # within the release window, it is checked as often as possible
+    now = releases[-1] + 7 * day
+    assert polling.next_check("currently publishing", releases, now) == now + polling.MIN_INTERVAL
+    # an overdue release is checked less and less often
+    now = releases[-1] + 14 * day
+    assert polling.next_check("currently publishing", releases, now) == now + polling.MAX_INTERVAL
+
+    # without a history, the manga is checked as often as possible
+    assert polling.next_check("currently publishing", [], 0) == polling.MIN_INTERVAL
+    assert polling.next_check("finished", releases, 0) == polling.FINISHED_INTERVAL
+    assert polling.next_check("on_hiatus", releases, 0) == polling.INACTIVE_INTERVAL
+
+    manga = Manga(2, "Berserk", "Berserk", [], "on_hiatus", "https://example.com/berserk.jpg", 9.47)
+    manga._release_times = releases[-2:]
+    restored = Manga.restore(manga.export())
+    assert restored._release_times == releases[-2:]
+    assert restored.next_check() > time() + polling.MIN_INTERVAL
+
+def test_resolution_cache(monkeypatch):
+    """Ensure that every manga is only searched on natomanga once, even if it couldn't be found"""
+
+    searched = []
+    found = {}
+
+    async def get_manga_url(titles):
+        searched.append(titles)
+        await asyncio.sleep(0.01)
+        return found.get(titles[0])
+
+    monkeypatch.setattr(natomanga_helper, "get_manga_url", get_manga_url)
+
+    try:
+        async def resolve_all():
+            return await asyncio.gather(*[resolution_cache.resolve(1, ["Berserk", "berserk"]) for _ in range(3)])
+
+        assert asyncio.run(resolve_all()) == [None, None, None]
+        assert len(searched) == 1
+        # the manga wasn't found, which is remembered
+        found["Berserk"] = "https://natomanga.com/manga/berserk"
+        assert asyncio.run(resolution_cache.resolve(1, ["berserk", "Berserk"])) is None
+        assert len(searched) == 1
+
+        # until the negative entry expires
+        monkeypatch.setattr(resolution_cache, "NEGATIVE_TTL", 0)
+        assert asyncio.run(resolution_cache.resolve(1, ["Berserk"])) == "https://natomanga.com/manga/berserk"
+        assert asyncio.run(resolution_cache.resolve(1, ["Berserk"])) == "https://natomanga.com/manga/berserk"
+        assert len(searched) == 2
+
+        # changed titles and deleted urls are searched again
+        deluxe_url = "https://natomanga.com/manga/berserk-deluxe"
+        found["Berserk Deluxe"] = deluxe_url
+        assert asyncio.run(resolution_cache.resolve(1, ["Berserk Deluxe"])) == deluxe_url
+        resolution_cache.forget(1)
+        assert asyncio.run(resolution_cache.resolve(1, ["Berserk Deluxe"])) == deluxe_url
+        assert len(searched) == 4
+    finally:
+        if PersistentStorage.contains("mal.resolved"):
+            del PersistentStorage["mal.resolved"]
+
+def test_natomanga_manga_url(monkeypatch):
+    """Ensure that all titles are probed at the same time and the found pages aren't scraped again"""
+
+    requested = []
+    running = [0, 0]
+    pages = {
+        "berserk": 3,
+        "berserk-deluxe": 5,
+        "kenpuu-denki-berserk": 5
+    }
+
+    async def fetch(_key, url):
+        requested.append(url)
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+        slug = url.rsplit("/", maxsplit=1)[1]
+        if slug not in pages:
+            return "<html><body>The manga cannot be found</body></html>"
+        chapters = "".join(f'<a href="{url}/chapter-{i}">Chapter {i}</a>' for i in range(1, pages[slug] + 1))
+        return f'<html><body><div class="chapter-list">{chapters}</div></body></html>'
+
+    monkeypatch.setattr(flare_solverr, "fetch", fetch)
+    monkeypatch.setattr(natomanga_helper, "PROBE_CONCURRENCY", 3)
+
+    titles = ["Berserk", "Berserk (Deluxe)", "Kenpuu Denki Berserk", "Berserk!", "Berserk: Prototype"]
+    url = asyncio.run(natomanga_helper.get_manga_url(titles))
+
+    # the first of the titles with the most chapters is picked
+    assert url == f"{natomanga_helper.BASE_URL}/manga/berserk-deluxe"
+    # duplicate titles are only probed once, and at most PROBE_CONCURRENCY at the same time
+    assert len(requested) == 4
+    assert running[1] == 3
+    assert asyncio.run(natomanga_helper.get_manga_url(["Vagabond"])) is None
+
+def test_forced_chapter_fetch(monkeypatch):
+    """Ensure that a forced chapter fetch always scrapes, even right after a fetch skipped by the update scanner"""
+
+    scraped = []
+
+    async def get_chapters(url):
+        scraped.append(url)
+        return [natomanga_helper.create_chapter("Chapter 5", f"{url}/chapter-5")]
+
+    monkeypatch.setattr(natomanga_helper, "get_chapters", get_chapters)
+    # the latest scan didn't list the manga, so its chapters are known to be unchanged
+    monkeypatch.setattr(update_scanner, "_scanned", time())
+    monkeypatch.setattr(update_scanner, "_covered_since", time() - 60)
+
+    manga = Manga(3, "Vagabond", "Vagabond", [], "on_hiatus", "https://example.com/vagabond.jpg", 9.1)
+    manga.set_manga_provider(MangaProvider.NATOMANGA, "https://natomanga.com/manga/vagabond")
+    manga._chapters_total = 5
+    manga._time_fetched = time()
+
+    # pylint: disable-next=no-member
+    Manga.fetch_chapters.singleflight.clear()
+    try:
+        assert asyncio.run(manga.fetch_chapters())
+        assert len(scraped) == 0
+        assert asyncio.run(manga.fetch_chapters(force=True))
+        assert scraped == ["https://natomanga.com/manga/vagabond"]
+        assert len(manga.chapters) == 1
+    finally:
+        # pylint: disable-next=no-member
+        Manga.fetch_chapters.singleflight.clear()
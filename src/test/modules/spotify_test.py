@@ -2,9 +2,16 @@
 
 # pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned, unused-argument
 
+import asyncio
+from time import monotonic
+
 from abllib.log import get_logger
+from multidict import CIMultiDict, CIMultiDictProxy
 
-from nikobot.modules.spotify import update_helper
+from nikobot.modules.spotify import scheduler, update_helper
+from nikobot.modules.spotify.dclasses import Playlist, PlaylistUpdate
+from nikobot.util import http
+from nikobot.util.singleflight import coalesce
 
 logger = get_logger("test")
 
@@ -141,3 +148,87 @@ def test_calculate_diff_both():
     remove, add = update_helper.calculate_diff(curr, new)
     assert add == ["AAJ", "AAK"]
     assert remove == ["AAC", "AAI"]
+
+def test_scheduler_global_backoff():
+    """Ensure that a 429 response pauses all requests, not only the rate-limited one"""
+
+    sched = scheduler.RequestScheduler()
+    sent_at = []
+
+    async def send_rate_limited():
+        sent_at.append(monotonic())
+        if len(sent_at) == 1:
+            headers = CIMultiDictProxy(CIMultiDict({"Retry-After": "0.3"}))
+            return http.Response(429, headers, b"", "")
+        return http.Response(200, CIMultiDictProxy(CIMultiDict()), b"", "")
+
+    async def send_ok():
+        # start after the first request was rate-limited
+        await asyncio.sleep(0.05)
+        sent_at.append(monotonic())
+        return http.Response(200, CIMultiDictProxy(CIMultiDict()), b"", "")
+
+    async def run():
+        start = monotonic()
+        results = await asyncio.gather(sched.run(send_rate_limited), sched.run(send_ok))
+        return start, results
+
+    scheduler.JITTER, jitter = 0.0, scheduler.JITTER
+    try:
+        start, results = asyncio.run(run())
+    finally:
+        scheduler.JITTER = jitter
+
+    assert [res.status for res in results] == [200, 200]
+    # the second request was queued until the backoff ended
+    assert all(timestamp - start >= 0.3 for timestamp in sent_at[1:])
+    assert sched.stats()["rate_limited"] == 1
+    assert sched.stats()["requests"] == 3
+    assert sched.stats()["queued"] == 0
+    assert sched.stats()["throttled_seconds"] >= 0.5
+
+def test_scheduler_token_bucket():
+    """Ensure that the scheduler paces requests according to its window"""
+
+    sched = scheduler.RequestScheduler(window_requests=20, window_seconds=1, burst=2)
+
+    async def send():
+        return http.Response(200, CIMultiDictProxy(CIMultiDict()), b"", "")
+
+    async def run():
+        start = monotonic()
+        await asyncio.gather(*[sched.run(send) for _ in range(4)])
+        return monotonic() - start
+
+    # 2 requests are sent in the burst, the remaining 2 need 0.05s each
+    assert asyncio.run(run()) >= 0.09
+    assert sched.stats()["max_queued"] >= 2
+
+def test_update_notification(monkeypatch):
+    """Ensure that concurrent updates share a single run, but every caller decides on its own whether to notify"""
+
+    updates = []
+    messages = []
+
+    @coalesce("test.spotify.update")
+    async def update(user_id):
+        updates.append(user_id)
+        await asyncio.sleep(0.05)
+        all_playlist = Playlist("All", "all", 3, f"snapshot-{len(updates)}")
+        return PlaylistUpdate(all_playlist, [Playlist("Changed", "changed", 1, "x")], 0, 1)
+
+    async def private_message(user_id, embed):
+        messages.append((user_id, embed.description))
+
+    monkeypatch.setattr(update_helper, "_update", update)
+    monkeypatch.setattr(update_helper.discord, "private_message", private_message)
+
+    async def run():
+        # a silent background update is joined by a command which wants to be notified
+        await asyncio.gather(update_helper.run(1, False), update_helper.run(1, True), update_helper.run(1, True))
+        await update_helper.run(1, False)
+
+    asyncio.run(run())
+    assert updates == [1, 1]
+    assert len(messages) == 1
+    assert messages[0][0] == 1
@@ -0,0 +1,80 @@
+"""Module containing tests for the request accounting"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from nikobot.util import accounting, http
+
+from ..helpers import start_http_server
+
+@pytest.fixture(autouse=True)
+def reset_accounting():
+    """Reset the counted requests between tests"""
+
+    accounting.clear()
+    yield None
+    accounting.clear()
+
+def test_usage_sorted(monkeypatch):
+    """Ensure that the usage is reported per tag and host, starting with the top consumer"""
+
+    monkeypatch.setattr(accounting, "monotonic", lambda: 1000.0)
+    accounting.clear()
+    monkeypatch.setattr(accounting, "monotonic", lambda: 1000.0 + 30 * 60)
+
+    accounting.record("mal.manga", "api.myanimelist.net", 100)
+    for _ in range(3):
+        accounting.record("mal.scrape", "natomanga.com", 1000)
+
+    usage = accounting.usage(60 * 60)
+    assert [(item.tag, item.requests, item.bytes_received) for item in usage] == [
+        ("mal.scrape", 3, 3000),
+        ("mal.manga", 1, 100)
+    ]
+    # only 30 minutes passed since startup, so the requests are projected from those
+    assert usage[0].projected_daily == 3 * 48
+
+def test_rolling_window(monkeypatch):
+    """Ensure that requests leave the window once they are too old"""
+
+    now = 0.0
+    monkeypatch.setattr(accounting, "monotonic", lambda: now)
+
+    accounting.record("spotify.playlists", "api.spotify.com", 10)
+    now = 2 * 60 * 60
+    accounting.record("spotify.playlists", "api.spotify.com", 20)
+
+    assert accounting.usage(60 * 60)[0].requests == 1
+    assert accounting.usage(3 * 60 * 60)[0].requests == 2
+
+    now = 2 * 60 * 60 + accounting.MAX_WINDOW
+    accounting.record("spotify.playlists", "api.spotify.com", 30)
+    assert len(accounting._counters[("spotify.playlists", "api.spotify.com")]._buckets) == 1
+
+    with pytest.raises(ValueError):
+        accounting.usage(accounting.MAX_WINDOW + 1)
+
+def test_http_tag():
+    """Ensure that requests sent with util.http are counted under their tag"""
+
+    async def handler(_request):
+        return web.Response(text="ok")
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        try:
+            await http.get(url, tag="test.first")
+            await http.get(url)
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+    assert sorted((item.tag, item.host, item.requests) for item in accounting.usage()) == [
+        ("other", "127.0.0.1", 1),
+        ("test.first", "127.0.0.1", 1)
+    ]
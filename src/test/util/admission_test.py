@@ -0,0 +1,112 @@
+"""Module containing tests for the token bucket and the admission control"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+
+import pytest
+
+from nikobot.util import admission, error, ratelimit
+
+@pytest.fixture(autouse=True)
+def reset_admission():
+    """Reset the admission buckets between tests"""
+
+    admission._buckets.clear()
+    admission._waiting.clear()
+    admission._stats.clear()
+    yield None
+    admission._buckets.clear()
+    admission._waiting.clear()
+    admission._stats.clear()
+
+def test_tokenbucket_burst():
+    """Ensure that a full bucket allows a burst of requests"""
+
+    bucket = ratelimit.TokenBucket(3, 1)
+
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert 0.9 < bucket.time_until() <= 1.0
+
+def test_tokenbucket_refill():
+    """Ensure that the bucket refills over time"""
+
+    bucket = ratelimit.TokenBucket(1, 20)
+
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+    waited = asyncio.run(bucket.acquire())
+    assert waited > 0
+    assert not bucket.is_full()
+
+def test_admission_rejects_over_budget():
+    """Ensure that the admission control rejects users exceeding their budget"""
+
+    cost = admission.Cost(backends=("mal",))
+
+    async def run():
+        for _ in range(int(admission.USER_BUDGET.burst)):
+            await admission.admit("mal.update", 1234, None, cost)
+
+        with pytest.raises(error.AdmissionRejected) as exc_info:
+            await admission.admit("mal.update", 1234, None, cost)
+        assert exc_info.value.retry_after > admission.MAX_QUEUE_TIME
+
+        # other users are not affected
+        await admission.admit("mal.update", 5678, None, cost)
+
+    asyncio.run(run())
+
+    stats = admission.stats()
+    assert stats["mal.update"]["admitted"] == admission.USER_BUDGET.burst + 1
+    assert stats["mal.update"]["rejected"] == 1
+
+def test_admission_backend_budget():
+    """Ensure that the backend budget is shared between all users"""
+
+    backend_budget = admission.BACKEND_BUDGETS["natomanga"]
+    cost = admission.Cost(backends=("natomanga",))
+
+    async def run():
+        for user_id in range(int(backend_budget.burst)):
+            await admission.admit("mal.manga", user_id, None, cost)
+
+        # a request costing more than one refill interval can't be queued
+        with pytest.raises(error.AdmissionRejected):
+            await admission.admit("mal.manga", 9999, None, admission.Cost(backends=("natomanga",), tokens=2))
+
+    asyncio.run(run())
+
+def test_admission_sweep(monkeypatch):
+    """Ensure that full buckets are dropped, unless an execution is still queued for them"""
+
+    monkeypatch.setattr(admission, "SWEEP_INTERVAL", 0)
+    monkeypatch.setattr(admission, "USER_BUDGET", admission.Budget(burst=1, per_minute=6000))
+    monkeypatch.setattr(admission, "GUILD_BUDGET", admission.Budget(burst=1, per_minute=300))
+    cost = admission.Cost()
+
+    async def run():
+        await admission.admit("mal.update", 1, 9, cost)
+        # the bucket of the user refills within 10ms, the one of the guild takes 200ms
+        await asyncio.sleep(0.05)
+
+        queued = asyncio.create_task(admission.admit("mal.update", 2, 9, cost))
+        await asyncio.sleep(0.05)
+        await admission.admit("mal.update", 3, None, cost)
+
+        assert "user.1" not in admission._buckets
+        assert "guild.9" in admission._buckets
+        # the bucket of the user is full, but the execution still waits for the guild
+        assert "user.2" in admission._buckets
+
+        await queued
+        await asyncio.sleep(0.05)
+        await admission.admit("mal.update", 3, None, cost)
+        assert "user.2" not in admission._buckets
+        assert admission._waiting["user.2"] <= 0
+
+    asyncio.run(run())
@@ -1,7 +1,8 @@
 """Module containing tests for the discord helper functions"""
 
-# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned, unused-argument
+# pylint: disable=protected-access, missing-class-docstring, missing-function-docstring, pointless-statement, expression-not-assigned, unused-argument
 
+import asyncio
 import inspect
 
 from abllib.log import get_logger
@@ -10,7 +11,7 @@ import pytest
 import discord as discordpy
 from discord.ext import commands
 
-from nikobot.util import discord, general
+from nikobot.util import discord, error, general, jobs
 from nikobot.discord_bot import DiscordBot
 from ..helpers import CTXGrabber
 
@@ -193,3 +194,141 @@ def test_username(bot: DiscordBot, testing_bot: DiscordBot, ctx_grabber: CTXGrab
 
     assert isinstance(discord.username(ctx), str)
     assert discord.username(ctx) == "AbleytnersTestBot"
+
+class FakeMessage():
+    def __init__(self) -> None:
+        self.edits = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+        return self
+
+class FakeResponse():
+    def __init__(self) -> None:
+        self.sent = []
+        self.deferred = False
+
+    def is_done(self) -> bool:
+        return self.deferred or len(self.sent) > 0
+
+    async def defer(self, thinking: bool = False):
+        assert thinking
+        assert not self.is_done()
+        self.deferred = True
+
+    async def send_message(self, *args, **kwargs):
+        assert not self.is_done()
+        self.sent.append((args, kwargs))
+
+class FakeInteraction(discordpy.Interaction):
+    """An interaction which records its responses instead of sending them to discord"""
+
+    # pylint: disable-next=super-init-not-called
+    def __init__(self, interaction_id: int) -> None:
+        self.id = interaction_id
+        self.fake_response = FakeResponse()
+        self.message_sent = FakeMessage()
+        self.original_edits = []
+
+    @property
+    # pylint: disable-next=invalid-overridden-method
+    def response(self):
+        return self.fake_response
+
+    async def original_response(self):
+        assert self.fake_response.is_done()
+        return self.message_sent
+
+    async def edit_original_response(self, **kwargs):
+        assert self.fake_response.deferred
+        self.original_edits.append(kwargs)
+        return self.message_sent
+
+def _run_with_defer(ctx: FakeInteraction, body, defer_after: float):
+    """Run the body as a job the same way ``discord.grouped_hybrid_command`` does"""
+
+    async def run():
+        job = jobs.start("test.command", 1234, body())
+        try:
+            await discord._defer_if_slow(ctx, job, defer_after)
+            return await job.wait()
+        finally:
+            discord._deferred.discard(ctx.id)
+            discord._response_locks.pop(ctx.id, None)
+
+    return asyncio.run(run())
+
+def test_defer_slow_command():
+    """Ensure that slow slash commands are deferred and their reply replaces the 'thinking...' message"""
+
+    ctx = FakeInteraction(1)
+
+    async def body():
+        await asyncio.sleep(0.1)
+        assert ctx.id in discord._deferred
+        await discord.reply(ctx, "the reply", file="the file")
+        assert ctx.id not in discord._deferred
+        return jobs.current().message
+
+    message = _run_with_defer(ctx, body, 0.02)
+
+    assert ctx.fake_response.deferred
+    assert len(ctx.fake_response.sent) == 0
+    assert ctx.original_edits == [{"content": "the reply", "attachments": ["the file"]}]
+    assert message is ctx.message_sent
+    assert ctx.id not in discord._deferred
+    assert ctx.id not in discord._response_locks
+
+def test_defer_fast_command():
+    """Ensure that slash commands replying in time aren't deferred"""
+
+    ctx = FakeInteraction(2)
+
+    async def body():
+        await discord.reply(ctx, "the reply")
+
+    _run_with_defer(ctx, body, 0.1)
+
+    assert not ctx.fake_response.deferred
+    assert ctx.fake_response.sent == [(("the reply",), {})]
+    assert len(ctx.original_edits) == 0
+
+def test_defer_already_responded():
+    """Ensure that slow slash commands which already replied aren't deferred, but can keep editing their reply"""
+
+    ctx = FakeInteraction(3)
+
+    async def body():
+        await discord.progress(ctx, "started")
+        await asyncio.sleep(0.1)
+        await discord.progress(ctx, "finished")
+
+        with pytest.raises(error.MultipleReplies):
+            await discord.reply(ctx, "second reply")
+
+    _run_with_defer(ctx, body, 0.02)
+
+    assert not ctx.fake_response.deferred
+    assert ctx.fake_response.sent == [(("started",), {})]
+    # the following progress is edited into the reply instead of replying again
+    assert ctx.message_sent.edits == [{"content": "finished"}]
+
+def test_progress_after_defer():
+    """Ensure that the progress of a deferred slash command replaces the 'thinking...' message, then edits it"""
+
+    ctx = FakeInteraction(4)
+
+    async def body():
+        await asyncio.sleep(0.1)
+        await discord.progress(ctx, embed=discordpy.Embed(title="step 1"))
+        assert jobs.current().progress == "step 1"
+        await discord.progress(ctx, embed=discordpy.Embed(title="step 2"), file="the file")
+        assert jobs.current().progress == "step 2"
+
+    _run_with_defer(ctx, body, 0.02)
+
+    assert ctx.fake_response.deferred
+    assert len(ctx.fake_response.sent) == 0
+    assert [edit["embed"].title for edit in ctx.original_edits] == ["step 1"]
+    assert [edit["embed"].title for edit in ctx.message_sent.edits] == ["step 2"]
+    assert ctx.message_sent.edits[0]["attachments"] == ["the file"]
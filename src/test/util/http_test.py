@@ -0,0 +1,105 @@
+"""Module containing tests for the shared HTTP client"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from nikobot.util import http
+
+from ..helpers import start_http_server
+
+@pytest.fixture(autouse=True)
+def reset_http():
+    """Reset the http client state between tests"""
+
+    http._metrics.clear()
+    http._host_semaphores.clear()
+    yield None
+    http._metrics.clear()
+    http._host_semaphores.clear()
+
+def test_get_json():
+    """Ensure that the response body is read and parsed"""
+
+    async def handler(_request):
+        return web.json_response({"value": 42})
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        try:
+            res = await http.get(f"{url}/test")
+        finally:
+            await http.close()
+            await runner.cleanup()
+        return res
+
+    res = asyncio.run(run())
+    assert res.ok
+    assert res.json() == {"value": 42}
+    assert http.metrics()["127.0.0.1"].requests == 1
+    assert http.metrics()["127.0.0.1"].bytes_received == len(res.content)
+
+def test_retries():
+    """Ensure that server errors and rate limits are retried"""
+
+    responses = [
+        web.Response(status=503),
+        web.Response(status=429, headers={"Retry-After": "0"}),
+        web.Response(text="done")
+    ]
+
+    async def handler(_request):
+        return responses.pop(0)
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        http.RETRY_BACKOFF, backoff = 0.01, http.RETRY_BACKOFF
+        try:
+            res = await http.get(url)
+        finally:
+            http.RETRY_BACKOFF = backoff
+            await http.close()
+            await runner.cleanup()
+        return res
+
+    res = asyncio.run(run())
+    assert res.text() == "done"
+
+    metrics = http.metrics()["127.0.0.1"]
+    assert metrics.requests == 3
+    assert metrics.retries == 1
+    assert metrics.rate_limited == 1
+    assert metrics.status_codes == {503: 1, 429: 1, 200: 1}
+
+    stats = http.stats()["127.0.0.1"]
+    assert stats["requests"] == 3
+    assert stats["rate_limited"] == 1
+    assert stats["latency_max_ms"] >= stats["latency_avg_ms"] > 0
+
+def test_host_limit():
+    """Ensure that the number of concurrent requests per host is limited"""
+
+    concurrent = 0
+    max_concurrent = 0
+
+    async def handler(_request):
+        nonlocal concurrent, max_concurrent
+        concurrent += 1
+        max_concurrent = max(max_concurrent, concurrent)
+        await asyncio.sleep(0.05)
+        concurrent -= 1
+        return web.Response(text="ok")
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        try:
+            await asyncio.gather(*[http.get(url) for _ in range(http.DEFAULT_HOST_LIMIT * 3)])
+        finally:
+            await http.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+    assert max_concurrent == http.DEFAULT_HOST_LIMIT
@@ -0,0 +1,89 @@
+"""Module containing tests for the conditional-request http cache"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+import os
+
+from aiohttp import web
+
+from nikobot.util import http
+from nikobot.util.httpcache import CacheEntry, HttpCache
+
+from ..helpers import start_http_server
+from ..conftest import STORAGE_DIR
+
+def test_etag_revalidation():
+    """Ensure that responses with an ETag are revalidated instead of downloaded again"""
+
+    sent_bodies = 0
+
+    async def handler(request):
+        nonlocal sent_bodies
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        sent_bodies += 1
+        return web.json_response({"title": "Berserk"}, headers={"ETag": '"v1"'})
+
+    cache = HttpCache("test")
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        try:
+            first = await cache.get(f"{url}/manga/2")
+            second = await cache.get(f"{url}/manga/2")
+        finally:
+            await http.close()
+            await runner.cleanup()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.json() == second.json() == {"title": "Berserk"}
+    assert sent_bodies == 1
+    assert cache.stats() == {"hits": 0, "misses": 1, "revalidated": 1, "entries": 1}
+
+def test_ttl_fallback():
+    """Ensure that responses without validators are reused until their ttl runs out"""
+
+    requests = 0
+
+    async def handler(_request):
+        nonlocal requests
+        requests += 1
+        return web.json_response({"count": requests})
+
+    cache = HttpCache("test")
+
+    async def run():
+        runner, url = await start_http_server(handler)
+        try:
+            await cache.get(f"{url}/a", ttl=60)
+            cached = await cache.get(f"{url}/a", ttl=60)
+            await cache.get(f"{url}/b", ttl=0)
+            uncached = await cache.get(f"{url}/b", ttl=0)
+        finally:
+            await http.close()
+            await runner.cleanup()
+        return cached, uncached
+
+    cached, uncached = asyncio.run(run())
+    assert cached.json() == {"count": 1}
+    assert uncached.json() == {"count": 3}
+    assert cache.hits == 1
+    assert cache.misses == 3
+
+def test_save_load():
+    """Ensure that the entries survive a restart"""
+
+    path = os.path.join(STORAGE_DIR, "http_cache_test.json")
+
+    cache = HttpCache("test")
+    cache.load(path)
+    cache._entries["http://example.com/a"] = CacheEntry("http://example.com/a", b'{"a": 1}', {"ETag": '"abc"'}, 0.0)
+    cache.save()
+
+    loaded = HttpCache("test")
+    loaded.load(path)
+    entry = loaded._entries["http://example.com/a"]
+    assert entry.etag == '"abc"'
+    assert entry.to_response().json() == {"a": 1}
@@ -0,0 +1,65 @@
+"""Module containing tests for the command job tracking"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+
+import pytest
+
+from nikobot.util import jobs
+
+def test_job_tracking():
+    """Ensure that jobs are tracked while running and removed afterwards"""
+
+    async def body():
+        assert jobs.current() is not None
+        assert jobs.current().name == "mal.update"
+        await asyncio.sleep(0.05)
+        return 5
+
+    async def run():
+        job = jobs.start("mal.update", 1234, body())
+        assert job in jobs.running()
+        assert not job.done()
+
+        assert await job.wait() == 5
+        # done callbacks run on the next loop iteration
+        await asyncio.sleep(0)
+
+        assert job.done()
+        assert job not in jobs.running()
+        assert jobs.current() is None
+
+    asyncio.run(run())
+
+def test_job_exception():
+    """Ensure that exceptions raised within a job are passed on to the caller"""
+
+    async def body():
+        raise ValueError("raised in job")
+
+    async def run():
+        job = jobs.start("mal.register", 1234, body())
+        with pytest.raises(ValueError):
+            await job.wait()
+
+    asyncio.run(run())
+
+def test_job_cancel_all():
+    """Ensure that jobs.cancel_all() stops all running jobs"""
+
+    async def body():
+        await asyncio.sleep(10)
+
+    async def run():
+        job1 = jobs.start("spotify.all_playlist", 1234, body())
+        job2 = jobs.start("mal.updateall", 5678, body())
+        await asyncio.sleep(0)
+
+        jobs.cancel_all()
+
+        for job in (job1, job2):
+            with pytest.raises(asyncio.CancelledError):
+                await job.wait()
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+"""Module containing tests for the adaptive rate limiter and the circuit breaker"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+from time import sleep
+
+import pytest
+
+from nikobot.util import error, ratelimit
+
+def test_adaptive_limiter_throttle():
+    """Ensure that the rate is halved on throttling and slowly increased on success"""
+
+    limiter = ratelimit.AdaptiveLimiter("test", 1.0, 0.1, 2.0, increase=0.5)
+
+    limiter.record_throttle()
+    assert limiter.rate == 0.5
+    for _ in range(5):
+        limiter.record_throttle()
+    assert limiter.rate == 0.1
+    assert limiter.throttled == 6
+
+    for _ in range(ratelimit.AdaptiveLimiter.INCREASE_AFTER):
+        limiter.record_success()
+    assert limiter.rate == pytest.approx(0.6)
+
+def test_circuit_breaker_opens():
+    """Ensure that the breaker opens after enough failures and fails fast"""
+
+    breaker = ratelimit.CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+
+    for _ in range(2):
+        breaker.check()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    with pytest.raises(error.CircuitOpen) as exc_info:
+        breaker.check()
+    assert 0 < exc_info.value.retry_after <= 60
+    assert breaker.rejected == 1
+
+def test_circuit_breaker_half_open():
+    """Ensure that a single trial request is let through after the reset timeout"""
+
+    breaker = ratelimit.CircuitBreaker("test", failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    sleep(0.15)
+    assert breaker.state == "half-open"
+
+    # the trial request
+    breaker.check()
+    with pytest.raises(error.CircuitOpen):
+        breaker.check()
+
+    # a failed trial opens the breaker again
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    sleep(0.15)
+    breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.check()
@@ -0,0 +1,127 @@
+"""Module containing tests for the single-flight coalescing"""
+
+# pylint: disable=protected-access, missing-class-docstring, pointless-statement, expression-not-assigned
+
+import asyncio
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from nikobot.util import singleflight
+
+def test_run_coalesces_concurrent_calls():
+    """Ensure that concurrent async calls with the same key only execute once"""
+
+    flight = singleflight.SingleFlight("test")
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def run():
+        return await asyncio.gather(
+            flight.run("a", fetch, 1),
+            flight.run("a", fetch, 1),
+            flight.run("a", fetch, 1),
+            flight.run("b", fetch, 2)
+        )
+
+    assert asyncio.run(run()) == [2, 2, 2, 4]
+    assert calls == [1, 2]
+    assert flight.coalesced == 2
+
+def test_run_grace_window():
+    """Ensure that results are only shared within the grace window"""
+
+    calls = []
+
+    @singleflight.coalesce("test", grace=0.1)
+    async def fetch(value):
+        calls.append(value)
+        return value
+
+    async def run():
+        await fetch(1)
+        await fetch(1)
+        assert calls == [1]
+
+        await asyncio.sleep(0.15)
+        await fetch(1)
+        assert calls == [1, 1]
+
+    asyncio.run(run())
+
+def test_run_exception_is_shared():
+    """Ensure that an exception is raised for all waiting callers, but isn't cached"""
+
+    flight = singleflight.SingleFlight("test", grace=10)
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        raise ValueError()
+
+    async def run():
+        results = await asyncio.gather(flight.run("a", fetch), flight.run("a", fetch), return_exceptions=True)
+        assert all(isinstance(item, ValueError) for item in results)
+        assert len(calls) == 1
+
+        with pytest.raises(ValueError):
+            await flight.run("a", fetch)
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+def test_run_owner_cancelled():
+    """Ensure that a cancelled caller running the flight doesn't cancel the waiting callers"""
+
+    flight = singleflight.SingleFlight("test")
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    async def run():
+        owner = asyncio.create_task(flight.run("a", fetch, 1))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(flight.run("a", fetch, value)) for value in (2, 3)]
+        await asyncio.sleep(0.01)
+
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+        # one of the waiters takes over, the other one joins its flight
+        results = await asyncio.gather(*waiters)
+        assert results in ([2, 2], [3, 3])
+        assert calls == [1, results[0]]
+        assert len(flight._async_flights) == 0
+
+    asyncio.run(run())
+
+def test_run_sync_coalesces_threads():
+    """Ensure that concurrent calls from multiple threads only execute once"""
+
+    calls = []
+    results = []
+
+    @singleflight.coalesce("test", key=lambda value: value)
+    def fetch(value):
+        calls.append(value)
+        sleep(0.1)
+        return value * 2
+
+    threads = [Thread(target=lambda: results.append(fetch(3))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [3]
+    assert results == [6, 6, 6, 6]